@@ -1,10 +1,13 @@
 #!/usr/bin/env python
 
 import argparse
+import atexit
+import oasis.compress
 import oasis.data
 import oasis.analysis
 import oasis.license_index
 import oasis.socioeconomic
+import oasis.trace
 
 
 def main():
@@ -36,9 +39,40 @@ See github.com/defano/chicago-oasis-data for more information.""")
     parser.add_argument('--clean', action='store_true', dest='clean', default=False,
                         help="force download of all dependent datasets")
 
+    parser.add_argument('--revalidate', action='store_true', dest='revalidate', default=False,
+                        help="download again only the dependent datasets the server reports have changed")
+
     parser.add_argument('--start-at', action='store', dest='start_at', default=None,
                         help="start analysis at this license code (useful for restarting failed jobs")
 
+    parser.add_argument('--compact', action='store_true', dest='compact', default=False,
+                        help="write analysis files without indentation or whitespace")
+
+    parser.add_argument('--compress', action='store_true', dest='compress', default=False,
+                        help="also write a gzip-compressed copy (.gz) of every output file")
+
+    parser.add_argument('--brotli', action='store_true', dest='brotli', default=False,
+                        help="with --compress, also write a brotli-compressed copy (.br); requires the brotli package")
+
+    parser.add_argument('--resume', action='store_true', dest='resume', default=False,
+                        help="resume an interrupted analysis where it stopped (with its original license codes)")
+
+    parser.add_argument('--rebuild', action='store_true', dest='rebuild', default=False,
+                        help="analyze every license code, even those unchanged since the last analysis")
+
+    parser.add_argument('--plan', action='store_true', dest='plan', default=False,
+                        help="print the estimated cost of analyzing each license code and the predicted makespan\n"
+                             "with the given number of jobs, without analyzing anything")
+
+    parser.add_argument('-j', '--jobs', action='store', dest='jobs', type=int, default=1,
+                        help="number of license codes to analyze in parallel (default is 1)")
+
+    parser.add_argument('--trace', action='store', dest='trace', default=None,
+                        help="write a Chrome trace of the time spent in each stage of the run to this file")
+
+    parser.add_argument('--progress-log', action='store', dest='progress_log', default=None,
+                        help="also append progress reports to this file, as lines of JSON")
+
     parser.add_argument('--community', action='store', dest='cmty', default="community",
                         help="directory where neighborhood data should be written (default is 'community')")
 
@@ -50,7 +84,9 @@ See github.com/defano/chicago-oasis-data for more information.""")
 
     args = parser.parse_args()
 
-    if args.licenses:
+    if args.resume:
+        print("Resuming interrupted analysis.")
+    elif args.licenses:
         print("Analyzing only license codes: " + str(args.licenses))
     else:
         print("Analyzing data for all licenses.")
@@ -58,29 +94,77 @@ See github.com/defano/chicago-oasis-data for more information.""")
     if args.start_at:
         print("Analyzing data starting at license code " + str(args.start_at))
 
+    if args.jobs > 1:
+        print("Analyzing up to " + str(args.jobs) + " license codes in parallel")
+
     print("Writing output to " + args.output_dir)
 
+    if args.trace:
+        # Saved on exit, so that the trace of a failed or interrupted run shows where it got to
+        oasis.trace.start()
+        atexit.register(_save_trace, args.trace)
+
+    compressed_formats = ("gz", "br") if args.brotli else ("gz",)
+    if args.compress:
+        try:
+            oasis.compress.check_formats(compressed_formats)
+        except ValueError as e:
+            parser.error(str(e))
+        print("Compressing output files as they are written")
+
     if args.clean:
         print("Forcing download of all dependent data...")
         oasis.data.download_all()
+    elif args.revalidate:
+        print("Checking dependent data for changes...")
+        oasis.data.download_all(revalidate=True)
+
+    print("Fetching source data...")
+    oasis.data.prefetch_all()
 
     # Must build cache before we start any analysis...
     oasis.data.initialize_license_cache()
+    oasis.data.warm_indexes()
+
+    if args.plan:
+        oasis.analysis.plan_accessibility_rpt(args.licenses, args.start_at, args.jobs)
+        return
+
+    compressor = oasis.compress.Compressor(args.output_dir, compressed_formats) if args.compress else None
+    reports = []    # Files written ahead of the analysis, compressed after it (once its workers have been forked)
 
     limited_datasets = args.analysis or args.index or args.demographic
 
     if not limited_datasets or args.index:
         print("Generating license index data...")
         oasis.license_index.produce_license_rpt(args.output_dir)
+        reports.append("licenses.json")
 
     if not limited_datasets or args.demographic:
         print("Generating socioeconomic report...")
         oasis.socioeconomic.produce_socioeconomic_rpt(args.output_dir)
+        reports.append("socioeconomic.json")
 
     if not limited_datasets or args.analysis:
         print("Performing analysis of business accessibility...")
-        oasis.analysis.produce_accessibility_rpt(args.output_dir, args.critical, args.census, args.cmty, args.licenses,
-                                                 args.start_at)
+        progress_log = open(args.progress_log, "a") if args.progress_log else None
+        try:
+            oasis.analysis.produce_accessibility_rpt(args.output_dir, args.critical, args.census, args.cmty,
+                                                     args.licenses, args.start_at, args.jobs, args.rebuild,
+                                                     args.resume, args.compact, compressor, progress_log)
+        finally:
+            if progress_log:
+                progress_log.close()
+
+    if compressor:
+        for report in reports:
+            compressor.submit(report)
+        compressor.finish()
+
+
+def _save_trace(path):
+    oasis.trace.save(path)
+    print("Wrote trace to " + path)
 
 
 if __name__ == "__main__":
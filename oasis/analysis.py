@@ -1,339 +1,624 @@
-import json
+import hashlib
 import math
+import multiprocessing
+import numpy
 import os.path
-from oasis import data, gis, progress
+from oasis import data, gis, jsonformat, progress, schedule, trace
+from oasis.jsonformat import FLOAT, INTEGER, STRING
+from oasis.manifest import Journal, Manifest, write_file
+
+
+NEARBY_RADIUS = 3.0         # Distance (in miles) beyond which a business no longer counts as "nearby" a tract
+ACCESS_BLOCK_SIZE = 2048    # Number of unique business locations whose tract distances are computed at once
+
+# Distance (in miles) closer than which a business counts as this far from a tract when summing accessibility, so that a
+# business located at a tract's centroid adds a finite amount (rather than 1 / 0) to ACCESS1 and ACCESS2
+MIN_ACCESS_DISTANCE = 0.01
+
+# Bump whenever a change to the analysis alters its results, so that license codes analyzed before are analyzed again
+ANALYSIS_VERSION = 4
+
+# The fields (and their order) of each kind of record written, conforming to the Chicago Oasis API
+CENSUS_FIELDS = [("BUSINESS_TYPE", STRING), ("TRACT", STRING), ("YEAR", INTEGER), ("ONE_MILE", INTEGER),
+                 ("TWO_MILE", INTEGER), ("THREE_MILE", INTEGER), ("ACCESS1", FLOAT), ("ACCESS2", FLOAT)]
+NEIGHBORHOOD_FIELDS = [("BUSINESS_TYPE", STRING), ("COMMUNITY_AREA", STRING), ("YEAR", INTEGER), ("ACCESS1", FLOAT),
+                       ("ACCESS2", FLOAT)]
+CRITICAL_BUSINESS_FIELDS = [("STATE", STRING), ("ZIP", INTEGER),
+                            ("LATTITUDE", FLOAT),   # sic; 'LATTITUDE' is misspelled in API :(
+                            ("LONGITUDE", FLOAT), ("ADDRESS", STRING), ("YEAR", INTEGER),
+                            ("DOING_BUSINESS_AS_NAME", STRING), ("POP_AT_RISK", INTEGER), ("BUSINESS_TYPE", STRING),
+                            ("LEGAL_NAME", STRING)]
 
 
 class _Analysis:
     """
-    An in-memory "database" of analysis records. Aggregates accessibility information on a per license and year basis.
-    """
+    An in-memory "database" of analysis records for a single license code. Aggregates accessibility information on a
+    per census tract and year basis.
 
-    TRACT_KEY = "t"
-    NEIGHBORHOOD_KEY = 'h'
-    POPULATION_KEY = 'p'
+    Counters are kept in arrays preallocated for every analyzed year and census tract, indexed by year id (the offset of
+    the year from the first analyzed year) and tract id (the position of the tract in the list of tracts analyzed).
+    Band counts are accumulated as difference arrays along the year axis: a business adds one in the first year of its
+    license and subtracts one in the year after it expires, and finalize turns these into per-year counts. Record
+    objects are only created as results are read.
 
-    def __init__(self):
-        self.data = {}
-        self.completed = set()
+    Alongside the one mile count, each tract accumulates the sum of the ids (license table rows) of the businesses
+    within a mile of it. Wherever the count is one, the sum is the id of that business: the tract's critical business.
 
-    def count_business(self, tract_id, neighborhood_id, tract_population, distance, year, license_code, license_record):
+    The businesses of a license code can be counted in shards (each in an _Analysis of its own, over the same years)
+    whose counts are then merged; see get_counts and merge.
+    """
+
+    def __init__(self, license_code, license_desc, context, first_year, last_year):
+        """
+        :param license_code: The numeric license code which identifies the business category (i.e., 1004)
+        :param license_desc: The description of the license code (i.e., "Music and Dance")
+        :param context: The _AnalysisContext holding the census tracts to analyze; the position of each tract in its
+        list of tracts is the tract id
+        :param first_year: The first calendar year in which any analyzed license record is valid
+        :param last_year: The last calendar year in which any analyzed license record is valid
+        """
+        self.license_code = license_code
+        self.license_desc = license_desc
+        self.tracts = context.tracts
+        self.neighborhoods = context.neighborhoods
+        self.first_year = first_year
+        self.completed = {}     # Map of path (relative to the output directory) to SHA-1 of each file written
+        self.previous_files = context.previous_files
+
+        self._tract_neighborhoods = context.tract_neighborhoods
+        self._tract10s = context.tract10s
+        self._census_format = context.census_format
+        self._neighborhood_format = context.neighborhood_format
+        self._critical_business_format = context.critical_business_format
+        self._tract_populations = numpy.array([int(tract_population) if tract_population else 0
+                                               for _, _, tract_population in self.tracts], dtype=numpy.int64)
+
+        years, tract_count = last_year - first_year + 1, len(self.tracts)
+
+        # Difference arrays (one extra year to mark the expiration of the latest licenses)
+        self._businesses = numpy.zeros(years + 1, dtype=numpy.int64)
+        self._one_mile = numpy.zeros((years + 1, tract_count), dtype=numpy.int32)
+        self._one_mile_businesses = numpy.zeros((years + 1, tract_count), dtype=numpy.int64)
+        self._two_mile = numpy.zeros((years + 1, tract_count), dtype=numpy.int32)
+        self._three_mile = numpy.zeros((years + 1, tract_count), dtype=numpy.int32)
+
+        self._access1 = numpy.zeros((years, tract_count))
+        self._access2 = numpy.zeros((years, tract_count))
+
+        # Neighborhood totals, derived from the tract totals by finalize
+        self._neighborhood_one_mile = None
+        self._neighborhood_two_mile = None
+        self._neighborhood_three_mile = None
+        self._neighborhood_access1 = None
+        self._neighborhood_access2 = None
+
+        self._served_populations = {}       # Map of business id to the population within one mile of it
+
+        # When a list, count_access appends the accessibility of each block of locations to it (to be merged in order
+        # of location blocks; see merge) rather than adding it to the accessibility sums
+        self.access_blocks = None
+
+        # Critical businesses (in license number order) and their details, joined by finalize
+        self._critical_businesses = None
+        self._critical_details = None
+        self._critical_populations = None
+
+    def count_business(self, near_tracts, near_distances, license_start, license_end, business):
         """
-        Update analysis with information from a given business license record.
+        Update analysis with information from a given business license record and the census tracts near it.
 
-        This method should be invoked for every row in the license table, crossed with every census tract, crossed with
-        every year the license record applies. Thus, in performing a full analysis, this method will get called
-        approximately 1.6 billion times... ~1M license rows x ~2 years per record (on avg) x ~800 census tracts in
-        Chicago.
+        This method should be invoked for every row in the license table, passing every census tract within three miles
+        of the business. It counts the business in the one, two and three mile bands of each tract and its neighborhood
+        and counts the population of the tracts within a mile as served by the business. Accessibility sums (ACCESS1,
+        ACCESS2), which depend on every business regardless of distance, are accumulated separately via count_access.
 
         Note that this method DOES NOT filter duplicates. It is the responsibility of the caller to assure the same
-        business is not being counted twice in the same year or census tract.
+        business is not being counted twice.
 
-        :param tract_id: The census tract ID where this business is located
-        :param neighborhood_id: The name of the neighborhood where the business is located
-        :param tract_population: The population of this census tract
-        :param distance: The distance (in miles) of the business from the given census tract
-        :param year: The calendar year in which this license record is valid (i.e., 2017)
-        :param license_code: The numeric license code which identifies the business category (i.e., 1004)
-        :param license_record: A dictionary containing all of the "rows" of this license record.
+        :param near_tracts: NumPy array of the tract ids of the census tracts near the business (without repeats)
+        :param near_distances: NumPy array of the distance (in miles) of the business from each tract in near_tracts
+        :param license_start: The first calendar year in which this license record is valid (i.e., 2016)
+        :param license_end: The last calendar year in which this license record is valid (i.e., 2017)
+        :param business: The id of the business: its row in the license table (see data.get_license_table)
         :return: Nada
         """
-        license_number = license_record[data.license_db.ROW_LICENSE_NUMBER]
-        license_desc = license_record[data.license_db.ROW_LICENSE_DESCRIPTION]
+        start, end = license_start - self.first_year, license_end - self.first_year + 1
 
-        if license_code not in self.data:
-            self.data = {license_code: {}}
+        for band, counts in ((1.0, self._one_mile), (2.0, self._two_mile), (3.0, self._three_mile)):
+            band_tracts = near_tracts[near_distances <= band]
+            counts[start, band_tracts] += 1
+            counts[end, band_tracts] -= 1
 
-        if year not in self.data[license_code]:
-            self.data[license_code][year] = {}
+        one_mile_tracts = near_tracts[near_distances <= 1.0]
+        if len(one_mile_tracts):
+            self._one_mile_businesses[start, one_mile_tracts] += business
+            self._one_mile_businesses[end, one_mile_tracts] -= business
+            self._served_populations[business] = int(self._tract_populations[one_mile_tracts].sum())
 
-        if _Analysis.TRACT_KEY not in self.data[license_code][year]:
-            self.data[license_code][year] = {_Analysis.TRACT_KEY: {},
-                                             _Analysis.NEIGHBORHOOD_KEY: {},
-                                             _Analysis.POPULATION_KEY: {}}
+    def count_access(self, license_starts, license_ends, license_locations, access1, access2):
+        """
+        Update analysis with the accessibility of every census tract to a group of businesses.
+
+        Accessibility is given per business location; each location's contributions are weighted by the number of
+        businesses there and spread over every year those businesses were active in a single matrix product, so this
+        method should be invoked once for every (block of) business locations.
+
+        :param license_starts: NumPy array of the first calendar year in which each business' license is valid
+        :param license_ends: NumPy array of the last calendar year in which each business' license is valid
+        :param license_locations: NumPy array of the row in access1 and access2 of each business' location
+        :param access1: NumPy array of shape (locations, tracts) holding 1 / distance from each location to each tract
+        :param access2: NumPy array of shape (locations, tracts) holding 1 / distance^2 from each location to each
+        tract
+        :return: None
+        """
+        active_years = _active_years(license_starts, license_ends,
+                                     range(self.first_year, self.first_year + len(self._access1)))
 
-        if tract_id not in self.data[license_code][year][_Analysis.TRACT_KEY]:
-            self.data[license_code][year][_Analysis.TRACT_KEY][tract_id] = _AreaRecord(tract_id, year, license_desc)
-        self.data[license_code][year][_Analysis.TRACT_KEY][tract_id].count_business(license_number, distance)
+        # Number of businesses active at each location in each year
+        location_years = numpy.zeros((len(active_years), len(access1)))
+        numpy.add.at(location_years.T, license_locations, active_years.T)
 
-        if neighborhood_id not in self.data[license_code][year][_Analysis.NEIGHBORHOOD_KEY]:
-            self.data[license_code][year][_Analysis.NEIGHBORHOOD_KEY][neighborhood_id] = \
-                _AreaRecord(neighborhood_id, year, license_desc)
+        if self.access_blocks is not None:
+            self.access_blocks.append((location_years.dot(access1), location_years.dot(access2)))
+        else:
+            self._access1 += location_years.dot(access1)
+            self._access2 += location_years.dot(access2)
 
-        self.data[license_code][year][_Analysis.NEIGHBORHOOD_KEY][neighborhood_id]\
-            .count_business(license_number, distance)
+        numpy.add.at(self._businesses, license_starts - self.first_year, 1)
+        numpy.add.at(self._businesses, license_ends - self.first_year + 1, -1)
 
-        if distance <= 1.0:
-            if license_number not in self.data[license_code][year][_Analysis.POPULATION_KEY]:
-                self.data[license_code][year][_Analysis.POPULATION_KEY][license_number] = \
-                    _ServedAreaRecord(license_number)
-            self.data[license_code][year][_Analysis.POPULATION_KEY][license_number].count_pop(tract_population)
+    def get_counts(self):
+        """
+        Gets everything counted so far, for merging into another _Analysis (see merge).
+        :return: A tuple of counts
+        """
+        return (self._businesses, self._one_mile, self._two_mile, self._three_mile, self._one_mile_businesses,
+                self._served_populations, self.access_blocks)
 
-    def get_analyzed_license_codes(self):
+    def merge(self, counts):
         """
-        Gets a set of unique license codes present in the analysis.
-        :return: The license keys
+        Adds the counts of a shard of the businesses of this license code to this analysis. Merging every shard in turn
+        gives exactly the results of counting all of the businesses here: band counts and business ids are integers,
+        and the accessibility of each block of locations is added in the same order. Must be called before finalize.
+        :param counts: The counts of an _Analysis of the same license code and years (see get_counts) whose
+        access_blocks were kept; shards must be merged in order of the location blocks they counted
+        :return: None
         """
-        return self.data.keys()
+        businesses, one_mile, two_mile, three_mile, one_mile_businesses, served_populations, access_blocks = counts
+
+        self._businesses += businesses
+        self._one_mile += one_mile
+        self._two_mile += two_mile
+        self._three_mile += three_mile
+        self._one_mile_businesses += one_mile_businesses
+        self._served_populations.update(served_populations)
+
+        for access1, access2 in access_blocks:
+            self._access1 += access1
+            self._access2 += access2
 
-    def get_analyzed_years_for_license_code(self, license_code):
+    def finalize(self):
         """
-        Gets a set of unique years for analysis data was collected for licenses of the given license code.
-        :param license_code: The license code (i.e., 1004) whose data should be retrieved
-        :return: The set of years for which data for the given license code was collected, or the empty list if no
-        data is available.
+        Turns the band count difference arrays into counts for every year, derives the neighborhood totals from the
+        census tract totals and looks up the details of every critical business. Must be called once all businesses
+        have been counted and before any results are read.
+        :return: None
         """
-        if license_code in self.data:
-            return self.data[license_code].keys()
-        else:
-            return []
+        self._businesses = numpy.cumsum(self._businesses)[:-1]
+        self._one_mile = numpy.cumsum(self._one_mile, axis=0)[:-1]
+        self._one_mile_businesses = numpy.cumsum(self._one_mile_businesses, axis=0)[:-1]
+        self._two_mile = numpy.cumsum(self._two_mile, axis=0)[:-1]
+        self._three_mile = numpy.cumsum(self._three_mile, axis=0)[:-1]
+
+        self._neighborhood_one_mile = self._sum_by_neighborhood(self._one_mile)
+        self._neighborhood_two_mile = self._sum_by_neighborhood(self._two_mile)
+        self._neighborhood_three_mile = self._sum_by_neighborhood(self._three_mile)
+        self._neighborhood_access1 = self._sum_by_neighborhood(self._access1)
+        self._neighborhood_access2 = self._sum_by_neighborhood(self._access2)
+
+        # Join the critical businesses of every year against the license table at once
+        table = data.get_license_table()
+        businesses = numpy.unique(self._one_mile_businesses[self._one_mile == 1])
+        businesses = businesses[numpy.argsort([table.license_numbers[business] for business in businesses.tolist()],
+                                              kind='mergesort')]
+        self._critical_businesses = businesses
+        self._critical_details = table.get_business_details(businesses)
+        self._critical_populations = numpy.array([self._served_populations[business]
+                                                  for business in businesses.tolist()], dtype=numpy.int64)
+
+    def _sum_by_neighborhood(self, tract_values):
+        """
+        Sums an array of per-year, per-tract values over the tracts of each neighborhood.
+        :param tract_values: A NumPy array of shape (years, tracts)
+        :return: A NumPy array of shape (years, neighborhoods)
+        """
+        neighborhood_values = numpy.zeros((len(tract_values), len(self.neighborhoods)), dtype=tract_values.dtype)
+        numpy.add.at(neighborhood_values.T, self._tract_neighborhoods, tract_values.T)
+        return neighborhood_values
 
-    def get_analyzed_census_records_json(self, license_code, year):
+    def get_analyzed_years(self):
+        """
+        Gets the years for which analysis data was collected (those in which at least one license record is valid).
+        :return: The list of years for which data was collected, or the empty list if no data is available.
         """
-        Returns a JSON-formatted string containing an array of census-level accessibility records for the given year
-        and license code. This data is suitable for writing to result files in the 'census/' directory.
-        :param license_code: The numeric license code
+        return [self.first_year + year for year in numpy.flatnonzero(self._businesses).tolist()]
+
+    def get_analyzed_census_records_json(self, year):
+        """
+        Returns a JSON-formatted string containing an array of census-level accessibility records for the given year.
+        This data is suitable for writing to result files in the 'census/' directory.
         :param year: The year
         :return: A JSON-formatted string
         """
-        return json.dumps(self.get_analyzed_census_records(license_code, year).values(),
-                          cls=_CensusRecordJsonEncoder, indent=2)
+        return "".join(self.encode_analyzed_census_records(year))
 
-    def get_analyzed_census_records(self, license_code, year):
+    def encode_analyzed_census_records(self, year):
         """
-        Gets a map of tract_id to _AreaRecord (representing the aggregated accessibility data for the given license code
-        and year)
-        :param license_code: The license code whose data should be returned
-        :param year: The year for which data should be returned
-        :return: A map of tract_id -> _AreaRecord
+        Encodes the census-level accessibility records for the given year as JSON, in the output format of the analysis
+        context, without first materializing them as _AreaRecord objects.
+        :param year: The year
+        :return: A generator of strings which, concatenated, form the JSON document
         """
-        return self.data[license_code][year][_Analysis.TRACT_KEY]
+        y, tracts = year - self.first_year, len(self.tracts)
+        return self._census_format.encode([[self.license_desc] * tracts, self._tract10s, [year] * tracts,
+                                           self._one_mile[y], self._two_mile[y], self._three_mile[y],
+                                           self._access1[y], self._access2[y]])
 
-    def get_neighborhood_records(self, license_code, year):
+    def get_analyzed_census_records(self, year):
         """
-        Gets a map of neighborhood_id to _AreaRecord (representing the aggregated accessibility data for the given
-        license code and year)
-        :param license_code: The license code whose data should be returned
+        Gets a list of _AreaRecord (representing the aggregated accessibility data for the given year), one for each
+        census tract
         :param year: The year for which data should be returned
-        :return: A map of neighborhood_id -> _AreaRecord
+        :return: A list of _AreaRecord in tract id order
         """
-        return self.data[license_code][year][_Analysis.NEIGHBORHOOD_KEY]
+        y = year - self.first_year
+        return [_AreaRecord(tract_id, year, self.license_desc, one_mile, two_mile, three_mile, access1, access2)
+                for (tract_id, _, _), one_mile, two_mile, three_mile, access1, access2
+                in zip(self.tracts, self._one_mile[y].tolist(), self._two_mile[y].tolist(),
+                       self._three_mile[y].tolist(), self._access1[y].tolist(), self._access2[y].tolist())]
 
-    def get_neighborhood_records_json(self, license_code, year):
+    def get_neighborhood_records(self, year):
+        """
+        Gets a list of _AreaRecord (representing the aggregated accessibility data for the given year), one for each
+        neighborhood
+        :param year: The year for which data should be returned
+        :return: A list of _AreaRecord in neighborhood name order
+        """
+        y = year - self.first_year
+        return [_AreaRecord(neighborhood_name, year, self.license_desc, one_mile, two_mile, three_mile, access1,
+                            access2)
+                for neighborhood_name, one_mile, two_mile, three_mile, access1, access2
+                in zip(self.neighborhoods, self._neighborhood_one_mile[y].tolist(),
+                       self._neighborhood_two_mile[y].tolist(), self._neighborhood_three_mile[y].tolist(),
+                       self._neighborhood_access1[y].tolist(), self._neighborhood_access2[y].tolist())]
+
+    def get_neighborhood_records_json(self, year):
         """
         Returns a JSON-formatted string containing an array of neighborhood-level accessibility records for the given
-        year and license code. This data is suitable for writing to result files in the 'community/' directory.
-        :param license_code: The numeric license code
+        year. This data is suitable for writing to result files in the 'community/' directory.
         :param year: The year
         :return: A JSON-formatted string
         """
-        return json.dumps(self.get_neighborhood_records(license_code, year).values(),
-                          cls=_NeighborhoodRecordJsonEncoder, indent=2)
+        return "".join(self.encode_neighborhood_records(year))
 
-    def get_served_population(self, license_code, license_number, year):
+    def encode_neighborhood_records(self, year):
         """
-        Returns the population living within one mile of the business identified by license code and license number.
-        :param license_code: The license code of the business
-        :param license_number: The license number of the business
-        :param year: The year for which data should be retrieved
-        :return: The population within one mile of the business
+        Encodes the neighborhood-level accessibility records for the given year as JSON, in the output format of the
+        analysis context, without first materializing them as _AreaRecord objects.
+        :param year: The year
+        :return: A generator of strings which, concatenated, form the JSON document
         """
-        return self.data[license_code][year][_Analysis.POPULATION_KEY][license_number].pop
+        y, neighborhoods = year - self.first_year, len(self.neighborhoods)
+        return self._neighborhood_format.encode([[self.license_desc] * neighborhoods, self.neighborhoods,
+                                                 [year] * neighborhoods, self._neighborhood_access1[y],
+                                                 self._neighborhood_access2[y]])
 
-    def get_critical_businesses(self, license_code, year):
+    def get_critical_businesses(self, year):
         """
-        Returns a list of _CriticalBusinessRecord identifying all the critical businesses of a given license type
-        :param license_code: The license code of businesses to be returned
+        Returns a list of _CriticalBusinessRecord identifying all the critical businesses of this license type
         :param year: The year for which data should be returned
-        :return: A list of zero or more _CriticalBusinessRecord objects
+        :return: A list of zero or more _CriticalBusinessRecord objects, in license number order
         """
-        critical_businesses = set()
-        census_records = self.get_analyzed_census_records(license_code, year)
-        for tract in census_records:
-            if len(census_records[tract].nearby_businesses) == 1:
-                license_number = census_records[tract].nearby_businesses[0]
-                critical_businesses.add(
-                    _CriticalBusinessRecord(license_code, license_number, year,
-                                            self.get_served_population(license_code, license_number, year)))
-
-        return list(critical_businesses)
+        table = data.get_license_table()
+        details = self._critical_details
+        return [_CriticalBusinessRecord(self.license_code, table.license_numbers[self._critical_businesses[i]],
+                                        self.license_desc, year, int(self._critical_populations[i]),
+                                        details["dba"][i], details["legal_name"][i],
+                                        (float(details["lat"][i]), float(details["lng"][i])), details["address"][i],
+                                        details["city"][i], details["state"][i], details["zip"][i])
+                for i in self._get_critical_indices(year).tolist()]
+
+    def _get_critical_indices(self, year):
+        """
+        :param year: The year
+        :return: A NumPy array of the indices (into the critical businesses joined by finalize) of the businesses that
+        are the only one within a mile of some census tract in the given year
+        """
+        y = year - self.first_year
+        return numpy.flatnonzero(numpy.isin(self._critical_businesses,
+                                            self._one_mile_businesses[y][self._one_mile[y] == 1]))
 
-    def get_critical_businesses_json(self, license_code, year):
+    def get_critical_businesses_json(self, year):
         """
-        Returns a JSON-formatted string containing an array of critical business records for the given year and license
-        code. This data is suitable for writing to result files in the 'critical/' directory.
-        :param license_code: The numeric license code
+        Returns a JSON-formatted string containing an array of critical business records for the given year. This data
+        is suitable for writing to result files in the 'critical/' directory.
         :param year: The year
         :return: A JSON-formatted string
         """
-        return json.dumps(self.get_critical_businesses(license_code, year),
-                          cls=_CriticalBusinessRecordJsonEncoder, indent=2)
-
+        return "".join(self.encode_critical_businesses(year))
 
-class _CriticalBusinessRecord:
+    def encode_critical_businesses(self, year):
+        """
+        Encodes the critical business records for the given year as JSON, in the output format of the analysis context.
+        :param year: The year
+        :return: A generator of strings which, concatenated, form the JSON document
+        """
+        indices = self._get_critical_indices(year).tolist()
+        details, count = self._critical_details, len(indices)
+        return self._critical_business_format.encode([
+            [details["state"][i] for i in indices],
+            [int(details["zip"][i]) for i in indices],
+            details["lat"][indices],
+            details["lng"][indices],
+            [details["address"][i] for i in indices],
+            [year] * count,
+            [details["dba"][i] for i in indices],
+            self._critical_populations[indices],
+            [self.license_desc] * count,
+            [details["legal_name"][i] for i in indices]])
+
+
+class _CriticalBusinessRecord(object):
     """
     A record of a "critical business" (that is, the only business within a mile of a given population)
     """
-    def __init__(self, license_code, license_number, year, at_risk_pop):
+    __slots__ = ('license_code', 'license_number', 'license_desc', 'year', 'at_risk_pop', 'dba', 'legal_name',
+                 'lat_lng', 'address', 'city', 'state', 'zip')
+
+    def __init__(self, license_code, license_number, license_desc, year, at_risk_pop, dba, legal_name, lat_lng,
+                 address, city, state, zip_code):
         self.license_code = license_code
         self.license_number = license_number
-        self.license_desc = data.get_license_description(license_code)
+        self.license_desc = license_desc
         self.year = year
         self.at_risk_pop = at_risk_pop
-        self.dba = data.get_business_dba(license_number)
-        self.legal_name = data.get_business_legal_name(license_number)
-        self.lat_lng = data.get_business_lat_lng(license_number)
-        self.address = data.get_business_address(license_number)
-        self.city = data.get_business_city(license_number)
-        self.state = data.get_business_state(license_number)
-        self.zip = data.get_business_zip(license_number)
+        self.dba = dba
+        self.legal_name = legal_name
+        self.lat_lng = lat_lng
+        self.address = address
+        self.city = city
+        self.state = state
+        self.zip = zip_code
 
     def __hash__(self):
-        return hash(str(str(self.lat_lng[0]) + str(self.lat_lng[1])))
+        return hash((self.license_number, self.year))
 
     def __eq__(self, other):
-        return hash(self) == hash(other)
+        return self.license_number == other.license_number and self.year == other.year
 
 
-class _ServedAreaRecord:
-    """
-    A record of the population within one mile's distance of a given business.
-    """
-    def __init__(self, license_number):
-        self.license_number = license_number
-        self.pop = 0
-
-    def count_pop(self, pop):
-        if pop:
-            self.pop += int(pop)
-
-
-class _AreaRecord:
+class _AreaRecord(object):
     """
     A record of the number of businesses of a given license type within three miles of a given geographic area.
     """
-    def __init__(self, area, year, license_desc):
+    __slots__ = ('area', 'year', 'business_type', 'one_mile', 'two_mile', 'three_mile', 'access1', 'access2')
+
+    def __init__(self, area, year, license_desc, one_mile=0, two_mile=0, three_mile=0, access1=0, access2=0):
         """
         :param area: The geographic area (neighborhood name or census tract ID) this record applies to (i.e., "OHARE"
         or "510123")
         :param year: The calendar year this data applies to
         :param license_desc: The description of the type of license (i.e., "Music and Dance")
+        :param one_mile: The number of businesses within one mile of the area
+        :param two_mile: The number of businesses within two miles of the area
+        :param three_mile: The number of businesses within three miles of the area
+        :param access1: The sum of 1 / distance to every business
+        :param access2: The sum of 1 / distance^2 to every business
         """
-        self.one_mile = 0
-        self.two_mile = 0
-        self.three_mile = 0
-        self.access1 = 0
-        self.access2 = 0
+        self.one_mile = one_mile
+        self.two_mile = two_mile
+        self.three_mile = three_mile
+        self.access1 = access1
+        self.access2 = access2
         self.area = area
         self.year = year
         self.business_type = license_desc
-        self.nearby_businesses = []
-
-    def count_business(self, license_number, distance):
-        """
-        Updates this analysis record with information about a new business.
-        :param license_number: The license number of the business
-        :param distance: The distance (in miles) from the centroid of the analyzed area
-        :return: None
-        """
-        self.access2 += 1.0 / math.pow(distance, 2)
-        self.access1 += 1.0 / distance
-        if distance <= 1.0:
-            self.one_mile += 1
-            self.nearby_businesses.append(license_number)
-        if distance <= 2.0:
-            self.two_mile += 1
-        if distance <= 3.0:
-            self.three_mile += 1
 
     def get_tract10(self):
         """
         Converts a six-digit census tract identifier (i.e., 061037) to the "tract-10" representation (610.37)
         :return: The tract-10 representation of this record's census tract_id
         """
-        if len(self.area) > 4 and self.area.endswith("00"):
-            return self.area[:-2]
-        elif len(self.area) > 4:
-            return self.area[0:4] + "." + self.area[-2:]
-        else:
-            return self.area
+        return _get_tract10(self.area)
 
 
-class _CriticalBusinessRecordJsonEncoder(json.JSONEncoder):
+def _get_tract10(tract_id):
     """
-    Encodes _CriticalBusinessRecord objects in JSON conforming to the Chicago Oasis API.
+    Converts a six-digit census tract identifier (i.e., 061037) to the "tract-10" representation (610.37)
+    :param tract_id: The census tract id
+    :return: The tract-10 representation of the census tract id
     """
-    def default(self, o):
-        if isinstance(o, _CriticalBusinessRecord):
-            return {"STATE": o.state,
-                    "ZIP": int(o.zip),
-                    "LATTITUDE": float(o.lat_lng[0]),      # sic; 'LATTITUDE' is misspelled in API :(
-                    "LONGITUDE": float(o.lat_lng[1]),
-                    "ADDRESS": o.address,
-                    "YEAR": int(o.year),
-                    "DOING_BUSINESS_AS_NAME": o.dba,
-                    "POP_AT_RISK": int(o.at_risk_pop),
-                    "BUSINESS_TYPE": o.license_desc,
-                    "LEGAL_NAME": o.legal_name
-                    }
-
-        return super(_CriticalBusinessRecordJsonEncoder, self).default(o)
+    if len(tract_id) > 4 and tract_id.endswith("00"):
+        return tract_id[:-2]
+    elif len(tract_id) > 4:
+        return tract_id[0:4] + "." + tract_id[-2:]
+    else:
+        return tract_id
 
 
-class _NeighborhoodRecordJsonEncoder(json.JSONEncoder):
+@trace.traced("produce_accessibility_rpt")
+def produce_accessibility_rpt(output_dir, critical_dir, census_dir, community_dir, license_codes, start_at, jobs=1,
+                              rebuild=False, resume=False, compact=False, compressor=None, progress_log=None):
     """
-    Encodes an _AreaRecord representing a neighborhood in JSON conforming to the Chicago Oasis API.
-    """
-    def default(self, o):
-        if isinstance(o, _AreaRecord):
-            return {"BUSINESS_TYPE": o.business_type,
-                    "COMMUNITY_AREA": o.area,
-                    "YEAR": o.year,
-                    "ACCESS1": o.access1,
-                    "ACCESS2": o.access2}
-
-        return super(_NeighborhoodRecordJsonEncoder, self).default(o)
-
-
-class _CensusRecordJsonEncoder(json.JSONEncoder):
-    """
-    Encodes an _AreaRecord representating a census tract in JSON conforming to the Chicago Oasis API.
-    """
-    def default(self, o):
-        if isinstance(o, _AreaRecord):
-            return {"BUSINESS_TYPE": o.business_type,
-                    "TRACT": o.get_tract10(),
-                    "YEAR": o.year,
-                    "ONE_MILE": o.one_mile,
-                    "TWO_MILE": o.two_mile,
-                    "THREE_MILE": o.three_mile,
-                    "ACCESS1": o.access1,
-                    "ACCESS2": o.access2}
+    Performs an accessibility analysis of Chicago business licenses, writing data incrementally to output files.
 
-        return super(_CensusRecordJsonEncoder, self).default(o)
+    License codes whose licenses and census tracts are unchanged since they were last analyzed into the output directory
+    (according to its manifest) are skipped, and the files written then are kept.
 
+    The progress of the run is recorded in a journal in the output directory as each license code is completed, so that
+    an interrupted run can be resumed where it stopped.
 
-def produce_accessibility_rpt(output_dir, critical_dir, census_dir, community_dir, license_codes, start_at):
-    """
-    Performs an accessibility analysis of Chicago business licenses, writing data incrementally to output files.
     :param output_dir: The path to output directory ('./' by default)
     :param critical_dir: The name of the directory where critical business data is written ('critical/' by default)
     :param census_dir: The name of the directory where census-level accessibility data is written ('/census' by default)
     :param community_dir: The name of the directory where neighborhood-level data is written ('community/' by default)
     :param license_codes: A list of license codes to be analyzed; empty indicates all available licenses.
     :param start_at: Start analysis at this code; analyses run in numerical order
+    :param jobs: The number of license codes to analyze in parallel, each in its own worker process (1 by default)
+    :param rebuild: When True, analyze every license code, even those unchanged since they were last analyzed
+    :param resume: When True, resume the interrupted run journaled in the output directory (with the license codes,
+    directories and rebuild option it was started with) instead of starting a new one
+    :param compact: When True, JSON files are written without indentation or any other whitespace
+    :param compressor: When not None, the oasis.compress.Compressor to which files are submitted as they are written
+    (and the files of skipped license codes, to compress any that are not already); nothing may have been submitted to
+    it yet, so that none of its threads are running when worker processes are forked
+    :param progress_log: When not None, a file to which progress reports are also written, as lines of JSON (see
+    progress.Telemetry)
+    :return: None
+    """
+    journal = Journal(output_dir)
+
+    if resume:
+        if not journal.exists():
+            print("No interrupted analysis to resume in " + output_dir)
+            return
+
+        options = journal.get_options()
+        # As str (not the unicode JSON decodes to), or the fingerprint of every license code would differ
+        critical_dir, census_dir, community_dir = \
+            [str(options[key]) for key in ("critical_dir", "census_dir", "community_dir")]
+        rebuild, compact = options["rebuild"], options.get("compact", False)
+
+        # Only license codes whose files are exactly as the interrupted run wrote them count as completed
+        pending_codes = [license_code for license_code in journal.get_license_codes()
+                         if not journal.is_complete(license_code)]
+        print("Resuming analysis with " + str(len(pending_codes)) + " of " + str(len(journal.get_license_codes())) +
+              " license codes left to analyze")
+
+    else:
+        pending_codes = _get_pending_codes(license_codes, start_at)
+
+        # The journal and manifest are written to the output directory before any results are
+        _make_directory(output_dir)
+        journal.start(pending_codes, {"critical_dir": critical_dir, "census_dir": census_dir,
+                                      "community_dir": community_dir, "rebuild": rebuild, "compact": compact})
+
+    manifest = Manifest(output_dir)
+    if not resume:
+        manifest.start_run()
+    context = _AnalysisContext(output_dir, critical_dir, census_dir, community_dir, compact, manifest.get_all_files())
+
+    # Skip license codes whose analysis on record was computed from the same data
+    fingerprints = dict((license_code, _get_fingerprint(license_code, context)) for license_code in pending_codes)
+    unchanged = set()
+    if not rebuild:
+        unchanged = set(license_code for license_code in pending_codes
+                        if manifest.is_current(license_code, fingerprints[license_code]))
+        if unchanged:
+            print("Skipping " + str(len(unchanged)) + " license codes unchanged since they were last analyzed")
+            pending_codes = [license_code for license_code in pending_codes if license_code not in unchanged]
+
+    def compress_unchanged():
+        # Not before any worker processes are forked: the compressor's threads could hold locks the workers inherit
+        if compressor:
+            for license_code in sorted(unchanged):
+                compressor.submit_all(manifest.get_files(license_code))
+
+    overall_progress = progress.Telemetry("overall", len(pending_codes), log_file=progress_log)
+    businesses, locations, written, changed = 0, 0, [0], [0]
+
+    def complete(license_code, files, code_businesses, code_locations):
+        overall_progress.report(1, code_businesses, code_locations * len(context.tracts))
+        journal.complete(license_code, files)
+        changed[0] += len(manifest.record(license_code, fingerprints[license_code], files))
+        written[0] += len(files)
+        manifest.save()
+        if compressor:
+            compressor.submit_all(files)
+
+    tasks, task_costs = _get_tasks(pending_codes, len(context.tracts), jobs) if jobs > 1 else ([], {})
+
+    if len(tasks) > 1:
+        # Dispatch the most costly tasks first, so that no large license code is left running alone at the end
+        shard_counts = {}   # Map of license code to a map of shard to its counts, for license codes split into shards
+        for license_code, shard in tasks:
+            if shard is not None:
+                shard_counts.setdefault(license_code, {})[shard] = None
+
+        # Workers are forked after the license caches have been built and so share them with this process; each
+        # worker writes its own results to disk (except for license codes split into shards, whose shards are merged
+        # and written here)
+        pool = multiprocessing.Pool(min(jobs, len(tasks)), _initialize_worker, (context,))
+        try:
+            compress_unchanged()
+            for (license_code, shard), code_businesses, code_locations, result, events in \
+                    pool.imap_unordered(_analyze_in_worker, schedule.largest_first(tasks, task_costs)):
+                trace.add_events(events)
+
+                if shard is not None:
+                    shard_counts[license_code][shard] = result
+                    if any(counts is None for counts in shard_counts[license_code].values()):
+                        continue
+                    code_shards = shard_counts.pop(license_code)
+                    code_businesses, code_locations, result = \
+                        _merge_shards(license_code, [code_shards[shard] for shard in sorted(code_shards)], context)
+
+                print("Finished license code " + str(license_code))
+                complete(license_code, result, code_businesses, code_locations)
+                businesses, locations = businesses + code_businesses, locations + code_locations
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+    else:
+        compress_unchanged()
+        for license_code in pending_codes:
+            code_businesses, code_locations, files = _analyze_license_code(license_code, context, True, progress_log)
+            complete(license_code, files, code_businesses, code_locations)
+            businesses, locations = businesses + code_businesses, locations + code_locations
+
+    journal.finish()
+    overall_progress.finish()
+
+    if written[0]:
+        print("Content changed in " + str(changed[0]) + " of " + str(written[0]) + " files analyzed (others left "
+              "untouched); see " + manifest.get_path() + " for the list of changed files")
+
+    if businesses:
+        print("Computed tract distances for " + str(locations) + " unique locations of " + str(businesses) +
+              " businesses (" + "%.1f" % (100.0 * (businesses - locations) / businesses) + "% reused)")
+
+
+def plan_accessibility_rpt(license_codes, start_at, jobs=1):
+    """
+    Prints the plan of an accessibility analysis without performing it: the estimated cost of each task (a license
+    code, or a shard of one; see _plan_tasks) in the order tasks would be dispatched, and the predicted makespan (see
+    oasis.schedule).
+    :param license_codes: A list of license codes to be analyzed; empty indicates all available licenses.
+    :param start_at: Start analysis at this code; analyses run in numerical order
+    :param jobs: The number of license codes to analyze in parallel
     :return: None
     """
+    context = _AnalysisContext(None, None, None, None)
+    tasks, task_costs = _get_tasks(_get_pending_codes(license_codes, start_at), len(context.tracts), jobs)
+    schedule.print_plan(tasks, task_costs, jobs)
 
+
+def _get_pending_codes(license_codes, start_at):
+    """
+    Selects the license codes to analyze.
+    :param license_codes: A list of license codes to be analyzed; empty indicates all available licenses.
+    :param start_at: Start analysis at this code; analyses run in numerical order
+    :return: A list of license codes
+    """
     # Get the set of all business license categories issued by Chicago
     if not license_codes:
         license_codes = data.get_license_codes()
 
-    overall_progress = progress.Progress(len(license_codes))
-
-    # Walk each unique license type
+    pending_codes = []
     for license_code in license_codes:
-        database = _Analysis()
 
         # When user has requested restarting analysis at specific code, skip ahead...
         if start_at is not None and int(start_at) > int(license_code):
@@ -342,56 +627,377 @@ def produce_accessibility_rpt(output_dir, critical_dir, census_dir, community_di
         else:
             start_at = None
 
-        license_desc = None
-        licenses = data.get_licenses(license_code)
-        licenses_count = len(licenses)
+        pending_codes.append(license_code)
+
+    return pending_codes
+
+
+class _AnalysisContext:
+    """
+    Everything needed to analyze a license code that does not depend on the license code: where results are written
+    and the geo-located census tracts (in a fixed order) with a spatial index over their centroids and an index of the
+    neighborhood each belongs to.
+    """
+    def __init__(self, output_dir, critical_dir, census_dir, community_dir, compact=False, previous_files=None):
+        self.output_dir = output_dir
+        self.critical_dir = critical_dir
+        self.census_dir = census_dir
+        self.community_dir = community_dir
+
+        # Map of path (relative to the output directory) to SHA-1 of each file as previously written; files whose
+        # content is unchanged are not written again
+        self.previous_files = previous_files or {}
+
+        self.tracts = []        # List of (tract_id, neighborhood_name, tract_population)
+        self.tract_lats = []    # Centroid latitude of each tract in tracts
+        self.tract_lngs = []    # Centroid longitude of each tract in tracts
+
+        # Walk each neighborhood and each census tract within it (in a fixed order, so that results are reproducible)
+        for neighborhood_id in sorted(data.get_neighborhood_ids(), key=int):
+            neighborhood_name = data.get_neighborhood_name(neighborhood_id)
+
+            for tract_id in data.get_census_tracts_in_neighborhood(neighborhood_id):
+                tract_centroid = data.get_census_centroid(tract_id)
 
-        license_progress = progress.Progress(licenses_count)
-        print("Crunching data for license code " + str(license_code) + " (" + data.get_license_description(license_code)
-              + " - " + str(licenses_count) + " license records)")
+                # Ignore tracts missing geo-location data
+                if tract_centroid[0] and tract_centroid[1]:
+                    self.tracts.append((tract_id, neighborhood_name, data.get_census_population(tract_id)))
+                    self.tract_lats.append(tract_centroid[0])
+                    self.tract_lngs.append(tract_centroid[1])
 
-        # Walk each business license of this category
-        for license in licenses:
-            license_number = license[data.license_db.ROW_LICENSE_NUMBER]
-            license_start, license_end = data.get_business_years(license_number)
+        self.tract_index = gis.SpatialIndex(self.tract_lats, self.tract_lngs)
 
-            # Ignore licenses with bogus start or end dates
-            if license_start is None or license_end is None:
-                continue
+        # Index of each tract's neighborhood (its position in the list of neighborhood names)
+        self.neighborhoods = sorted(set(neighborhood_name for _, neighborhood_name, _ in self.tracts))
+        neighborhood_ids = dict((name, index) for index, name in enumerate(self.neighborhoods))
+        self.tract_neighborhoods = numpy.array([neighborhood_ids[neighborhood_name]
+                                                for _, neighborhood_name, _ in self.tracts], dtype=numpy.intp)
 
-            license_lat, license_lng = license[data.license_db.ROW_LATITUDE], license[data.license_db.ROW_LONGITUDE]
-            license_desc = license[data.license_db.ROW_LICENSE_DESCRIPTION]
+        self.tract10s = [_get_tract10(tract_id) for tract_id, _, _ in self.tracts]
 
-            # Walk each neighborhood
-            for neighborhood_id in data.get_neighborhood_ids():
-                neighborhood_name = data.get_neighborhood_name(neighborhood_id)
+        # How records are written
+        self.census_format = jsonformat.RecordFormat(CENSUS_FIELDS, compact)
+        self.neighborhood_format = jsonformat.RecordFormat(NEIGHBORHOOD_FIELDS, compact)
+        self.critical_business_format = jsonformat.RecordFormat(CRITICAL_BUSINESS_FIELDS, compact)
 
-                # Walk each census tract in the neighborhood
-                for tract_id in data.get_census_tracts_in_neighborhood(neighborhood_id):
-                    tract_centroid = data.get_census_centroid(tract_id)
-                    tract_population = data.get_census_population(tract_id)
+        # Identifies everything above that the analysis of every license code depends on
+        inputs = (ANALYSIS_VERSION, critical_dir, census_dir, community_dir, compact, self.tracts, self.tract_lats,
+                  self.tract_lngs)
+        self.fingerprint = hashlib.sha1(repr(inputs).encode("utf-8")).hexdigest()
 
-                    # Ignore records missing geo-location data
-                    if license_lat and license_lng and tract_centroid[0] and tract_centroid[1]:
-                        # Calculate the distance between this business and the center of this census tract
-                        distance = gis.distance_lat_lng(license_lat, license_lng, tract_centroid[0], tract_centroid[1])
 
-                        # Count this business in each year the license was active
-                        for year in range(license_start, license_end + 1):
-                            database.count_business(tract_id, neighborhood_name, tract_population, distance, year,
-                                                    license_code, license)
+def _get_fingerprint(license_code, context):
+    """
+    Identifies the inputs of the analysis of a license code: its licenses and the analysis context.
+    :param license_code: The license code
+    :param context: The _AnalysisContext the license code is analyzed with
+    :return: A SHA-1 hex digest
+    """
+    return hashlib.sha1((context.fingerprint + data.get_license_table().get_fingerprint(license_code))
+                        .encode("utf-8")).hexdigest()
+
+
+_worker_context = None      # The _AnalysisContext of a worker process
+
+
+def _initialize_worker(context):
+    global _worker_context
+    _worker_context = context
+
+    # Trace this worker's own events (those of the parent, copied by the fork, are the parent's to save)
+    if trace.is_enabled():
+        trace.start()
+
+
+def _analyze_in_worker(task):
+    """
+    Analyzes a license code, or one shard of it, in a worker process.
+    :param task: A pair of (license code, shard), where shard is None to analyze the whole license code or a pair of
+    (first, last) location blocks to count (see _plan_tasks)
+    :return: A tuple of (task, analyzed businesses, unique business locations, result, trace events), where result is
+    the completed files of the analysis of a whole license code, or the counts of a shard (see _Analysis.get_counts)
+    """
+    license_code, shard = task
+    if shard is None:
+        businesses, locations, files = _analyze_license_code(license_code, _worker_context, False)
+        return task, businesses, locations, files, trace.collect()
+
+    return task, 0, 0, _count_shard(license_code, shard, _worker_context), trace.collect()
+
+
+def _get_tasks(license_codes, tracts, jobs):
+    """
+    Divides the analysis of license codes into the tasks run by the given number of jobs. Run serially, each license
+    code is a task of its own; in parallel, costly license codes are split into shards (see _plan_tasks).
+    :param license_codes: The license codes to analyze
+    :param tracts: The number of census tracts analyzed
+    :param jobs: The number of license codes to analyze in parallel
+    :return: A pair of (tasks, task costs): a list of (license code, shard) pairs (see _analyze_in_worker), in license
+    code order, and a dictionary of task to estimated cost
+    """
+    costs = dict((license_code, schedule.estimate_cost(license_code, tracts)) for license_code in license_codes)
+    if jobs > 1:
+        return _plan_tasks(license_codes, costs, jobs)
+    return [(license_code, None) for license_code in license_codes], \
+        dict(((license_code, None), costs[license_code]) for license_code in license_codes)
+
+
+def _plan_tasks(license_codes, costs, workers):
+    """
+    Divides the analysis of license codes into tasks for parallel workers. A license code costing more than its share of
+    the work of each worker is split into shards (up to one per worker): contiguous ranges of its blocks of business
+    locations (see _count_access), balanced by the number of businesses in each. The counts of the shards are merged
+    into one analysis by _merge_shards.
+    :param license_codes: The license codes to analyze
+    :param costs: A dictionary of license code to estimated cost (see schedule.estimate_cost)
+    :param workers: The number of workers
+    :return: A pair of (tasks, task costs): a list of (license code, shard) pairs (see _analyze_in_worker) and a
+    dictionary of task to estimated cost
+    """
+    share = float(sum(costs.values())) / workers
+    tasks, task_costs = [], {}
+
+    for license_code in license_codes:
+        shards = int(math.ceil(costs[license_code] / share)) if share else 1
+        businesses = _Businesses(license_code) if shards > 1 else None
+        blocks = businesses.get_block_count() if businesses else 0
+
+        if min(shards, workers, blocks) < 2:
+            tasks.append((license_code, None))
+            task_costs[(license_code, None)] = costs[license_code]
+            continue
+
+        # Cut the blocks where the running count of businesses crosses each multiple of the businesses per shard
+        block_businesses = numpy.bincount(businesses.business_locations // ACCESS_BLOCK_SIZE, minlength=blocks)
+        shards = min(shards, workers, blocks)
+        cuts = numpy.searchsorted(numpy.cumsum(block_businesses),
+                                  numpy.arange(1, shards) * len(businesses.rows) / float(shards)) + 1
+        boundaries = sorted(set([0] + [int(cut) for cut in cuts if 0 < cut < blocks] + [blocks]))
+
+        for first, last in zip(boundaries[:-1], boundaries[1:]):
+            task = (license_code, (first, last))
+            tasks.append(task)
+            task_costs[task] = costs[license_code] * block_businesses[first:last].sum() // len(businesses.rows)
+
+    return tasks, task_costs
+
+
+class _Businesses:
+    """
+    The businesses of a license code that can be analyzed (those with valid license dates and a location), with the
+    unique locations among them.
+    """
+
+    def __init__(self, license_code):
+        table = data.get_license_table()
+        rows = table.get_rows(license_code)
+        self.records = len(rows)    # Number of license records of the license code, analyzable or not
+
+        # Ignore licenses with bogus start or end dates and records missing geo-location data
+        starts, ends = table.start_years[rows], table.end_years[rows]
+        lats, lngs = table.lats[rows], table.lngs[rows]
+        located = (starts > 0) & (ends > 0) & ~numpy.isnan(lats) & ~numpy.isnan(lngs)
+        self.rows, self.starts, self.ends = rows[located], starts[located], ends[located]
+
+        # Many businesses share a location (malls, storefronts with several licenses, renewals under a new license
+        # number); distances to the census tracts are computed once per unique location and shared by every business
+        # there
+        if len(self.rows):
+            self.locations, self.business_locations = numpy.unique(
+                numpy.column_stack((lats[located], lngs[located])), axis=0, return_inverse=True)
+            self.business_locations = self.business_locations.ravel()
+        else:
+            self.locations, self.business_locations = numpy.zeros((0, 2)), numpy.zeros(0, dtype=numpy.intp)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def get_years(self):
+        """
+        :return: A pair of the first and last calendar year in which any of the businesses is active
+        """
+        return int(self.starts.min()), int(self.ends.max())
+
+    def get_block_count(self):
+        """
+        :return: The number of blocks of locations whose accessibility is computed at once (see _count_access)
+        """
+        return (len(self.locations) + ACCESS_BLOCK_SIZE - 1) // ACCESS_BLOCK_SIZE
+
+
+def _analyze_license_code(license_code, context, report_progress, progress_log=None):
+    """
+    Analyzes the accessibility of all businesses of a given license code and writes the results to disk.
+    :param license_code: The license code to analyze
+    :param context: The _AnalysisContext to analyze with
+    :param report_progress: When True, the progress of the analysis is reported as it proceeds
+    :param progress_log: When reporting progress, a file to which progress reports are also written, or None
+    :return: A tuple of (analyzed businesses, unique business locations, the completed files of the analysis; see
+    _Analysis.completed)
+    """
+    with trace.span("analyze_license_code", license_code=license_code) as span:
+        license_desc = data.get_license_description(license_code)
+        businesses = _Businesses(license_code)
+
+        print("Crunching data for license code " + str(license_code) + " (" + license_desc + " - " +
+              str(businesses.records) + " license records)")
+
+        span.count("businesses", len(businesses))
+        if not len(businesses):
+            return 0, 0, {}
+        span.count("locations", len(businesses.locations))
 
-            license_progress.report()
+        database = _Analysis(license_code, license_desc, context, *businesses.get_years())
+        license_progress = progress.Telemetry("license code " + str(license_code), len(businesses),
+                                              log_file=progress_log) if report_progress else None
 
-        overall_progress.report("Overall progress: %s%% complete.\n")
+        _count(database, businesses, (0, businesses.get_block_count()), context, license_progress)
+        with trace.span("finalize"):
+            database.finalize()
+
+        if license_progress:
+            license_progress.finish()
 
         # Dump this result-set to disk
-        _dump_access(database, license_code, license_desc, output_dir, census_dir, community_dir)
-        _dump_critical(database, license_code, license_desc, output_dir, critical_dir)
+        _dump_access(database, license_code, license_desc, context.output_dir, context.census_dir,
+                     context.community_dir)
+        _dump_critical(database, license_code, license_desc, context.output_dir, context.critical_dir)
+
+        return len(businesses), len(businesses.locations), database.completed
+
+
+def _count_shard(license_code, shard, context):
+    """
+    Counts the businesses of a license code at the locations of a range of location blocks.
+    :param license_code: The license code to analyze
+    :param shard: A pair of the first and last (exclusive) location blocks to count
+    :param context: The _AnalysisContext to analyze with
+    :return: The counts of the shard (see _Analysis.get_counts)
+    """
+    with trace.span("count_shard", license_code=license_code, shard=str(shard)) as span:
+        license_desc = data.get_license_description(license_code)
+        businesses = _Businesses(license_code)
+
+        print("Crunching location blocks " + str(shard[0]) + " to " + str(shard[1] - 1) + " of " +
+              str(businesses.get_block_count()) + " of license code " + str(license_code) + " (" + license_desc + ")")
+
+        database = _Analysis(license_code, license_desc, context, *businesses.get_years())
+        database.access_blocks = []
+        span.count("businesses", _count(database, businesses, shard, context))
+        return database.get_counts()
+
+
+def _merge_shards(license_code, shard_counts, context):
+    """
+    Merges the counts of the shards of a license code into one analysis and writes the results to disk, exactly as
+    though the license code were analyzed whole.
+    :param license_code: The license code analyzed
+    :param shard_counts: The counts of every shard (see _count_shard), in order of their location blocks
+    :param context: The _AnalysisContext analyzed with
+    :return: A tuple of (analyzed businesses, unique business locations, the completed files of the analysis; see
+    _Analysis.completed)
+    """
+    with trace.span("merge_shards", license_code=license_code, shards=len(shard_counts)):
+        license_desc = data.get_license_description(license_code)
+        businesses = _Businesses(license_code)
+
+        database = _Analysis(license_code, license_desc, context, *businesses.get_years())
+        for counts in shard_counts:
+            database.merge(counts)
+        with trace.span("finalize"):
+            database.finalize()
+
+        _dump_access(database, license_code, license_desc, context.output_dir, context.census_dir,
+                     context.community_dir)
+        _dump_critical(database, license_code, license_desc, context.output_dir, context.critical_dir)
+
+        return len(businesses), len(businesses.locations), database.completed
+
+
+def _count(database, businesses, blocks, context, telemetry=None):
+    """
+    Counts the businesses at the locations of a range of location blocks in the one, two and three mile bands of the
+    census tracts near them and in the accessibility of every census tract.
+    :param database: The _Analysis object to update
+    :param businesses: The _Businesses of the license code
+    :param blocks: A pair of the first and last (exclusive) location blocks to count
+    :param context: The _AnalysisContext holding the census tracts
+    :param telemetry: The progress.Telemetry to which progress is reported, or None
+    :return: The number of businesses counted
+    """
+    locations = businesses.locations
+    in_blocks = (businesses.business_locations >= blocks[0] * ACCESS_BLOCK_SIZE) & \
+        (businesses.business_locations < blocks[1] * ACCESS_BLOCK_SIZE)
+    rows, starts, ends = businesses.rows[in_blocks], businesses.starts[in_blocks], businesses.ends[in_blocks]
+    business_locations = businesses.business_locations[in_blocks]
 
-        del database        # Try to convince Python to free our last result set (they're memory hogs)
+    # Count each business in the one, two and three mile bands of the census tracts near it
+    with trace.span("count_businesses"):
+        near_by_location = {}
+        for row, license_start, license_end, location in \
+                zip(rows.tolist(), starts.tolist(), ends.tolist(), business_locations.tolist()):
+            if location not in near_by_location:
+                near_by_location[location] = context.tract_index.query_radius(
+                    locations[location, 0], locations[location, 1], NEARBY_RADIUS)
 
+            near_tracts, near_distances = near_by_location[location]
+            database.count_business(near_tracts, near_distances, license_start, license_end, row)
 
+            if telemetry:
+                telemetry.report()
+
+    # Every business contributes to the accessibility of every census tract, however far away
+    with trace.span("count_access"):
+        _count_access(database, starts, ends, locations, business_locations, context, telemetry, blocks)
+
+    return len(rows)
+
+
+def _count_access(database, starts, ends, locations, business_locations, context, telemetry=None, blocks=None):
+    """
+    Accumulates the accessibility (ACCESS1, ACCESS2) of every census tract to the given businesses. The distances from
+    each unique business location to all tracts are computed in bulk, a block of locations at a time to bound memory
+    use. Distances shorter than MIN_ACCESS_DISTANCE count as MIN_ACCESS_DISTANCE.
+    :param database: The _Analysis object to update
+    :param starts: NumPy array of the year each business' license starts
+    :param ends: NumPy array of the year each business' license expires
+    :param locations: NumPy array of shape (locations, 2) holding each unique (lat, lng) of the businesses
+    :param business_locations: NumPy array of the row in locations of each business
+    :param context: The _AnalysisContext holding the census tracts
+    :param telemetry: The progress.Telemetry to which the distances computed are reported, or None
+    :param blocks: A pair of the first and last (exclusive) blocks of locations to count (all blocks by default); the
+    given businesses must all be at locations in these blocks
+    :return: None
+    """
+    first, last = blocks or (0, (len(locations) + ACCESS_BLOCK_SIZE - 1) // ACCESS_BLOCK_SIZE)
+    for block in range(first * ACCESS_BLOCK_SIZE, min(last * ACCESS_BLOCK_SIZE, len(locations)), ACCESS_BLOCK_SIZE):
+        block_locations = locations[block:block + ACCESS_BLOCK_SIZE]
+        distances = gis.distance_matrix(block_locations[:, 0], block_locations[:, 1],
+                                        context.tract_lats, context.tract_lngs)
+        trace.count("distances", distances.size)
+        if telemetry:
+            telemetry.report(0, 0, distances.size)
+        numpy.maximum(distances, MIN_ACCESS_DISTANCE, out=distances)
+
+        in_block = (business_locations >= block) & (business_locations < block + ACCESS_BLOCK_SIZE)
+        database.count_access(starts[in_block], ends[in_block], business_locations[in_block] - block,
+                              1.0 / distances, 1.0 / numpy.square(distances))
+
+
+def _active_years(starts, ends, years):
+    """
+    Builds an interval matrix of the years in which each of a set of businesses was active.
+    :param starts: NumPy array of the year each business' license starts
+    :param ends: NumPy array of the year each business' license expires
+    :param years: The consecutive range of years covered by the matrix
+    :return: A NumPy array of shape (len(years), len(starts)) whose element [y, b] is 1.0 if business b was active in
+    year years[y] and 0.0 otherwise
+    """
+    year_column = numpy.arange(years[0], years[0] + len(years))[:, numpy.newaxis]
+    return ((starts[numpy.newaxis, :] <= year_column) & (ends[numpy.newaxis, :] >= year_column)).astype(numpy.float64)
+
+
+@trace.traced("dump_critical")
 def _dump_critical(database, license_code, license_desc, output_dir, critical_dir):
     """
     Writes critical business data to disk.
@@ -402,16 +1008,13 @@ def _dump_critical(database, license_code, license_desc, output_dir, critical_di
     :param critical_dir: The name of the directory in the output directory to write
     :return: None
     """
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-    if not os.path.exists(output_dir + "/" + critical_dir):
-        os.makedirs(output_dir + "/" + critical_dir)
-    for year in database.get_analyzed_years_for_license_code(license_code):
+    _make_directory(output_dir + "/" + critical_dir)
+    for year in database.get_analyzed_years():
         filename = "critical-" + data.get_license_file_key(license_desc) + "-" + str(year) + ".json"
-        with open(output_dir + "/" + critical_dir + "/" + filename, "w") as critical_file:
-            critical_file.write(database.get_critical_businesses_json(license_code, year))
+        _write_output(database, output_dir, critical_dir + "/" + filename, database.encode_critical_businesses(year))
 
 
+@trace.traced("dump_access")
 def _dump_access(database, license_code, license_desc, output_dir, census_dir, community_dir):
     """
     Writes neighborhood and census-level accessibility to disk.
@@ -423,15 +1026,39 @@ def _dump_access(database, license_code, license_desc, output_dir, census_dir, c
     :param community_dir: The name of the community directory to write to
     :return: None
     """
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-    if not os.path.exists(output_dir + "/" + census_dir):
-        os.makedirs(output_dir + "/" + census_dir)
-    if not os.path.exists(output_dir + "/" + community_dir):
-        os.makedirs(output_dir + "/" + community_dir)
-    for year in database.get_analyzed_years_for_license_code(license_code):
+    _make_directory(output_dir + "/" + census_dir)
+    _make_directory(output_dir + "/" + community_dir)
+    for year in database.get_analyzed_years():
         filename = data.get_license_file_key(license_desc) + "-" + str(year) + ".json"
-        with open(output_dir + "/" + census_dir + "/" + filename, "w") as census_file:
-            census_file.write(database.get_analyzed_census_records_json(license_code, year))
-        with open(output_dir + "/" + community_dir + "/" + filename, "w") as community_file:
-            community_file.write(database.get_neighborhood_records_json(license_code, year))
+        _write_output(database, output_dir, census_dir + "/" + filename, database.encode_analyzed_census_records(year))
+        _write_output(database, output_dir, community_dir + "/" + filename, database.encode_neighborhood_records(year))
+
+
+def _write_output(database, output_dir, path, chunks):
+    """
+    Writes an output file atomically (so it is never seen half-written) and records it in database.completed. A file
+    whose content is the same as previously written is left untouched.
+    :param database: The _Analysis object whose data is written
+    :param output_dir: The base output directory
+    :param path: The path of the file to write, relative to the output directory
+    :param chunks: The content to write, as an iterable of strings
+    :return: None
+    """
+    trace.count("files")
+    database.completed[path] = write_file(output_dir + "/" + path, chunks,
+                                          unchanged_digest=database.previous_files.get(path))
+
+
+def _make_directory(path):
+    """
+    Creates a directory (and any missing parents) unless it already exists. Safe to call from several worker processes
+    at once.
+    :param path: The directory to create
+    :return: None
+    """
+    if not os.path.exists(path):
+        try:
+            os.makedirs(path)
+        except OSError:
+            if not os.path.isdir(path):
+                raise
@@ -0,0 +1,284 @@
+"""
+Benchmarks each stage of the pipeline against synthetic datasets (see oasis.synthetic) of one or more sizes, recording
+wall time, license records processed per second and peak memory use for every stage.
+
+Each dataset size is benchmarked in a fresh interpreter so that its peak memory is not inflated by the sizes benchmarked
+before it. Peak memory is the high-water mark of the process at the end of the stage, so it never decreases from one
+stage to the next.
+
+Usage: python -m oasis.benchmark [--rows N ...] [--seed N] [--jobs N] [--output FILE] [--compare FILE] [--dates]
+"""
+
+import argparse
+import csv
+import json
+import os
+import os.path
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None     # Not available on Windows
+
+from oasis import synthetic
+
+STAGES = ["load", "license_index", "socioeconomic", "analysis", "output"]
+
+
+def run_benchmarks(sizes, seed=1, jobs=1):
+    """
+    Generates a synthetic dataset of each size and benchmarks the pipeline against it.
+    :param sizes: A list of dataset sizes (number of business license records)
+    :param seed: The random seed used to generate the datasets
+    :param jobs: The number of license codes to analyze in parallel
+    :return: A list of results, one dictionary per size (see benchmark_dataset)
+    """
+    results = []
+    for rows in sizes:
+        work_dir = tempfile.mkdtemp(prefix="oasis-benchmark-")
+        try:
+            data_dir, output_dir = os.path.join(work_dir, "data"), os.path.join(work_dir, "output")
+            os.makedirs(output_dir)
+
+            print("Generating " + str(rows) + " synthetic license records...")
+            synthetic.generate(data_dir, rows, seed)
+
+            print("Benchmarking " + str(rows) + " license records...")
+            results_file = os.path.join(work_dir, "results.json")
+            with open(os.devnull, 'w') as devnull:
+                subprocess.check_call([sys.executable, "-m", "oasis.benchmark", "--run", data_dir, output_dir,
+                                       results_file, "--rows", str(rows), "--jobs", str(jobs)], stdout=devnull)
+
+            with open(results_file) as result:
+                results.append(json.load(result))
+        finally:
+            shutil.rmtree(work_dir)
+
+    return results
+
+
+def benchmark_dataset(data_dir, output_dir, rows, jobs=1):
+    """
+    Runs every stage of the pipeline against the dataset in data_dir, writing reports to output_dir. Expects to run in
+    a fresh interpreter: the datasets are read through the module-level caches in oasis.data.
+    :param data_dir: A directory containing a synthetic dataset
+    :param output_dir: The directory where reports should be written
+    :param rows: The number of license records in the dataset
+    :param jobs: The number of license codes to analyze in parallel
+    :return: A dictionary with the dataset size and a dictionary of measurements for each stage
+    """
+    tempfile.tempdir = data_dir
+
+    from oasis import analysis, data, datasources, license_index, socioeconomic
+    data.neighborhood_tracts_map_db = datasources.NeighborhoodTractsMap(data_dir)
+
+    stages = {}
+    timer = _Timer(rows)
+
+    with timer.stage(stages, "load"):
+        data.initialize_license_cache()
+        data.warm_indexes()
+
+    with timer.stage(stages, "license_index"):
+        license_index.produce_license_rpt(output_dir)
+
+    with timer.stage(stages, "socioeconomic"):
+        socioeconomic.produce_socioeconomic_rpt(output_dir)
+
+    # Time spent writing reports is accounted to its own stage (forked workers cannot report it, however)
+    output_seconds = [0.0]
+    dump_access, dump_critical = analysis._dump_access, analysis._dump_critical
+
+    def timed(dump):
+        def wrapper(*args):
+            started = time.time()
+            try:
+                return dump(*args)
+            finally:
+                output_seconds[0] += time.time() - started
+        return wrapper
+
+    analysis._dump_access, analysis._dump_critical = timed(dump_access), timed(dump_critical)
+    try:
+        with timer.stage(stages, "analysis"):
+            analysis.produce_accessibility_rpt(output_dir, "critical", "census", "community", [], None, jobs)
+    finally:
+        analysis._dump_access, analysis._dump_critical = dump_access, dump_critical
+
+    if jobs <= 1:
+        stages["analysis"] = timer.measure(stages["analysis"]["seconds"] - output_seconds[0])
+        stages["output"] = timer.measure(output_seconds[0])
+
+    return {"rows": rows, "jobs": jobs, "stages": stages}
+
+
+def benchmark_date_parsing(rows, seed=1):
+    """
+    Times extracting the years of the license term dates of a synthetic dataset, as the license cache build does, with
+    time.strptime (parsing every date) and with oasis.data (parsing each distinct date once).
+    :param rows: The number of license records in the dataset
+    :param seed: The random seed used to generate the dataset
+    :return: A dictionary with the dataset size and the seconds taken by each method
+    """
+    from oasis import data, datasources
+
+    work_dir = tempfile.mkdtemp(prefix="oasis-benchmark-")
+    try:
+        synthetic.generate(work_dir, rows, seed)
+        licenses = datasources.BusinessLicenses()
+        with open(os.path.join(work_dir, licenses.get_local_filename())) as license_file:
+            dates = [(license[licenses.ROW_LICENSE_TERM_START_DATE], license[licenses.ROW_LICENSE_TERM_END_DATE])
+                     for license in csv.DictReader(license_file)]
+    finally:
+        shutil.rmtree(work_dir)
+
+    started = time.time()
+    for start, end in dates:
+        if start and end:
+            time.strptime(start, "%m/%d/%Y").tm_year, time.strptime(end, "%m/%d/%Y").tm_year
+    strptime_seconds = time.time() - started
+
+    started = time.time()
+    years = {}
+    for start, end in dates:
+        data._get_year(start, years), data._get_year(end, years)
+    memoized_seconds = time.time() - started
+
+    return {"rows": rows, "strptime_seconds": strptime_seconds, "memoized_seconds": memoized_seconds}
+
+
+def compare(results, baseline, tolerance):
+    """
+    Finds stages that have become slower than in a baseline set of results.
+    :param results: The results of run_benchmarks
+    :param baseline: Previously recorded results of run_benchmarks
+    :param tolerance: The fraction by which a stage may be slower than the baseline before it is a regression
+    :return: A list of (rows, stage, seconds, baseline seconds) tuples, one for each regression
+    """
+    baseline_stages = dict((result["rows"], result["stages"]) for result in baseline)
+
+    regressions = []
+    for result in results:
+        for stage, measurement in sorted(result["stages"].items()):
+            expected = baseline_stages.get(result["rows"], {}).get(stage)
+            if expected and measurement["seconds"] > expected["seconds"] * (1 + tolerance):
+                regressions.append((result["rows"], stage, measurement["seconds"], expected["seconds"]))
+
+    return regressions
+
+
+def print_results(results):
+    print("%10s  %-14s %10s %14s %12s" % ("rows", "stage", "seconds", "rows/sec", "peak MB"))
+    for result in results:
+        for stage in STAGES:
+            if stage in result["stages"]:
+                measurement = result["stages"][stage]
+                peak_mb = measurement["peak_mb"]
+                print("%10d  %-14s %10.3f %14.0f %12s" % (result["rows"], stage, measurement["seconds"],
+                                                          measurement["rows_per_sec"],
+                                                          "n/a" if peak_mb is None else "%.1f" % peak_mb))
+
+
+class _Timer:
+    """
+    Measures the wall time and memory high-water mark of pipeline stages.
+    """
+
+    def __init__(self, rows):
+        self._rows = rows
+
+    def stage(self, stages, name):
+        """
+        Creates a context manager that records the measurement of its block in stages under the given name.
+        """
+        return _Stage(self, stages, name)
+
+    def measure(self, seconds):
+        return {
+            "seconds": seconds,
+            "rows_per_sec": self._rows / seconds if seconds > 0 else 0.0,
+            "peak_mb": _get_peak_memory_mb()
+        }
+
+
+class _Stage:
+
+    def __init__(self, timer, stages, name):
+        self._timer = timer
+        self._stages = stages
+        self._name = name
+        self._started = None
+
+    def __enter__(self):
+        self._started = time.time()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stages[self._name] = self._timer.measure(time.time() - self._started)
+
+
+def _get_peak_memory_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024.0 * 1024.0) if sys.platform == "darwin" else peak / 1024.0    # Bytes on macOS, else KB
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks the Chicago Oasis pipeline against synthetic data.")
+    parser.add_argument('--rows', action='append', dest='sizes', type=int, default=[],
+                        help="number of license records to benchmark (may be repeated; default is 10000)")
+    parser.add_argument('--seed', action='store', dest='seed', type=int, default=1,
+                        help="random seed used to generate the datasets (default is 1)")
+    parser.add_argument('-j', '--jobs', action='store', dest='jobs', type=int, default=1,
+                        help="number of license codes to analyze in parallel (default is 1)")
+    parser.add_argument('--output', action='store', dest='output', default=None,
+                        help="file where results should be written as JSON")
+    parser.add_argument('--compare', action='store', dest='compare', default=None,
+                        help="JSON results of a previous run; exits with an error if any stage is slower")
+    parser.add_argument('--tolerance', action='store', dest='tolerance', type=float, default=0.25,
+                        help="fraction by which a stage may be slower than in --compare (default is 0.25)")
+    parser.add_argument('--dates', action='store_true', dest='dates', default=False,
+                        help="only benchmark parsing the license term dates")
+    parser.add_argument('--run', nargs=3, dest='run', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        data_dir, output_dir, results_file = args.run
+        result = benchmark_dataset(data_dir, output_dir, args.sizes[0], args.jobs)
+        with open(results_file, "w") as output_file:
+            output_file.write(json.dumps(result, indent=2))
+        return
+
+    if args.dates:
+        print("%10s %18s %18s %10s" % ("rows", "strptime seconds", "memoized seconds", "speedup"))
+        for rows in args.sizes or [10000]:
+            result = benchmark_date_parsing(rows, args.seed)
+            print("%10d %18.3f %18.3f %9.1fx" % (rows, result["strptime_seconds"], result["memoized_seconds"],
+                                                 result["strptime_seconds"] / max(result["memoized_seconds"], 1e-9)))
+        return
+
+    results = run_benchmarks(args.sizes or [10000], args.seed, args.jobs)
+    print_results(results)
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(json.dumps(results, indent=2))
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.tolerance)
+
+        for rows, stage, seconds, expected in regressions:
+            print("Regression: " + stage + " stage of " + str(rows) + " records took %.3fs (was %.3fs)" %
+                  (seconds, expected))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import gzip
+import io
+import json
+import multiprocessing
+import os
+import os.path
+from multiprocessing.pool import ThreadPool
+from oasis.manifest import hash_file, write_file
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSED_INDEX_FILENAME = "compressed.json"
+
+
+class Compressor:
+    """
+    Writes pre-compressed siblings of output files (i.e., "census/tavern-2014.json.gz") for serving from static hosting.
+
+    Files are compressed on a pool of threads (zlib and brotli release the interpreter lock while they work) so that
+    compression proceeds alongside the analysis writing them. The threads are only started once the first file needs
+    compressing, so that a compressor can be created before the analysis forks its worker processes (provided nothing
+    is submitted until they are forked). An index in the output directory records the SHA-1 of the
+    content each file's siblings were compressed from; files whose content has not changed since are not compressed
+    again.
+    """
+
+    def __init__(self, output_dir, formats=("gz",), threads=None):
+        """
+        :param output_dir: The directory where output is written
+        :param formats: The compressed formats to write, any of "gz" (gzip) and "br" (brotli, which requires the
+        brotli package)
+        :param threads: The number of files to compress at once (the number of CPUs by default)
+        """
+        check_formats(formats)
+
+        self._output_dir = output_dir
+        self._formats = tuple(formats)
+        self._threads = threads or multiprocessing.cpu_count()
+        self._pool = None           # The ThreadPool compressing files, once any file has been submitted
+        self._pending = []          # List of (path, SHA-1, AsyncResult) of each file being compressed
+        self._compressed = 0        # Number of files compressed
+        self._unchanged = 0         # Number of files skipped, unchanged since they were last compressed
+
+        try:
+            with open(self.get_index_path()) as index_file:
+                self._index = json.load(index_file)
+        except (IOError, OSError, ValueError):
+            self._index = {}        # Map of path (relative to the output directory) to SHA-1 it was compressed from
+
+    def get_index_path(self):
+        return os.path.join(self._output_dir, COMPRESSED_INDEX_FILENAME)
+
+    def submit(self, path, digest=None):
+        """
+        Compresses a file in the background, unless it has not changed since it was last compressed.
+        :param path: The path of the file, relative to the output directory
+        :param digest: The SHA-1 hex digest of the content of the file, if known (otherwise the file is hashed)
+        :return: None
+        """
+        full_path = os.path.join(self._output_dir, path)
+        if digest is None:
+            digest = hash_file(full_path)
+
+        if self._index.get(path) == digest and \
+                all(os.path.exists(full_path + "." + compressed_format) for compressed_format in self._formats):
+            self._unchanged += 1
+            return
+
+        if self._pool is None:
+            self._pool = ThreadPool(self._threads)
+
+        self._collect(False)
+        self._pending.append((path, digest, self._pool.apply_async(_compress_file, (full_path, self._formats))))
+
+    def submit_all(self, files):
+        """
+        Compresses a set of files in the background (see submit).
+        :param files: A dictionary of the path (relative to the output directory) to the SHA-1 hex digest of each file
+        :return: None
+        """
+        for path in sorted(files):
+            self.submit(path, files[path])
+
+    def finish(self):
+        """
+        Waits for all files to be compressed and saves the index.
+        :return: None
+        """
+        if self._pool is not None:
+            self._pool.close()
+            self._collect(True)
+            self._pool.join()
+
+        write_file(self.get_index_path(), [json.dumps(self._index, indent=2, sort_keys=True)], True)
+        print("Compressed " + str(self._compressed) + " files (" + str(self._unchanged) + " unchanged files skipped)")
+
+    def _collect(self, wait):
+        """
+        Records the files whose compression has finished (or every file, waiting as needed, when wait is True).
+        """
+        pending = []
+        for path, digest, result in self._pending:
+            if wait or result.ready():
+                result.get()    # Raises the exception compressing the file, if any
+                self._index[path] = digest
+                self._compressed += 1
+            else:
+                pending.append((path, digest, result))
+        self._pending = pending
+
+
+def check_formats(formats):
+    """
+    Checks that files can be compressed in each of the given formats.
+    :param formats: The compressed formats (see Compressor)
+    :return: None
+    :raises ValueError: If a format is unknown, or requires a package that is not installed
+    """
+    for compressed_format in formats:
+        if compressed_format not in _COMPRESSORS:
+            raise ValueError("Unknown compressed format: " + str(compressed_format))
+        if compressed_format == "br" and brotli is None:
+            raise ValueError("Brotli compression requires the brotli package (pip install brotli)")
+
+
+def _compress_file(path, formats):
+    with open(path, 'rb') as source_file:
+        content = source_file.read()
+
+    for compressed_format in formats:
+        compressed_path = path + "." + compressed_format
+        with open(compressed_path + ".tmp", 'wb') as compressed_file:
+            compressed_file.write(_COMPRESSORS[compressed_format](content))
+        os.rename(compressed_path + ".tmp", compressed_path)
+
+
+def _gzip(content):
+    # A zero modification time keeps the output identical for identical content
+    buffer = io.BytesIO()
+    with gzip.GzipFile(filename="", mode='wb', compresslevel=9, fileobj=buffer, mtime=0) as gzip_file:
+        gzip_file.write(content)
+    return buffer.getvalue()
+
+
+def _brotli(content):
+    return brotli.compress(content)
+
+
+_COMPRESSORS = {"gz": _gzip, "br": _brotli}
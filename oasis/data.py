@@ -1,4 +1,21 @@
+import datetime
+import hashlib
+import json
+import math
+import numpy
+import os
+import stat
+import time
+from array import array
+from multiprocessing.pool import ThreadPool
 from time import strptime
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from oasis import trace
 from oasis.datasources import BusinessLicenses, CensusTracts, Neighborhoods, NeighborhoodTractsMap, Socioeconomic
 
 # Cache of data sources
@@ -9,25 +26,28 @@ neighborhood_tracts_map_db = NeighborhoodTractsMap()
 socioeconomic_db = Socioeconomic()
 
 # Cache of previously computed requests; improves performance several order of magnitude
-_cached_neighborhood_ids = []           # Cached set of neighborhood ids (community area numbers, 1..77)
-_cached_tract_ids = set()               # Cached set of census tract ids
-_cached_neighborhood_names = {}         # Map of neighborhood id (1..77) to neighborhood name
-_cached_tracts_in_neighborhood = {}     # Map of neighborhood id (1..77) to list of census tract ids
-_cached_tract_pops = {}                 # Map of census_tract_id to population
-_cached_centroids = {}                  # Map of census_tract_id to centroid (lat, lng)
 _cached_license_date_start = {}         # Map of license code to first year with license records
 _cached_license_date_end = {}           # Map of license_code to last year with license records
 _cached_license_codes = set()           # Cached set of unique license codes
 _cached_license_desc = {}               # Map of license_code to license_description
-_cached_licenses = {}                   # Map of license_code to license_record[]
-_cached_business_years = {}             # Map of license_number to (license_start_year, license_end_year)
-_cached_business_dba = {}               # Map of license_number to doing-business-as name
-_cached_business_legal = {}             # Map of license_number to legal name
-_cached_business_loc = {}               # Map of license_number to (lat, lng)
-_cached_business_addr = {}              # Map of license_number to address
-_cached_business_city = {}              # Map of license_number to city
-_cached_business_state = {}             # Map of license_number to state
-_cached_business_zip = {}               # Map of license_number to zip
+_cached_license_table = None            # LicenseTable of every business license (see initialize_license_cache)
+
+# Caches built by initialize_license_cache (and saved to/loaded from the license cache snapshot)
+_LICENSE_CACHE_NAMES = ('_cached_license_date_start', '_cached_license_date_end', '_cached_license_codes',
+                        '_cached_license_desc', '_cached_license_table')
+
+# Bump whenever the content or structure of the license caches changes to invalidate existing snapshots
+_LICENSE_CACHE_SNAPSHOT_VERSION = 3
+
+
+def warm_indexes():
+    """
+    Reads the census tract, neighborhood and neighborhood-to-tract datasets and builds their lookup indexes, so that the
+    lookups below never touch the disk. Otherwise, each dataset is indexed on its first lookup.
+    :return: None
+    """
+    for dataset in (census_tracts_db, neighborhood_db, neighborhood_tracts_map_db):
+        dataset.warm()
 
 
 def get_census_tract_ids():
@@ -35,17 +55,7 @@ def get_census_tract_ids():
     Returns a set containing the census tract ID of every census tract in Chicago.
     :return: A set of census tract IDs. For example, (020301, 020302, ...)
     """
-    global _cached_tract_ids
-    if len(_cached_tract_ids) > 0:
-        return _cached_tract_ids
-
-    tracts = census_tracts_db.as_dictionary()
-    ids = set()
-    for tract in tracts:
-        ids.add(tract[census_tracts_db.ROW_GEOID])
-
-    _cached_tract_ids = ids
-    return ids
+    return census_tracts_db.get_index("geo_ids")
 
 
 def get_neighborhood_ids():
@@ -54,17 +64,7 @@ def get_neighborhood_ids():
     city does not annex or de-annex neighborhoods, this should always result in a set equal to range(1,78).
     :return: A set of community IDs. For example, (1, 2, 3, ... 77)
     """
-    global _cached_neighborhood_ids
-    if len(_cached_neighborhood_ids) > 0:
-        return _cached_neighborhood_ids
-
-    neighborhoods = neighborhood_db.as_dictionary()
-    ids = set()
-    for neighborhood in neighborhoods:
-        ids.add(neighborhood[neighborhood_db.ROW_AREA_NUMBER])
-
-    _cached_neighborhood_ids = ids
-    return ids
+    return neighborhood_db.get_index("ids")
 
 
 def get_neighborhood_name(neighborhood_id):
@@ -73,15 +73,7 @@ def get_neighborhood_name(neighborhood_id):
     :param neighborhood_id: A community area ID (as returned by get_neighborhood_ids)
     :return: The name of the neighborhood in all uppercase. For example, "LINCOLN PARK"
     """
-    global _cached_neighborhood_names
-    if neighborhood_id in _cached_neighborhood_names:
-        return _cached_neighborhood_names[neighborhood_id]
-
-    neighborhoods = neighborhood_db.as_dictionary()
-    for neighborhood in neighborhoods:
-        if neighborhood[neighborhood_db.ROW_AREA_NUMBER] == neighborhood_id:
-            _cached_neighborhood_names[neighborhood_id] = neighborhood[neighborhood_db.ROW_AREA_NAME].upper()
-            return _cached_neighborhood_names[neighborhood_id]
+    return neighborhood_db.get_index("names").get(neighborhood_id)
 
 
 def get_census_tracts_in_neighborhood(neighborhood_id):
@@ -90,18 +82,7 @@ def get_census_tracts_in_neighborhood(neighborhood_id):
     :param neighborhood_id: The ID of the neighborhood to be returned
     :return:
     """
-    global _cached_tracts_in_neighborhood
-    if neighborhood_id in _cached_tracts_in_neighborhood:
-        return _cached_tracts_in_neighborhood[neighborhood_id]
-
-    mapping_data = neighborhood_tracts_map_db.as_dictionary()
-    tracts = list()
-    for mapping in mapping_data:
-        if neighborhood_id == mapping[neighborhood_tracts_map_db.ROW_AREA_NUMBER]:
-            tracts.append(mapping[neighborhood_tracts_map_db.ROW_TRACT_GEOID])
-
-    _cached_tracts_in_neighborhood[neighborhood_id] = tracts
-    return tracts
+    return neighborhood_tracts_map_db.get_index("tracts").get(neighborhood_id, [])
 
 
 def get_census_population(census_tract_id):
@@ -110,13 +91,7 @@ def get_census_population(census_tract_id):
     :param census_tract_id: The census tract id
     :return: The population of the census tract
     """
-    global _cached_tract_pops
-    if census_tract_id in _cached_tract_pops:
-        return _cached_tract_pops[census_tract_id]
-
-    for tract in census_tracts_db.as_dictionary():
-        _cached_tract_pops[convert_geo_id_to_tract_id(tract[census_tracts_db.ROW_GEOID])] = tract[census_tracts_db.ROW_POPULATION]
-    return _cached_tract_pops[census_tract_id]
+    return census_tracts_db.get_index("populations")[census_tract_id]
 
 
 def get_census_centroid(census_tract_id):
@@ -125,15 +100,7 @@ def get_census_centroid(census_tract_id):
     :param census_tract_id:
     :return:
     """
-    global _cached_centroids
-    if census_tract_id in _cached_centroids:
-        return _cached_centroids[census_tract_id]
-
-    tracts = census_tracts_db.as_dictionary()
-    for tract in tracts:
-        if tract_id_equals(census_tract_id, tract[census_tracts_db.ROW_GEOID]):
-            _cached_centroids[census_tract_id] = float(tract[census_tracts_db.ROW_LATITUDE]), float(tract[census_tracts_db.ROW_LONGITUDE])
-            return _cached_centroids[census_tract_id]
+    return census_tracts_db.get_index("centroids").get(census_tract_id)
 
 
 def convert_geo_id_to_tract_id(geo_id):
@@ -161,10 +128,10 @@ def get_license_date_range(license_code):
     """
     Gets a pair of years indicating the earliest latest date for which data is available for the given license code.
     :param license_code: The license code
-    :return: A pair of (earliest_date, latest_date)
+    :return: A pair of (earliest_date, latest_date), or (None, None) if no record of the license code has valid dates
     """
     global _cached_license_date_start, _cached_license_date_end
-    return _cached_license_date_start[license_code], _cached_license_date_end[license_code]
+    return _cached_license_date_start.get(license_code), _cached_license_date_end.get(license_code)
 
 
 def get_licenses(license_code):
@@ -172,21 +139,32 @@ def get_licenses(license_code):
     Returns a list of business license records associated with the given license code. Each record is a map of row name
     to row value. Only "required" rows are returned in the result set. See the datasources module for information about
     required rows.
+
+    Records are materialized from the license table on every call; prefer get_license_table for bulk access.
     :param license_code: The license code of the licenses to return
     :return: A list of business license record dictionaries.
     """
-    global _cached_licenses
-    return _cached_licenses[license_code]
+    global _cached_license_table
+    return [_cached_license_table.get_record(row) for row in _cached_license_table.get_rows(license_code)]
+
+
+def get_license_table():
+    """
+    Gets the columnar table of every business license, one row per license number.
+    :return: The LicenseTable built by initialize_license_cache
+    """
+    global _cached_license_table
+    return _cached_license_table
 
 
 def get_business_years(license_number):
     """
-    Retuns a set of four-digit years containing every year for which data exists.
+    Retuns a pair of four-digit years spanning every year for which data exists.
     :param license_number: The license number whose license year range should be returned.
-    :return: A set of years in which the business was active.
+    :return: A pair of (license_start_year, license_end_year), or (None, None) if the years are unknown
     """
-    global _cached_business_years
-    return _cached_business_years[license_number]
+    global _cached_license_table
+    return _cached_license_table.get_years(_cached_license_table.get_row(license_number))
 
 
 def get_license_codes():
@@ -214,12 +192,8 @@ def get_business_dba(license_number):
     :param license_number: The business' license number
     :return: The business' DBA name
     """
-    global _cached_business_dba
-
-    if license_number in _cached_business_dba:
-        return _cached_business_dba[license_number]
-    else:
-        return "UNDEFINED"
+    global _cached_license_table
+    return _cached_license_table.dbas.get(_cached_license_table.get_row(license_number), "UNDEFINED")
 
 
 def get_business_legal_name(license_number):
@@ -228,12 +202,8 @@ def get_business_legal_name(license_number):
     :param license_number: The business' license number
     :return: The business' legal name
     """
-    global _cached_business_legal
-
-    if license_number in _cached_business_legal:
-        return _cached_business_legal[license_number]
-    else:
-        return "UNDEFINED"
+    global _cached_license_table
+    return _cached_license_table.legal_names.get(_cached_license_table.get_row(license_number), "UNDEFINED")
 
 
 def get_business_lat_lng(license_number):
@@ -243,12 +213,8 @@ def get_business_lat_lng(license_number):
     :param license_number: The business' license number
     :return: The lat/lng of the business
     """
-    global _cached_business_loc
-
-    if license_number in _cached_business_loc:
-        return _cached_business_loc[license_number]
-    else:
-        return 0.0, 0.0
+    global _cached_license_table
+    return _cached_license_table.get_business_location(_cached_license_table.get_row(license_number))
 
 
 def get_business_address(license_number):
@@ -257,12 +223,8 @@ def get_business_address(license_number):
     :param license_number: The business' license number
     :return: The street address of the business, for example "222 SOUTH RIVERSIDE PLZ"
     """
-    global _cached_business_addr
-
-    if license_number in _cached_business_addr:
-        return _cached_business_addr[license_number]
-    else:
-        return "UNDEFINED"
+    global _cached_license_table
+    return _cached_license_table.addresses.get(_cached_license_table.get_row(license_number), "UNDEFINED")
 
 
 def get_business_city(license_number):
@@ -272,12 +234,8 @@ def get_business_city(license_number):
     :param license_number: The business' license number.
     :return: The name of the city listed in the business' address
     """
-    global _cached_business_city
-
-    if license_number in _cached_business_city:
-        return _cached_business_city[license_number]
-    else:
-        return "UNDEFINED"
+    global _cached_license_table
+    return _cached_license_table.cities.get(_cached_license_table.get_row(license_number), "UNDEFINED")
 
 
 def get_business_state(license_number):
@@ -287,12 +245,8 @@ def get_business_state(license_number):
     :param license_number: The business' license number
     :return: The two-letter state abbreviation associated with the business address
     """
-    global _cached_business_state
-
-    if license_number in _cached_business_state:
-        return _cached_business_state[license_number]
-    else:
-        return "UNDEFINED"
+    global _cached_license_table
+    return _cached_license_table.states.get(_cached_license_table.get_row(license_number), "UNDEFINED")
 
 
 def get_business_zip(license_number):
@@ -301,12 +255,8 @@ def get_business_zip(license_number):
     :param license_number: The business' license number.
     :return: The business' zip code
     """
-    global _cached_business_zip
-
-    if license_number in _cached_business_zip:
-        return _cached_business_zip[license_number]
-    else:
-        return "UNDEFINED"
+    global _cached_license_table
+    return _cached_license_table.zips.get(_cached_license_table.get_row(license_number), "UNDEFINED")
 
 
 def get_license_file_key(license_desc):
@@ -328,19 +278,59 @@ def get_license_file_key(license_desc):
         .replace(";", "")
 
 
-def download_all():
+def download_all(revalidate=False):
     """
     Mark all datasets as needing download.
+    :param revalidate: When True, datasets already in the cache are only transferred again if the server reports they
+    have changed since they were downloaded; otherwise, every dataset is transferred again in full
     :return: None
     """
-    global license_db, census_tracts_db, neighborhood_db, neighborhood_tracts_map_db
+    global license_db, census_tracts_db, neighborhood_db, neighborhood_tracts_map_db, socioeconomic_db
     license_db = BusinessLicenses(True)
     census_tracts_db = CensusTracts(True)
     neighborhood_db = Neighborhoods(True)
-    Socioeconomic(True)
+    socioeconomic_db = Socioeconomic(True)
     neighborhood_tracts_map_db = NeighborhoodTractsMap()
 
+    if not revalidate:
+        for dataset in (license_db, census_tracts_db, neighborhood_db, socioeconomic_db):
+            dataset.discard_validators()
+
+
+def prefetch_all(report_interval=10.0):
+    """
+    Downloads every remote dataset that is not already cached, concurrently, so that the time spent waiting on the
+    network is that of the slowest download rather than the sum of all of them. Reports the progress of each download
+    periodically, and the size and download time of each dataset once complete.
+    :param report_interval: Seconds between progress reports
+    :return: None
+    """
+    datasets = [license_db, census_tracts_db, neighborhood_db, socioeconomic_db]
+
+    pool = ThreadPool(len(datasets))
+    try:
+        results = pool.map_async(_prefetch, datasets)
+        while not results.ready():
+            results.wait(report_interval)
+            for dataset in datasets:
+                if dataset.get_bytes_received() and not os.path.exists(dataset.get_cache_file_path()):
+                    print("  ... " + dataset.get_local_filename() + ": %.1f MB received" %
+                          (dataset.get_bytes_received() / 1048576.0))
+
+        for filename, size, seconds in results.get():
+            print("  " + filename + ": %.1f MB ready in %.1fs" % (size / 1048576.0, seconds))
+    finally:
+        pool.close()
+        pool.join()
+
 
+def _prefetch(dataset):
+    started = time.time()
+    cache_file_path = dataset.read_cache()
+    return dataset.get_local_filename(), os.path.getsize(cache_file_path), time.time() - started
+
+
+@trace.traced("initialize_license_cache")
 def initialize_license_cache():
     """
     Builds a set of caches used by this module to provide fast data lookups. This method _must_ be called before any
@@ -348,12 +338,15 @@ def initialize_license_cache():
     :return: None
     """
     global _cached_license_date_start, _cached_license_date_end, _cached_license_codes
-    global _cached_license_desc, _cached_licenses, _cached_business_dba, _cached_business_legal, _cached_business_loc
-    global _cached_business_addr, _cached_business_city, _cached_business_state, _cached_business_zip
-    global _cached_business_years
+    global _cached_license_desc, _cached_license_table
 
     # Cache is already initialized
-    if _cached_licenses:
+    if _cached_license_table is not None:
+        return
+
+    # Restore the caches from the last run when the license data hasn't changed since
+    signature = license_db.get_cache_signature()
+    if _load_license_cache_snapshot(signature):
         return
 
     print("Building license data caches...")
@@ -362,17 +355,11 @@ def initialize_license_cache():
     _cached_license_date_end = {}       # Map of license_code to last year with license records
     _cached_license_codes = set()       # Cached set of unique license codes
     _cached_license_desc = {}           # Map of license_code to license_description
-    _cached_licenses = {}               # Map of license_code to license_record[]
-    _cached_business_years = {}         # Map of license_number to (license_start_year, license_end_year)
-    _cached_business_dba = {}           # Map of license_number to doing-business-as name
-    _cached_business_legal = {}         # Map of license_number to legal name
-    _cached_business_loc = {}           # Map of license_number to (lat, lng)
-    _cached_business_addr = {}          # Map of license_number to address
-    _cached_business_city = {}          # Map of license_number to city
-    _cached_business_state = {}         # Map of license_number to state
-    _cached_business_zip = {}           # Map of license_number to zip
-
-    dup_licenses = set()
+
+    table = LicenseTable()
+    years = {}                          # Map of license term date to its year (see _get_year)
+    undated = 0                         # Number of license records missing a valid term start or expiration date
+    malformed = []                      # A few of the malformed (as opposed to missing) dates, for reporting
 
     for license in license_db.as_dictionary():
         license_code = license[license_db.ROW_LICENSE_CODE]
@@ -380,65 +367,456 @@ def initialize_license_cache():
         license_start = license[license_db.ROW_LICENSE_TERM_START_DATE]
         license_end = license[license_db.ROW_LICENSE_TERM_END_DATE]
         license_number = license[license_db.ROW_LICENSE_NUMBER]
-        business_dba = license[license_db.ROW_BUSINESS_DBA]
-        business_legal = license[license_db.ROW_BUSINESS_LEGAL_NAME]
-        business_address = license[license_db.ROW_BUSINESS_ADDRESS]
-        business_state = license[license_db.ROW_BUSINESS_STATE]
-        business_zip = license[license_db.ROW_BUSINESS_ZIP]
-        business_city = license[license_db.ROW_BUSINESS_CITY]
-        business_lat = license[license_db.ROW_LATITUDE]
-        business_lng = license[license_db.ROW_LONGITUDE]
-
-        if license_start and license_end:
-            start_year = strptime(license_start, "%m/%d/%Y").tm_year
-            end_year = strptime(license_end, "%m/%d/%Y").tm_year
-
-        if license_code not in _cached_license_date_start:
-            _cached_license_date_start[license_code] = start_year
-        if start_year < _cached_license_date_start[license_code]:
-            _cached_license_date_start[license_code] = start_year
-
-        if license_code not in _cached_license_date_end:
-            _cached_license_date_end[license_code] = end_year
-        if end_year > _cached_license_date_end[license_code]:
-            _cached_license_date_end[license_code] = end_year
+
+        start_year, end_year = _get_year(license_start, years), _get_year(license_end, years)
+
+        if start_year and end_year:
+            if license_code not in _cached_license_date_start:
+                _cached_license_date_start[license_code] = start_year
+            if start_year < _cached_license_date_start[license_code]:
+                _cached_license_date_start[license_code] = start_year
+
+            if license_code not in _cached_license_date_end:
+                _cached_license_date_end[license_code] = end_year
+            if end_year > _cached_license_date_end[license_code]:
+                _cached_license_date_end[license_code] = end_year
+        else:
+            # The record's years are unknown (0); the analysis ignores it
+            start_year = end_year = 0
+            undated += 1
+            for date in (license_start, license_end):
+                if date and not years[date] and len(malformed) < 3 and date not in malformed:
+                    malformed.append(date)
 
         if license_desc and license_code:
             _cached_license_desc[license_code] = license_desc
 
+        row = table.add_business(license_number, license)
+
         if license_code:
             _cached_license_codes.add(license_code)
+            table.add_license(row, license_code, start_year, end_year, license)
 
-            if license_code not in _cached_licenses:
-                _cached_licenses[license_code] = list()
+    table.seal()
+    _cached_license_table = table
 
-            if license_number not in dup_licenses:
-                _cached_licenses[license_code].append(license_db.required_rows_copy(license))
-                _cached_business_years[license_number] = (start_year, end_year)
-                dup_licenses.add(license_number)
-            else:
-                if start_year < _cached_business_years[license_number][0]:
-                    _cached_business_years[license_number] = (start_year, _cached_business_years[license_number][1])
-                if end_year > _cached_business_years[license_number][1]:
-                    _cached_business_years[license_number] = (_cached_business_years[license_number][0], end_year)
+    trace.count("businesses", len(table))
+    trace.count("license_codes", len(_cached_license_codes))
+    trace.count("undated_records", undated)
 
-        if business_dba and license_number not in _cached_business_dba:
-            _cached_business_dba[license_number] = business_dba
+    if undated:
+        print("Ignoring " + str(undated) + " license records with missing or malformed term dates" +
+              (" (i.e., " + ", ".join(repr(date) for date in malformed) + ")" if malformed else ""))
 
-        if business_legal and license_number not in _cached_business_legal:
-            _cached_business_legal[license_number] = business_legal
+    _save_license_cache_snapshot(signature)
 
-        if business_lng and business_lat and license_number not in _cached_business_loc:
-            _cached_business_loc[license_number] = (business_lat, business_lng)
 
-        if business_address and license_number not in _cached_business_addr:
-            _cached_business_addr[license_number] = business_address
+def _get_year(date, years):
+    """
+    Gets the year of a license term date. A license dataset holds only a few thousand distinct dates across millions of
+    records, so each distinct date is parsed once and its year remembered.
+    :param date: A date, formatted MM/DD/YYYY
+    :param years: A dictionary of date to year, remembering the dates parsed so far
+    :return: The four-digit year of the date, or 0 if the date is missing or malformed
+    """
+    year = years.get(date)
+    if year is None:
+        year = years[date] = _parse_year(date)
+    return year
 
-        if business_city and license_number not in _cached_business_city:
-            _cached_business_city[license_number] = business_city
 
-        if business_state and license_number not in _cached_business_state:
-            _cached_business_state[license_number] = business_state
+def _parse_year(date):
+    try:
+        if len(date) == 10 and date[2] == date[5] == "/":
+            year = int(date[6:])
+            datetime.date(year, int(date[:2]), int(date[3:5]))     # Validates the month and day
+            return year
+        return strptime(date, "%m/%d/%Y").tm_year
+    except ValueError:
+        return 0
+
+
+def _get_license_cache_snapshot_path():
+    """
+    Gets the path of the license cache snapshot. Snapshots are pickled (and unpickling can run arbitrary code), so they
+    are kept in a directory of the cache directory private to the current user, rather than in the (typically
+    world-writable) cache directory itself.
+    :return: The path of the snapshot file, or None if no directory private to the current user can be had
+    """
+    directory = os.path.join(license_db.get_cache_directory(),
+                             "oasis-" + (str(os.getuid()) if hasattr(os, "getuid") else "snapshots"))
+    if not os.path.lexists(directory):
+        try:
+            os.mkdir(directory, 0o700)
+        except OSError:
+            pass
+
+    if not _is_private(directory, stat.S_ISDIR):
+        return None
+    return os.path.join(directory, license_db.get_local_filename() + ".snapshot")
+
+
+def _is_private(path, is_type):
+    """
+    Determines if a file or directory can only have been written by the current user: it is not a symbolic link, it is
+    owned by the current user, and neither its group nor other users may write to it. (Always True where the operating
+    system has no notion of file ownership.)
+    :param path: The path of the file or directory
+    :param is_type: The stat function testing the expected type of the file (i.e., stat.S_ISREG or stat.S_ISDIR)
+    :return: True if the file or directory is private to the current user
+    """
+    try:
+        status = os.lstat(path)
+    except OSError:
+        return False
 
-        if business_zip and license_number not in _cached_business_zip:
-            _cached_business_zip[license_number] = business_zip
+    if not hasattr(os, "getuid"):
+        return is_type(status.st_mode)
+    return is_type(status.st_mode) and status.st_uid == os.getuid() and \
+        not status.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+
+def _get_license_cache_snapshot_header(signature):
+    return json.dumps([_LICENSE_CACHE_SNAPSHOT_VERSION] + list(signature)) + "\n"
+
+
+def _load_license_cache_snapshot(signature):
+    """
+    Restores the license caches from the snapshot written by a previous run, provided the snapshot was taken of the same
+    license data by the same snapshot version. The snapshot's header is plain text, checked before anything is
+    unpickled, and a snapshot that other users could have written is never loaded.
+    :param signature: The cache signature of the license dataset (see DataSet.get_cache_signature)
+    :return: True if the caches were restored, False if no valid snapshot exists
+    """
+    snapshot_path = _get_license_cache_snapshot_path()
+    if snapshot_path is None or not os.path.lexists(snapshot_path):
+        return False
+
+    if not _is_private(snapshot_path, stat.S_ISREG):
+        print("Ignoring license data snapshot " + snapshot_path + " (it may have been written by another user)")
+        return False
+
+    try:
+        with open(snapshot_path, 'rb') as snapshot_file:
+            header = snapshot_file.readline().decode("utf-8")
+            if header != _get_license_cache_snapshot_header(signature):
+                return False
+
+            print("Loading license data caches from " + snapshot_path + "...")
+            caches = pickle.load(snapshot_file)
+    except Exception:
+        print("Ignoring unreadable license data snapshot " + snapshot_path)
+        return False
+
+    globals().update(caches)
+    return True
+
+
+def _save_license_cache_snapshot(signature):
+    """
+    Writes the license caches to a snapshot file so that subsequent runs can skip rebuilding them. The snapshot is
+    written to a temporary file first so that an interrupted write never leaves a truncated snapshot behind.
+    :param signature: The cache signature of the license dataset (see DataSet.get_cache_signature)
+    :return: None
+    """
+    snapshot_path = _get_license_cache_snapshot_path()
+    if snapshot_path is None:
+        print("Not saving license data snapshot: no cache directory private to this user is available")
+        return
+
+    caches = dict((name, globals()[name]) for name in _LICENSE_CACHE_NAMES)
+
+    if os.path.lexists(snapshot_path + ".tmp"):
+        os.remove(snapshot_path + ".tmp")
+    with os.fdopen(os.open(snapshot_path + ".tmp", os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), 'wb') as snapshot_file:
+        snapshot_file.write(_get_license_cache_snapshot_header(signature).encode("utf-8"))
+        pickle.dump(caches, snapshot_file, pickle.HIGHEST_PROTOCOL)
+
+    os.rename(snapshot_path + ".tmp", snapshot_path)
+
+
+class LicenseTable:
+    """
+    A columnar store of Chicago business licenses holding one row per unique license number, in order of first
+    appearance in the license dataset.
+
+    Numeric data (coordinates, years) is kept in typed arrays and text (license codes, descriptions, names, addresses)
+    in dictionary-encoded columns, so a million license records cost tens of megabytes instead of a Python dictionary
+    apiece. The arrays can be indexed by the row numbers returned from get_rows to analyze a license code in bulk.
+
+    Each row carries two kinds of data: the license record (code, description, dates and location) of the first record
+    of the license number having a license code, and business details (names, address and location) taken from the
+    first record of the license number providing each of them.
+    """
+
+    def __init__(self):
+        self.license_numbers = []                   # Row to license number
+        self.codes = _DictionaryColumn()            # Row to license code
+        self.descriptions = _DictionaryColumn()     # Row to license description
+        self.activities = _DictionaryColumn()       # Row to business activity
+        self.start_dates = _DictionaryColumn()      # Row to license term start date, as written in the dataset
+        self.end_dates = _DictionaryColumn()        # Row to license term expiration date, as written in the dataset
+        self.lats = array('d')                      # Row to latitude of the license record (NaN when missing)
+        self.lngs = array('d')                      # Row to longitude of the license record (NaN when missing)
+        self.start_years = array('i')               # Row to earliest year the license was active (0 when unknown)
+        self.end_years = array('i')                 # Row to latest year the license was active (0 when unknown)
+        self.dbas = _DictionaryColumn()             # Row to doing-business-as name
+        self.legal_names = _DictionaryColumn()      # Row to legal name
+        self.addresses = _DictionaryColumn()        # Row to street address
+        self.cities = _DictionaryColumn()           # Row to city
+        self.states = _DictionaryColumn()           # Row to state
+        self.zips = _DictionaryColumn()             # Row to zip code
+        self.business_lats = array('d')             # Row to first available business latitude (NaN when missing)
+        self.business_lngs = array('d')             # Row to first available business longitude (NaN when missing)
+
+        self._rows = {}                             # Map of license number to row
+        self._code_rows = {}                        # Map of license code to rows of its licenses
+
+    def __len__(self):
+        return len(self.license_numbers)
+
+    def add_business(self, license_number, license):
+        """
+        Adds the business details of a license record, creating a row for its license number if needed. Details already
+        known for the license number are left unchanged.
+        :param license_number: The license number of the record
+        :param license: A license record dictionary, as read from the license dataset
+        :return: The row of the license number
+        """
+        row = self._rows.get(license_number)
+        if row is None:
+            row = self._rows[license_number] = len(self.license_numbers)
+            self.license_numbers.append(license_number)
+            for column in self._dictionary_columns():
+                column.append(None)
+            for column in (self.lats, self.lngs, self.business_lats, self.business_lngs):
+                column.append(float('nan'))
+            for column in (self.start_years, self.end_years):
+                column.append(0)
+
+        self.dbas.set_default(row, license[license_db.ROW_BUSINESS_DBA])
+        self.legal_names.set_default(row, license[license_db.ROW_BUSINESS_LEGAL_NAME])
+        self.addresses.set_default(row, license[license_db.ROW_BUSINESS_ADDRESS])
+        self.cities.set_default(row, license[license_db.ROW_BUSINESS_CITY])
+        self.states.set_default(row, license[license_db.ROW_BUSINESS_STATE])
+        self.zips.set_default(row, license[license_db.ROW_BUSINESS_ZIP])
+
+        lat, lng = license[license_db.ROW_LATITUDE], license[license_db.ROW_LONGITUDE]
+        if lat and lng and math.isnan(self.business_lats[row]):
+            self.business_lats[row], self.business_lngs[row] = _parse_coordinate(lat), _parse_coordinate(lng)
+
+        return row
+
+    def add_license(self, row, license_code, start_year, end_year, license):
+        """
+        Adds a license record having a license code to the given row. The first such record determines the license code,
+        description, dates and location of the row; later ones only widen its range of active years.
+        :param row: The row of the license number, as returned by add_business
+        :param license_code: The license code of the record
+        :param start_year: The year the license term of the record starts (0 when unknown)
+        :param end_year: The year the license term of the record expires (0 when unknown)
+        :param license: A license record dictionary, as read from the license dataset
+        :return: None
+        """
+        if self.codes.get(row) is None:
+            self.codes.set(row, license_code)
+            self.descriptions.set(row, license[license_db.ROW_LICENSE_DESCRIPTION])
+            self.activities.set(row, license[license_db.ROW_BUSINESS_ACTIVITY])
+            self.start_dates.set(row, license[license_db.ROW_LICENSE_TERM_START_DATE])
+            self.end_dates.set(row, license[license_db.ROW_LICENSE_TERM_END_DATE])
+            self.lats[row] = _parse_coordinate(license[license_db.ROW_LATITUDE])
+            self.lngs[row] = _parse_coordinate(license[license_db.ROW_LONGITUDE])
+            self.start_years[row], self.end_years[row] = start_year, end_year
+            self._code_rows.setdefault(license_code, array('i')).append(row)
+        elif start_year and end_year:
+            if self.start_years[row]:
+                self.start_years[row] = min(self.start_years[row], start_year)
+                self.end_years[row] = max(self.end_years[row], end_year)
+            else:
+                self.start_years[row], self.end_years[row] = start_year, end_year
+
+    def seal(self):
+        """
+        Converts the columns to compact NumPy arrays once all license records have been added. No records may be added
+        afterwards.
+        :return: None
+        """
+        self.lats = numpy.array(self.lats, dtype=numpy.float64)
+        self.lngs = numpy.array(self.lngs, dtype=numpy.float64)
+        self.business_lats = numpy.array(self.business_lats, dtype=numpy.float64)
+        self.business_lngs = numpy.array(self.business_lngs, dtype=numpy.float64)
+        self.start_years = numpy.array(self.start_years, dtype=numpy.int32)
+        self.end_years = numpy.array(self.end_years, dtype=numpy.int32)
+
+        for license_code in self._code_rows:
+            self._code_rows[license_code] = numpy.array(self._code_rows[license_code], dtype=numpy.int32)
+
+        for column in self._dictionary_columns():
+            column.seal()
+
+    def get_row(self, license_number):
+        """
+        :param license_number: A license number
+        :return: The row of the license number, or None if no such license number exists
+        """
+        return self._rows.get(license_number)
+
+    def get_rows(self, license_code):
+        """
+        :param license_code: A license code
+        :return: A NumPy array of the rows of every license number with the given license code
+        """
+        return self._code_rows[license_code]
+
+    def get_fingerprint(self, license_code):
+        """
+        Computes a digest of everything recorded for the licenses of a license code (license numbers, dates, locations
+        and business details), which changes whenever any license of the code is added, removed or altered.
+        :param license_code: A license code
+        :return: A SHA-1 hex digest
+        """
+        rows = self.get_rows(license_code)
+
+        digest = hashlib.sha1(_as_bytes(license_code))
+        digest.update(_as_bytes(repr([self.license_numbers[row] for row in rows.tolist()])))
+        for column in (self.lats, self.lngs, self.start_years, self.end_years, self.business_lats, self.business_lngs):
+            digest.update(column[rows].tobytes())
+
+        # Value ids depend on the order of the whole dataset, so hash the values used rather than their ids
+        for column in self._dictionary_columns():
+            value_ids, row_values = numpy.unique(column.ids[rows], return_inverse=True)
+            digest.update(_as_bytes(repr([column.values[value_id] for value_id in value_ids.tolist()])))
+            digest.update(row_values.astype(numpy.int32).tobytes())
+
+        return digest.hexdigest()
+
+    def get_years(self, row):
+        """
+        :param row: A row of this table (or None)
+        :return: A pair of (license_start_year, license_end_year), or (None, None) when unknown
+        """
+        if row is None or not self.start_years[row]:
+            return None, None
+        return int(self.start_years[row]), int(self.end_years[row])
+
+    def get_business_location(self, row):
+        """
+        :param row: A row of this table (or None)
+        :return: The first available (lat, lng) of the business, or (0.0, 0.0) when unknown
+        """
+        if row is None or numpy.isnan(self.business_lats[row]):
+            return 0.0, 0.0
+        return float(self.business_lats[row]), float(self.business_lngs[row])
+
+    def get_business_details(self, rows):
+        """
+        Gets the business details of many rows at once, with the same defaults as the get_business_* functions of this
+        module ("UNDEFINED" for missing text, (0.0, 0.0) for a missing location).
+        :param rows: A NumPy array of rows of this table
+        :return: A dictionary of detail ("dba", "legal_name", "lat", "lng", "address", "city", "state" and "zip") to a
+        list (or NumPy array) holding the detail of each row
+        """
+        details = {}
+        for name, column in (("dba", self.dbas), ("legal_name", self.legal_names), ("address", self.addresses),
+                             ("city", self.cities), ("state", self.states), ("zip", self.zips)):
+            details[name] = column.take(rows, "UNDEFINED")
+
+        lats, lngs = self.business_lats[rows], self.business_lngs[rows]
+        located = ~numpy.isnan(lats)
+        details["lat"], details["lng"] = numpy.where(located, lats, 0.0), numpy.where(located, lngs, 0.0)
+        return details
+
+    def get_record(self, row):
+        """
+        Materializes the license record of a row as a dictionary of required row name to value, in the form produced by
+        DataSet.required_rows_copy.
+        :param row: A row of this table having a license code
+        :return: The license record dictionary
+        """
+        return {
+            license_db.ROW_LICENSE_TERM_START_DATE: self.start_dates.get(row, ""),
+            license_db.ROW_LICENSE_TERM_END_DATE: self.end_dates.get(row, ""),
+            license_db.ROW_LICENSE_CODE: self.codes.get(row, ""),
+            license_db.ROW_LICENSE_DESCRIPTION: self.descriptions.get(row, ""),
+            license_db.ROW_BUSINESS_ACTIVITY: self.activities.get(row, ""),
+            license_db.ROW_LATITUDE: _format_coordinate(self.lats[row]),
+            license_db.ROW_LONGITUDE: _format_coordinate(self.lngs[row]),
+            license_db.ROW_LICENSE_NUMBER: self.license_numbers[row],
+            license_db.ROW_BUSINESS_DBA: self.dbas.get(row, ""),
+            license_db.ROW_BUSINESS_LEGAL_NAME: self.legal_names.get(row, ""),
+            license_db.ROW_BUSINESS_CITY: self.cities.get(row, ""),
+            license_db.ROW_BUSINESS_ZIP: self.zips.get(row, ""),
+            license_db.ROW_BUSINESS_STATE: self.states.get(row, ""),
+            license_db.ROW_BUSINESS_ADDRESS: self.addresses.get(row, "")
+        }
+
+    def _dictionary_columns(self):
+        return (self.codes, self.descriptions, self.activities, self.start_dates, self.end_dates, self.dbas,
+                self.legal_names, self.addresses, self.cities, self.states, self.zips)
+
+
+class _DictionaryColumn:
+    """
+    A column of strings stored as an array of indices into a table of distinct values. License data repeats the same
+    few values (codes, descriptions, cities, zip codes) hundreds of thousands of times; each is stored only once.
+    """
+
+    def __init__(self):
+        self.values = [None]        # Distinct values; index 0 is reserved for "no value"
+        self.ids = array('i')       # Row to index into values
+        self._value_ids = {}        # Map of value to index into values (only while records are being added)
+
+    def append(self, value):
+        self.ids.append(self._get_id(value))
+
+    def set(self, row, value):
+        self.ids[row] = self._get_id(value)
+
+    def set_default(self, row, value):
+        """
+        Sets the value of a row unless it already has one. Empty values are ignored.
+        """
+        if value and not self.ids[row]:
+            self.ids[row] = self._get_id(value)
+
+    def get(self, row, default=None):
+        if row is None or not self.ids[row]:
+            return default
+        return self.values[self.ids[row]]
+
+    def take(self, rows, default=None):
+        """
+        :param rows: A NumPy array of rows
+        :return: A list of the value of each row (or default, where a row has no value)
+        """
+        values = self.values
+        return [values[value_id] if value_id else default for value_id in self.ids[rows].tolist()]
+
+    def seal(self):
+        self.ids = numpy.array(self.ids, dtype=numpy.int32)
+        self._value_ids = None
+
+    def _get_id(self, value):
+        if not value:
+            return 0
+
+        value_id = self._value_ids.get(value)
+        if value_id is None:
+            value_id = self._value_ids[value] = len(self.values)
+            self.values.append(value)
+        return value_id
+
+
+def _parse_coordinate(value):
+    try:
+        return float(value) if value else float('nan')
+    except ValueError:
+        return float('nan')
+
+
+def _format_coordinate(value):
+    return "" if numpy.isnan(value) else repr(float(value))
+
+
+def _as_bytes(text):
+    return text if isinstance(text, bytes) else text.encode("utf-8")
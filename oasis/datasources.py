@@ -1,34 +1,82 @@
 import csv
+import hashlib
+import json
+import os
 import os.path
 import tempfile
-import urllib2
+import time
+from oasis import trace
+
+try:
+    import httplib
+    import urllib2
+except ImportError:
+    import http.client as httplib
+    import urllib.request as urllib2
+
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024   # Number of bytes read from the network at once
+DOWNLOAD_ATTEMPTS = 5               # Number of times an interrupted download is resumed before giving up
+DOWNLOAD_RETRY_DELAY = 2.0          # Seconds to wait before resuming an interrupted download (doubled each attempt)
 
 
 class DataSet:
 
     def __init__(self, force_reload=False):
         self.__force_reload = force_reload
+        self.__bytes_received = 0
+        self.__indexes = None
 
     def as_dictionary(self):
         return self.validate(csv.DictReader(open(self.read_cache(), 'rb')))
 
+    def build_indexes(self, records):
+        """
+        Builds the lookup indexes of this dataset (i.e., a map of key to value for each kind of query the analysis makes
+        of the dataset) in a single pass over its records.
+
+        Override in subclasses whose records are looked up by key.
+
+        :param records: An iterable of the records of this dataset (as returned by as_dictionary)
+        :return: A dictionary of index name to index
+        """
+        return {}
+
+    def get_index(self, name):
+        """
+        Gets a lookup index of this dataset, building every index of the dataset on first access (see build_indexes).
+        :param name: The name of the index
+        :return: The index
+        """
+        self.warm()
+        return self.__indexes[name]
+
+    def warm(self):
+        """
+        Reads this dataset and builds its lookup indexes now, rather than on first access.
+        :return: None
+        """
+        if self.__indexes is None:
+            with trace.span("build_indexes", dataset=self.get_local_filename()):
+                self.__indexes = self.build_indexes(self.as_dictionary())
+
     def get_remote_url(self):
         raise Exception("Bug! Not implemented in subclass.")
 
     def get_local_filename(self):
         raise Exception("Bug! Not implemented in subclass.")
 
-    def preprocess(self, data):
+    def preprocess_line(self, line):
         """
-        Performs any required transformation on the downloaded data prior to it being used in analysis.
+        Performs any required transformation on a line of downloaded data prior to it being used in analysis. Lines are
+        preprocessed one at a time, as they are downloaded.
 
         Override in subclasses to allow different data sources to be pre-processed differently. Datasets that require
         no pre-processing should simply return the input argument.
 
-        :param data: The data to be pre-processed
-        :return: The pre-processed data; simply return 'data' to perform no pre-processing
+        :param line: The line to be pre-processed, as bytes (including its line terminator, if any)
+        :return: The pre-processed line; simply return 'line' to perform no pre-processing
         """
-        return data
+        return line
 
     def get_cache_file_path(self):
         """
@@ -44,6 +92,68 @@ class DataSet:
         """
         return tempfile.gettempdir()
 
+    def get_bytes_received(self):
+        """
+        Gets the progress of the current (or last) download of this dataset.
+        :return: The number of bytes of remote data received so far, including any received before it was resumed
+        """
+        return self.__bytes_received
+
+    def get_cache_signature(self):
+        """
+        Identifies the content of the cached dataset (downloading it first, if needed) so that data derived from it can
+        be recognized as stale once the dataset changes.
+        :return: A tuple of (size in bytes, modification time, SHA-1 hex digest) of the cache file
+        """
+        cache_file_path = self.read_cache()
+        stat = os.stat(cache_file_path)
+
+        # The digest is recorded alongside the cache file so the file need only be hashed again once it changes
+        metadata = self.read_metadata()
+        if metadata.get("size") != stat.st_size or metadata.get("mtime") != stat.st_mtime or not metadata.get("sha1"):
+            digest = _hash_file(cache_file_path, stat.st_size, hashlib.sha1())
+            metadata.update(size=stat.st_size, mtime=stat.st_mtime, sha1=digest.hexdigest())
+            self._write_metadata(metadata)
+
+        return stat.st_size, stat.st_mtime, metadata["sha1"]
+
+    def get_metadata_file_path(self):
+        """
+        An absolute, local, file path of the sidecar file describing the cached dataset: the HTTP validators (ETag and
+        Last-Modified) it was downloaded with, and its size, modification time and SHA-1 digest.
+        :return: The path of the metadata file
+        """
+        return self.get_cache_file_path() + ".meta"
+
+    def discard_validators(self):
+        """
+        Forgets how the cached dataset was downloaded: its metadata (including the HTTP validators) and any partial
+        download. The next download then transfers the dataset in full, rather than asking the server whether it has
+        changed or resuming where an earlier transfer stopped.
+        :return: None
+        """
+        partial_file_path = self.get_cache_file_path() + ".part"
+        for path in (self.get_metadata_file_path(), partial_file_path, partial_file_path + ".state"):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def read_metadata(self):
+        """
+        Reads the metadata recorded for the cached dataset.
+        :return: A dictionary of metadata; empty if none has been recorded (or it cannot be read)
+        """
+        try:
+            with open(self.get_metadata_file_path()) as metadata_file:
+                return json.load(metadata_file)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def _write_metadata(self, metadata):
+        metadata_file_path = self.get_metadata_file_path()
+        with open(metadata_file_path + ".tmp", "w") as metadata_file:
+            json.dump(metadata, metadata_file, indent=2, sort_keys=True)
+        os.rename(metadata_file_path + ".tmp", metadata_file_path)
+
     def read_cache(self):
         """
         Returns the requested dataset, downloading it and storing it in the cache if needed.
@@ -56,22 +166,121 @@ class DataSet:
         else:
             print("Downloading data from " + self.get_remote_url() + ". (It's going to space, give it a minute.)")
             self.__force_reload = False  # Do not download more than once, even when forced
-            return self.load_cache(cache_file_path)
+            with trace.span("download", dataset=self.get_local_filename()) as span:
+                cache_file_path = self.load_cache(cache_file_path)
+                span.count("bytes", self.get_bytes_received())
+            return cache_file_path
 
     def load_cache(self, cache_file_path):
         """
         Downloads the given URL and stores the data at the given file path.
+
+        Data is streamed to a partial file next to the cache file in chunks, preprocessed line by line as it arrives. An
+        interrupted download is resumed (using an HTTP Range request) from the last complete line received, both within
+        this call and by later calls if it cannot be completed now. The cache file only appears once the download is
+        complete.
+
+        When the data was previously downloaded, the request is made conditional on the validators recorded in the
+        metadata file; if the server reports that the data has not been modified, the cache file is left untouched (so
+        that nothing derived from it needs to be rebuilt).
+
         :param cache_file_path: The location on the filesystem where the data should be written
         :return: cache_file_path
         """
-        cache_file = open(cache_file_path, 'w')
-        data = urllib2.urlopen(self.get_remote_url())
+        for attempt in range(DOWNLOAD_ATTEMPTS):
+            try:
+                self._download(cache_file_path)
+                return cache_file_path
+            except (IOError, httplib.HTTPException) as e:
+                if isinstance(e, urllib2.HTTPError) and e.code < 500 or attempt == DOWNLOAD_ATTEMPTS - 1:
+                    raise
+                print("Download of " + self.get_remote_url() + " interrupted (" + str(e) + "); retrying...")
+                time.sleep(DOWNLOAD_RETRY_DELAY * 2 ** attempt)
+
+    def _download(self, cache_file_path):
+        partial_file_path = cache_file_path + ".part"
+        state = _DownloadState.load(partial_file_path)
+
+        metadata = self.read_metadata() if os.path.exists(cache_file_path) else {}
+
+        request = urllib2.Request(self.get_remote_url())
+        if state.offset:
+            print("Resuming download of " + self.get_remote_url() + " at byte " + str(state.offset))
+            request.add_header("Range", "bytes=%d-" % state.offset)
+            if state.validator:
+                request.add_header("If-Range", state.validator)
+        elif metadata.get("url") == self.get_remote_url():
+            if metadata.get("etag"):
+                request.add_header("If-None-Match", metadata["etag"])
+            if metadata.get("last_modified"):
+                request.add_header("If-Modified-Since", metadata["last_modified"])
+
         try:
-            cache_file.write(self.preprocess(data.read()))
-            print(cache_file)
+            response = urllib2.urlopen(request)
+        except urllib2.HTTPError as e:
+            if e.code == 304 and not state.offset:
+                print(self.get_local_filename() + " has not changed since it was last downloaded.")
+                return
+            if e.code != 416 or not state.offset:
+                raise
+            state.delete(partial_file_path)     # Nothing left to resume from the saved offset; start over
+            return self._download(cache_file_path)
+
+        try:
+            if state.offset and response.getcode() != 206:
+                state = _DownloadState()    # Server cannot (or will not) resume; start over
+
+            etag, last_modified = response.info().get("ETag"), response.info().get("Last-Modified")
+            state.validator = etag or last_modified
+            remaining = response.info().get("Content-Length")
+            remaining = int(remaining) if remaining is not None else None
+
+            with open(partial_file_path, 'ab' if state.offset else 'wb') as partial_file:
+                partial_file.truncate(state.size)
+                digest = _hash_file(partial_file_path, state.size, hashlib.sha1())
+                received, pending = state.offset, b''
+
+                while True:
+                    chunk = response.read(DOWNLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    received += len(chunk)
+                    self.__bytes_received = received
+                    if remaining is not None:
+                        remaining -= len(chunk)
+
+                    # Only complete lines are written, so a resumed download always begins at the start of a line
+                    data = pending + chunk
+                    end = data.rfind(b'\n') + 1
+                    processed, pending = self._preprocess_lines(data[:end]), data[end:]
+                    partial_file.write(processed)
+                    digest.update(processed)
+                    state.size += len(processed)
+
+                    partial_file.flush()
+                    state.offset = received - len(pending)
+                    state.save(partial_file_path)
+
+                if remaining:
+                    raise IOError("Connection closed with " + str(remaining) + " bytes left to download")
+                if pending:
+                    processed = self.preprocess_line(pending)
+                    partial_file.write(processed)
+                    digest.update(processed)
         finally:
-            cache_file.close()
-        return cache_file_path
+            response.close()
+
+        os.rename(partial_file_path, cache_file_path)
+        state.delete(partial_file_path)
+
+        stat = os.stat(cache_file_path)
+        self._write_metadata({"url": self.get_remote_url(), "etag": etag, "last_modified": last_modified,
+                              "size": stat.st_size, "mtime": stat.st_mtime, "sha1": digest.hexdigest()})
+
+    def _preprocess_lines(self, data):
+        if self.__class__.preprocess_line == DataSet.preprocess_line:
+            return data     # Nothing to do; avoid splitting the data into lines
+        return b''.join([self.preprocess_line(line + b'\n') for line in data.split(b'\n')[:-1]])
 
     def validate(self, csv):
         """
@@ -102,6 +311,59 @@ class DataSet:
         return copy
 
 
+def _hash_file(path, size, digest):
+    """
+    Adds the first size bytes of a file to a digest.
+    :param path: The file to hash
+    :param size: The number of bytes to hash
+    :param digest: The hashlib object to update
+    :return: The given digest object
+    """
+    if size:
+        with open(path, 'rb') as data_file:
+            for chunk in iter(lambda: data_file.read(min(size - data_file.tell(), 1024 * 1024)), b''):
+                digest.update(chunk)
+    return digest
+
+
+class _DownloadState:
+    """
+    How much of a partially downloaded dataset has been received, persisted beside the partial file so that the download
+    can be resumed by a later run.
+    """
+
+    def __init__(self, offset=0, size=0, validator=None):
+        """
+        :param offset: The number of bytes of the remote data received and written (as complete lines)
+        :param size: The number of bytes written to the partial file (which differs from offset when lines are
+        preprocessed)
+        :param validator: The ETag or Last-Modified date of the remote data, used to ensure it has not changed before
+        resuming
+        """
+        self.offset = offset
+        self.size = size
+        self.validator = validator
+
+    @staticmethod
+    def load(partial_file_path):
+        try:
+            with open(partial_file_path + ".state") as state_file:
+                state = json.load(state_file)
+            if os.path.getsize(partial_file_path) >= state["size"]:
+                return _DownloadState(state["offset"], state["size"], state["validator"])
+        except (IOError, OSError, ValueError, KeyError):
+            pass
+        return _DownloadState()
+
+    def save(self, partial_file_path):
+        with open(partial_file_path + ".state", "w") as state_file:
+            json.dump({"offset": self.offset, "size": self.size, "validator": self.validator}, state_file)
+
+    def delete(self, partial_file_path):
+        if os.path.exists(partial_file_path + ".state"):
+            os.remove(partial_file_path + ".state")
+
+
 class Socioeconomic(DataSet):
 
     def __init__(self, force_reload=False):
@@ -158,13 +420,9 @@ class CensusTracts(DataSet):
         self.ROW_LONGITUDE = "INTPTLONG"
         self.ROW_POPULATION = "POP10"
 
-    def preprocess(self, data):
-        processed = str()
-
+    def preprocess_line(self, line):
         # This bit of stupidity required to strip trailing whitespace from last column (and column header)
-        for line in iter(data.splitlines()):
-            processed += line.strip() + "\n"
-        return processed
+        return line.strip() + b"\n"
 
     def get_remote_url(self):
         return "https://www2.census.gov/geo/docs/maps-data/data/gazetteer/census_tracts_list_17.txt"
@@ -176,6 +434,19 @@ class CensusTracts(DataSet):
         csv.register_dialect('CensusTSV', delimiter='\t', skipinitialspace=True, quoting=csv.QUOTE_NONE)
         return self.validate(csv.DictReader(open(self.read_cache(), 'rb'), dialect="CensusTSV"))
 
+    def build_indexes(self, records):
+        geo_ids = set()
+        populations = {}    # Map of census tract id (last six digits of the GEOID) to population
+        centroids = {}      # Map of census tract id of each tract in Cook County (GEOID "1703...") to (lat, lng)
+        for record in records:
+            geo_id = record[self.ROW_GEOID]
+            tract_id = geo_id[-6:]
+            geo_ids.add(geo_id)
+            populations[tract_id] = record[self.ROW_POPULATION]
+            if geo_id.startswith("1703") and tract_id not in centroids:
+                centroids[tract_id] = float(record[self.ROW_LATITUDE]), float(record[self.ROW_LONGITUDE])
+        return {"geo_ids": geo_ids, "populations": populations, "centroids": centroids}
+
 
 class Neighborhoods(DataSet):
 
@@ -190,11 +461,18 @@ class Neighborhoods(DataSet):
     def get_local_filename(self):
         return "chicago_neighborhoods.csv"
 
+    def build_indexes(self, records):
+        names = {}          # Map of community area number to community area name
+        for record in records:
+            names.setdefault(record[self.ROW_AREA_NUMBER], record[self.ROW_AREA_NAME].upper())
+        return {"ids": set(names), "names": names}
+
 
 class NeighborhoodTractsMap(DataSet):
 
-    def __init__(self):
+    def __init__(self, cache_directory=None):
         DataSet.__init__(self, False)
+        self.__cache_directory = cache_directory
         self.ROW_AREA_NUMBER = "CHGOCA"
         self.ROW_TRACT_GEOID = "TRACT"
 
@@ -204,5 +482,13 @@ class NeighborhoodTractsMap(DataSet):
     def get_local_filename(self):
         return "census_tract_to_neighborhood.csv"
 
+    def build_indexes(self, records):
+        tracts = {}         # Map of community area number to list of census tract ids, in the order listed
+        for record in records:
+            tracts.setdefault(record[self.ROW_AREA_NUMBER], []).append(record[self.ROW_TRACT_GEOID])
+        return {"tracts": tracts}
+
     def get_cache_directory(self):
+        if self.__cache_directory is not None:
+            return self.__cache_directory
         return os.path.dirname(os.path.abspath(__file__)) + "/data"
@@ -1,4 +1,5 @@
 import math
+import numpy
 
 
 def distance_lat_lng(lat1, lon1, lat2, lon2, units='m'):
@@ -49,3 +50,140 @@ def distance_lat_lng_rad(lat1rad, lon1rad, lat2rad, lon2rad, units):
         dist = dist * 0.8684
 
     return dist
+
+
+def distance_matrix(lats1, lngs1, lats2, lngs2, units='m'):
+    """
+    Calculates the distance between every coordinate in a first set of coordinates and every coordinate in a second
+    set, in a single vectorized operation. Produces the same result as calling distance_lat_lng for each pair, but
+    several orders of magnitude faster when either set is large.
+
+    For example, passing the coordinates of 10,000 businesses as the first set and 800 census tract centroids as the
+    second set returns a 10,000 x 800 matrix of distances.
+
+    :param lats1: Sequence of first set latitudes, in decimal degrees
+    :param lngs1: Sequence of first set longitudes, in decimal degrees
+    :param lats2: Sequence of second set latitudes, in decimal degrees
+    :param lngs2: Sequence of second set longitudes, in decimal degrees
+    :param units: Units of measure; 'm' for statute miles, 'k' for kilometers or 'n' for nautical miles
+    :return: A numpy array of shape (len(lats1), len(lats2)) where element [i, j] is the distance between
+    (lats1[i], lngs1[i]) and (lats2[j], lngs2[j]) in the given units of measure.
+    """
+    lat1rad = numpy.radians(numpy.asarray(lats1, dtype=numpy.float64))[:, numpy.newaxis]
+    lon1rad = numpy.radians(numpy.asarray(lngs1, dtype=numpy.float64))[:, numpy.newaxis]
+    lat2rad = numpy.radians(numpy.asarray(lats2, dtype=numpy.float64))[numpy.newaxis, :]
+    lon2rad = numpy.radians(numpy.asarray(lngs2, dtype=numpy.float64))[numpy.newaxis, :]
+
+    dist = numpy.sin(lat1rad) * numpy.sin(lat2rad) + \
+        numpy.cos(lat1rad) * numpy.cos(lat2rad) * numpy.cos(lon1rad - lon2rad)
+
+    # Rounding error can push coincident points a hair outside of acos' domain
+    dist = numpy.arccos(numpy.clip(dist, -1.0, 1.0))
+    dist = numpy.degrees(dist)
+    dist *= 60.0 * 1.1515
+
+    if units == 'k':
+        dist *= 1.609344
+    elif units == 'n':
+        dist *= 0.8684
+
+    return dist
+
+
+class SpatialIndex:
+    """
+    A uniform grid laid over a fixed set of coordinates (for example, census tract centroids) that answers "which points
+    lie within r miles of here?" and "which k points are nearest to here?" without measuring the distance to every
+    point in the set.
+    """
+
+    MILES_PER_DEGREE = 60.0 * 1.1515
+
+    def __init__(self, lats, lngs, cell_size=1.0):
+        """
+        :param lats: Sequence of point latitudes, in decimal degrees
+        :param lngs: Sequence of point longitudes, in decimal degrees
+        :param cell_size: The height of each grid cell in statute miles (cells are a degree-square, so they grow
+        narrower away from the equator)
+        """
+        self._lats = numpy.asarray(lats, dtype=numpy.float64)
+        self._lngs = numpy.asarray(lngs, dtype=numpy.float64)
+        self._cell_degrees = cell_size / SpatialIndex.MILES_PER_DEGREE
+        self._cells = {}
+
+        cells = {}
+        for index, cell in enumerate(zip(self._cell_of(self._lats).tolist(), self._cell_of(self._lngs).tolist())):
+            cells.setdefault(cell, []).append(index)
+
+        for cell in cells:
+            self._cells[cell] = numpy.array(cells[cell], dtype=numpy.intp)
+
+    def __len__(self):
+        return len(self._lats)
+
+    def _cell_of(self, degrees):
+        return numpy.floor(numpy.asarray(degrees) / self._cell_degrees).astype(numpy.int64)
+
+    def _candidates(self, lat, lng, radius):
+        """
+        Gets the index of every point in the grid cells overlapping a bounding box that contains the circle of the given
+        radius. The box is conservative; callers must still measure the distance to each candidate.
+        """
+        lat_delta = radius / SpatialIndex.MILES_PER_DEGREE
+        pole_lat = min(abs(lat) + lat_delta, 90.0)
+
+        # Circles reach furthest in longitude at the latitude nearest the pole
+        if pole_lat >= 89.0 or radius >= SpatialIndex.MILES_PER_DEGREE * 45.0:
+            return numpy.arange(len(self._lats))
+        lng_delta = lat_delta / math.cos(math.radians(pole_lat))
+
+        min_row, max_row = self._cell_of([lat - lat_delta, lat + lat_delta]).tolist()
+        min_col, max_col = self._cell_of([lng - lng_delta, lng + lng_delta]).tolist()
+
+        if (max_row - min_row + 1) * (max_col - min_col + 1) > len(self._cells):
+            found = [indices for (row, col), indices in self._cells.items()
+                     if min_row <= row <= max_row and min_col <= col <= max_col]
+        else:
+            found = [self._cells[(row, col)]
+                     for row in range(min_row, max_row + 1)
+                     for col in range(min_col, max_col + 1)
+                     if (row, col) in self._cells]
+
+        return numpy.concatenate(found) if found else numpy.array([], dtype=numpy.intp)
+
+    def query_radius(self, lat, lng, radius):
+        """
+        Finds every indexed point within the given distance of a coordinate.
+        :param lat: Latitude of the coordinate, in decimal degrees
+        :param lng: Longitude of the coordinate, in decimal degrees
+        :param radius: The search radius, in statute miles (points exactly this far away are included)
+        :return: A pair of numpy arrays (indices, distances) identifying the matching points by their position in the
+        sequences this index was built from, ordered by ascending distance
+        """
+        candidates = self._candidates(lat, lng, radius)
+        distances = distance_matrix([lat], [lng], self._lats[candidates], self._lngs[candidates])[0]
+
+        within = distances <= radius
+        candidates, distances = candidates[within], distances[within]
+
+        order = numpy.lexsort((candidates, distances))
+        return candidates[order], distances[order]
+
+    def query_nearest(self, lat, lng, k):
+        """
+        Finds the k indexed points nearest to a coordinate.
+        :param lat: Latitude of the coordinate, in decimal degrees
+        :param lng: Longitude of the coordinate, in decimal degrees
+        :param k: The number of points to find; fewer are returned if the index holds less than k points
+        :return: A pair of numpy arrays (indices, distances) identifying the nearest points by their position in the
+        sequences this index was built from, ordered by ascending distance
+        """
+        k = min(k, len(self._lats))
+        radius = self._cell_degrees * SpatialIndex.MILES_PER_DEGREE
+
+        # Grow the search circle until it holds k points; those are then guaranteed to be the k nearest
+        while True:
+            indices, distances = self.query_radius(lat, lng, radius)
+            if len(indices) >= k:
+                return indices[:k], distances[:k]
+            radius *= 2.0
@@ -0,0 +1,86 @@
+"""
+Fast JSON encoding of large arrays of flat records (objects whose fields are all strings or numbers), streamed out a
+block of records at a time.
+
+Rather than building dictionaries and dispatching each value through json.JSONEncoder, records are supplied column by
+column; each column is encoded in bulk and the records are assembled from a template with the field names already in
+place. The output is valid JSON in one of two layouts: indented (one field per line) or compact (no whitespace at all).
+"""
+
+from json.encoder import encode_basestring_ascii
+
+STRING = "string"
+INTEGER = "integer"
+FLOAT = "float"
+
+BLOCK_SIZE = 1000   # Number of records assembled into each chunk of output
+
+# How JSON spells the floats that Python cannot
+_NON_FINITE_FLOATS = {"nan": "NaN", "inf": "Infinity", "-inf": "-Infinity"}
+
+
+class RecordFormat:
+    """
+    The JSON layout of an array of records having the same fields.
+    """
+
+    def __init__(self, fields, compact=False):
+        """
+        :param fields: A list of (name, type) pairs, one for each field of a record in the order written, where type is
+        one of STRING, INTEGER or FLOAT
+        :param compact: When True, records are written without any whitespace; otherwise each record and field is
+        written on a line of its own, indented
+        """
+        self._types = [field_type for _, field_type in fields]
+
+        if compact:
+            self._template = "{" + ",".join(encode_basestring_ascii(name) + ":%s" for name, _ in fields) + "}"
+            self._open, self._separator, self._close = "[", ",", "]"
+        else:
+            self._template = "{\n" + ",\n".join("    " + encode_basestring_ascii(name) + ": %s"
+                                                  for name, _ in fields) + "\n  }"
+            self._open, self._separator, self._close = "[\n  ", ",\n  ", "\n]"
+
+    def encode(self, columns):
+        """
+        Encodes an array of records as JSON.
+        :param columns: A list holding the values of each field (in the order of the fields of this format), where the
+        values of a field are a list (or NumPy array) with one value for each record
+        :return: A generator of strings which, concatenated, are the JSON encoding of the records
+        """
+        encoded = [_encode_column(field_type, values) for field_type, values in zip(self._types, columns)]
+        records = len(encoded[0]) if encoded else 0
+
+        if not records:
+            yield "[]"
+            return
+
+        yield self._open
+        for start in range(0, records, BLOCK_SIZE):
+            block = zip(*[column[start:start + BLOCK_SIZE] for column in encoded])
+            yield (self._separator if start else "") + self._separator.join([self._template % record
+                                                                               for record in block])
+        yield self._close
+
+    def dumps(self, columns):
+        """
+        Encodes an array of records as a JSON string (see encode).
+        """
+        return "".join(self.encode(columns))
+
+
+def _encode_column(field_type, values):
+    if hasattr(values, "tolist"):
+        values = values.tolist()
+
+    if field_type == STRING:
+        return [encode_basestring_ascii(value) if value is not None else "null" for value in values]
+    elif field_type == INTEGER:
+        return list(map(str, map(int, values)))
+    elif field_type == FLOAT:
+        encoded = list(map(repr, map(float, values)))
+        if set(encoded) & set(_NON_FINITE_FLOATS):
+            encoded = [_NON_FINITE_FLOATS.get(value, value) for value in encoded]
+        return encoded
+
+    raise ValueError("Unknown field type: " + str(field_type))
@@ -1,7 +1,8 @@
-from oasis import data
+from oasis import data, trace
 import json
 
 
+@trace.traced("produce_license_rpt")
 def produce_license_rpt(output_dir):
     table = []
     for license_code in data.get_license_codes():
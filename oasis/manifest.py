@@ -0,0 +1,262 @@
+import hashlib
+import json
+import os
+import os.path
+
+MANIFEST_FILENAME = "manifest.json"
+MANIFEST_VERSION = 3
+
+JOURNAL_FILENAME = "journal.json"
+
+
+class Manifest:
+    """
+    A record, kept in the output directory, of the analysis of each license code written there: a fingerprint of the
+    inputs the analysis was computed from and the files it produced, with the SHA-1 of their content. A later run can
+    skip license codes whose fingerprint is unchanged and whose files are still present, and need not rewrite files
+    whose content is unchanged.
+
+    The manifest also lists the files whose content changed during the latest run (i.e., for syncing to a CDN).
+    """
+
+    def __init__(self, output_dir):
+        """
+        Loads the manifest of the given output directory (an empty manifest when there is none, or it cannot be read).
+        :param output_dir: The directory where analysis output is written
+        """
+        self._output_dir = output_dir
+        self._license_codes = {}
+        self._changed = set()
+
+        try:
+            with open(self.get_path()) as manifest_file:
+                manifest = json.load(manifest_file)
+            if manifest.get("version") == MANIFEST_VERSION:
+                self._license_codes, self._changed = manifest["license_codes"], set(manifest["changed"])
+        except (IOError, OSError, ValueError, KeyError):
+            pass
+
+    def get_path(self):
+        return os.path.join(self._output_dir, MANIFEST_FILENAME)
+
+    def get_fingerprint(self, license_code):
+        """
+        :param license_code: A license code
+        :return: The fingerprint recorded for the license code, or None if it has not been analyzed
+        """
+        return self._license_codes.get(license_code, {}).get("fingerprint")
+
+    def get_files(self, license_code):
+        """
+        :param license_code: A license code
+        :return: A dictionary of the path (relative to the output directory) to the SHA-1 hex digest of each file
+        written for the license code
+        """
+        return self._license_codes.get(license_code, {}).get("files", {})
+
+    def get_all_files(self):
+        """
+        :return: A dictionary of the path (relative to the output directory) to the SHA-1 hex digest of every file
+        written for any license code
+        """
+        files = {}
+        for license_code in self._license_codes:
+            files.update(self.get_files(license_code))
+        return files
+
+    def get_changed_files(self):
+        """
+        :return: A sorted list of the paths (relative to the output directory) of the files whose content changed
+        during the latest run
+        """
+        return sorted(self._changed)
+
+    def start_run(self):
+        """
+        Begins a new run, clearing the list of changed files.
+        :return: None
+        """
+        self._changed = set()
+
+    def is_current(self, license_code, fingerprint):
+        """
+        Determines if the recorded analysis of a license code is still valid: it was computed from the same inputs and
+        all of the files it produced still exist, exactly as written (so that a damaged or altered file is written
+        again).
+        :param license_code: A license code
+        :param fingerprint: The fingerprint of the current inputs of the license code
+        :return: True if the license code does not need to be analyzed again
+        """
+        return self.get_fingerprint(license_code) == fingerprint and \
+            _are_intact(self._output_dir, self.get_files(license_code))
+
+    def record(self, license_code, fingerprint, files):
+        """
+        Records the analysis of a license code (call save to write it to disk).
+        :param license_code: The license code analyzed
+        :param fingerprint: The fingerprint of the inputs it was analyzed with
+        :param files: A dictionary of the path (relative to the output directory) to the SHA-1 hex digest of each file
+        written
+        :return: The paths of the files whose content differs from that previously recorded
+        """
+        previous_files = self.get_files(license_code)
+        changed = [path for path in sorted(files) if previous_files.get(path) != files[path]]
+
+        self._license_codes[license_code] = {"fingerprint": fingerprint, "files": dict(files)}
+        self._changed.update(changed)
+        return changed
+
+    def save(self):
+        """
+        Writes the manifest to the output directory. The manifest is replaced atomically, so an interrupted run never
+        leaves a partial manifest behind.
+        :return: None
+        """
+        write_file(self.get_path(), [json.dumps({"version": MANIFEST_VERSION, "license_codes": self._license_codes,
+                                                 "changed": self.get_changed_files()}, indent=2, sort_keys=True)], True)
+
+
+class Journal:
+    """
+    A checkpoint of an analysis run in progress, kept in the output directory: the license codes the run set out to
+    analyze and, as each is finished, the files written for it with their SHA-1 digests. The journal is removed once
+    the run is complete, so one left behind marks an interrupted run that can be resumed.
+    """
+
+    def __init__(self, output_dir):
+        """
+        Loads the journal of the given output directory, if any.
+        :param output_dir: The directory where analysis output is written
+        """
+        self._output_dir = output_dir
+        self._license_codes = None
+        self._options = {}
+        self._completed = {}
+
+        try:
+            with open(self.get_path()) as journal_file:
+                journal = json.load(journal_file)
+            self._license_codes, self._options, self._completed = \
+                journal["license_codes"], journal["options"], journal["completed"]
+        except (IOError, OSError, ValueError, KeyError):
+            pass
+
+    def get_path(self):
+        return os.path.join(self._output_dir, JOURNAL_FILENAME)
+
+    def exists(self):
+        """
+        :return: True if this journal records a run (that has not finished)
+        """
+        return self._license_codes is not None
+
+    def get_license_codes(self):
+        """
+        :return: The license codes the run set out to analyze, in order
+        """
+        return self._license_codes
+
+    def get_options(self):
+        """
+        :return: A dictionary of the options the run was started with
+        """
+        return self._options
+
+    def start(self, license_codes, options):
+        """
+        Begins journaling a new run, discarding any previous journal.
+        :param license_codes: The license codes the run will analyze
+        :param options: A dictionary of options needed to resume the run
+        :return: None
+        """
+        self._license_codes, self._options, self._completed = list(license_codes), dict(options), {}
+        self._save()
+
+    def complete(self, license_code, files):
+        """
+        Records that a license code has been analyzed and its files written.
+        :param license_code: The license code
+        :param files: A dictionary of the path (relative to the output directory) to the SHA-1 hex digest of each file
+        written
+        :return: None
+        """
+        self._completed[license_code] = dict(files)
+        self._save()
+
+    def is_complete(self, license_code):
+        """
+        Determines if a license code was analyzed by the journaled run, and the files it wrote are still exactly as
+        written (so that a file left half-written, or altered since, is never mistaken for a finished one).
+        :param license_code: The license code
+        :return: True if the license code was completed
+        """
+        return license_code in self._completed and _are_intact(self._output_dir, self._completed[license_code])
+
+    def finish(self):
+        """
+        Marks the run complete, removing the journal.
+        :return: None
+        """
+        if os.path.exists(self.get_path()):
+            os.remove(self.get_path())
+        self._license_codes = None
+
+    def _save(self):
+        write_file(self.get_path(), [json.dumps({"license_codes": self._license_codes, "options": self._options,
+                                                 "completed": self._completed}, indent=2, sort_keys=True)], True)
+
+
+def _are_intact(output_dir, files):
+    """
+    Determines if files still hold the content they were written with.
+    :param output_dir: The directory the files were written to
+    :param files: A dictionary of the path (relative to the output directory) to the SHA-1 hex digest of each file
+    :return: True if every file exists and has the given digest
+    """
+    for path, digest in files.items():
+        full_path = os.path.join(output_dir, path)
+        if not os.path.exists(full_path) or hash_file(full_path) != digest:
+            return False
+    return True
+
+
+def write_file(path, chunks, sync=False, unchanged_digest=None):
+    """
+    Writes a file atomically: the content is written to a temporary file which then replaces the file, so the file
+    never holds partially written content, however the process is stopped.
+    :param path: The path of the file to write
+    :param chunks: The content of the file, as an iterable of strings (written as they are produced)
+    :param sync: When True, the content is flushed to disk before the file is replaced (so that it survives a crash of
+    the operating system, too)
+    :param unchanged_digest: The SHA-1 hex digest of the content the file was last written with, if any; when the new
+    content has the same digest, and the file still holds that content (its size and digest are checked), the file is
+    left untouched (preserving its modification time)
+    :return: The SHA-1 hex digest of the content
+    """
+    digest = hashlib.sha1()
+    with open(path + ".tmp", "w") as temp_file:
+        for chunk in chunks:
+            temp_file.write(chunk)
+            digest.update(chunk.encode("utf-8"))
+        if sync:
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+
+    if digest.hexdigest() == unchanged_digest and os.path.exists(path) and \
+            os.path.getsize(path) == os.path.getsize(path + ".tmp") and hash_file(path) == unchanged_digest:
+        os.remove(path + ".tmp")
+    else:
+        os.rename(path + ".tmp", path)
+    return digest.hexdigest()
+
+
+def hash_file(path):
+    """
+    :param path: The path of a file
+    :return: The SHA-1 hex digest of the content of the file
+    """
+    digest = hashlib.sha1()
+    with open(path, 'rb') as hashed_file:
+        for chunk in iter(lambda: hashed_file.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
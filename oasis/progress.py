@@ -1,33 +1,149 @@
+import json
+import os
 import sys
+import time
 
+try:
+    import resource
+except ImportError:
+    resource = None     # Not available on Windows
 
-class Progress:
+
+class Telemetry:
     """
-    A silly little utility for reporting "percent complete" progress reports.
+    Reports the progress of a long task at regular intervals, one line per report: items completed of the total,
+    license records and distance computations per second, the estimated time remaining (from a smoothed rate, so that
+    one slow item does not send it swinging) and the memory in use. Each report can also be appended to a log file as a
+    line of JSON.
+
+    Reporting is throttled by time rather than by item; report only reads the clock every so many calls (fewer the
+    faster it is called), so that it may be called for every item of an inner loop.
     """
 
-    def __init__(self, total, report_increment=1):
+    def __init__(self, label, total, interval=5.0, log_file=None, stream=None):
         """
-        :param total: The total number of items/elements being analyzed; the report method should be called this number
-        of times during processing.
-        :param report_increment: The percent complete modulo when report string should be output
+        :param label: What is being done (i.e., "license code 1010"), prefixed to each report
+        :param total: The total number of items to complete
+        :param interval: Seconds between reports
+        :param log_file: A file to which each report is also written as a line of JSON, or None
+        :param stream: Where reports are written for people to read (standard output by default)
         """
+        self._label = label
         self._total = total
-        self._this = 0
-        self._last_reported = 0
-        self._report_increment = report_increment
+        self._interval = interval
+        self._log_file = log_file
+        self._stream = stream
+
+        self._started = self._last_time = time.time()
+        self._items = self._records = self._distances = 0
+        self._last_records = self._last_distances = 0
+        self._last_items = 0
+        self._item_rate = None          # Smoothed items per second, once measured
+
+        self._calls = 0                 # Calls of report so far
+        self._next_check = 1            # Call of report at which the clock is next read
+        self._last_check = (0, self._started)
 
-    def report(self, format_str="  ... %s%% complete.\r",):
+    def report(self, items=1, records=None, distances=0):
         """
-        Notify that progress has been completed; produces a progress output string if the percent complete matches
-        report_increment
-        :param format_str: The string to be written (use %s as placeholder for percentage).
+        Counts work done, reporting progress if the interval has passed since the last report.
+        :param items: The number of items completed
+        :param records: The number of license records processed (the number of items by default)
+        :param distances: The number of distances computed
         :return: None
         """
-        self._this += 1
+        self._items += items
+        self._records += items if records is None else records
+        self._distances += distances
+
+        self._calls += 1
+        if self._calls < self._next_check:
+            return
+
+        now = time.time()
+
+        # Read the clock about ten times an interval, at the rate report has been called since the clock was last read
+        calls, checked = self._last_check
+        calls_per_second = (self._calls - calls) / max(now - checked, 1e-6)
+        self._next_check = self._calls + max(1, int(calls_per_second * self._interval / 10))
+        self._last_check = (self._calls, now)
+
+        if now - self._last_time >= self._interval:
+            self._write(now, False)
+
+    def finish(self):
+        """
+        Reports the final tally of the task (its totals, and average rates over its whole duration).
+        :return: None
+        """
+        self._write(time.time(), True)
+
+    def _write(self, now, finished):
+        elapsed = max(now - (self._started if finished else self._last_time), 1e-6)
+        records_per_second = (self._records - (0 if finished else self._last_records)) / elapsed
+        distances_per_second = (self._distances - (0 if finished else self._last_distances)) / elapsed
+
+        # Exponentially weighted, so the estimate follows changes in rate without jumping at every report
+        item_rate = (self._items - self._last_items) / max(now - self._last_time, 1e-6)
+        self._item_rate = item_rate if self._item_rate is None else 0.3 * item_rate + 0.7 * self._item_rate
+        remaining = max(self._total - self._items, 0)
+        if finished or not remaining:
+            eta = 0.0
+        elif self._item_rate:
+            eta = remaining / self._item_rate
+        else:
+            eta = None      # Nothing completed yet
+
+        rss = get_rss_mb()
+        percent = 100.0 * self._items / self._total if self._total else 100.0
+
+        line = "  %s: %.0f%% (%d of %d)" % (self._label, percent, self._items, self._total)
+        if finished:
+            line += " in " + _format_duration(now - self._started)
+        line += ", " + _format_rate(records_per_second) + " records/s, " + _format_rate(distances_per_second) + \
+            " distances/s"
+        if not finished:
+            line += ", ETA " + _format_duration(eta)
+        stream = self._stream or sys.stdout
+        stream.write(line + (", RSS unavailable\n" if rss is None else ", RSS %.0f MB\n" % rss))
+        stream.flush()
+
+        if self._log_file:
+            self._log_file.write(json.dumps({
+                "time": now, "task": self._label, "done": self._items, "total": self._total, "percent": percent,
+                "elapsed_seconds": now - self._started, "records_per_second": records_per_second,
+                "distances_per_second": distances_per_second, "eta_seconds": eta, "rss_mb": rss,
+                "finished": finished}, sort_keys=True) + "\n")
+            self._log_file.flush()
+
+        self._last_time, self._last_items = now, self._items
+        self._last_records, self._last_distances = self._records, self._distances
+
+
+def get_rss_mb():
+    """
+    :return: The resident set size (memory in use) of this process in megabytes, or its peak resident set size where the
+    current size is not available, or None where neither is (i.e., on Windows)
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024.0 * 1024.0)
+    except (IOError, OSError, ValueError, IndexError):
+        if resource is None:
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024.0 * 1024.0) if sys.platform == "darwin" else peak / 1024.0    # Bytes on macOS, else KB
+
+
+def _format_rate(rate):
+    for divisor, suffix in ((1e9, "G"), (1e6, "M"), (1e3, "k")):
+        if rate >= divisor:
+            return "%.1f%s" % (rate / divisor, suffix)
+    return "%.0f" % rate
+
 
-        percent = int(float(self._this) / float(self._total) * 100)
-        if percent != self._last_reported and percent % self._report_increment == 0:
-            sys.stdout.write(format_str % str(percent))
-            sys.stdout.flush()
-            self._last_reported = percent
+def _format_duration(seconds):
+    if seconds is None:
+        return "unknown"
+    seconds = int(round(seconds))
+    return "%d:%02d:%02d" % (seconds // 3600, seconds // 60 % 60, seconds % 60)
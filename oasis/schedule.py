@@ -0,0 +1,94 @@
+"""
+Cost-based scheduling of license codes for parallel analysis.
+
+The cost of analyzing a license code grows with its number of license records, the number of years they span (the
+accessibility of every tract is accumulated for every active year) and the number of census tracts. Dispatching the
+most costly license codes first keeps a huge license code from starting last and running alone while the other workers
+sit idle.
+"""
+
+import heapq
+from oasis import data
+
+
+def estimate_cost(license_code, tracts):
+    """
+    Estimates the cost of analyzing a license code from the license caches (which must be initialized).
+    :param license_code: The license code
+    :param tracts: The number of census tracts analyzed
+    :return: The estimated cost, in arbitrary units (license records x active years x tracts)
+    """
+    rows = len(data.get_license_table().get_rows(license_code))
+    first_year, last_year = data.get_license_date_range(license_code)
+    years = last_year - first_year + 1 if first_year is not None else 0
+    return rows * years * tracts
+
+
+def largest_first(license_codes, costs):
+    """
+    Orders license codes for dispatch to parallel workers, most costly first (ties in license code order). The license
+    codes may also be given as (license code, shard) pairs, i.e., when the analysis of a license code is split.
+    :param license_codes: The license codes to order
+    :param costs: A dictionary of license code to estimated cost
+    :return: A list of the license codes
+    """
+    return sorted(license_codes, key=lambda license_code: (-costs[license_code], _code_order(license_code)))
+
+
+def predict_makespan(license_codes, costs, workers):
+    """
+    Predicts the cost at which the last of a set of license codes is finished when they are dispatched, in the given
+    order, each to the first worker that is free.
+    :param license_codes: The license codes, in order of dispatch
+    :param costs: A dictionary of license code to estimated cost
+    :param workers: The number of workers
+    :return: The predicted makespan, in the units of costs
+    """
+    finish_times = [0] * max(1, min(workers, len(license_codes)))
+    for license_code in license_codes:
+        heapq.heappush(finish_times, heapq.heappop(finish_times) + costs[license_code])
+    return max(finish_times)
+
+
+def print_plan(tasks, costs, workers):
+    """
+    Prints the estimated cost of each task of an analysis (in order of dispatch) and the predicted makespan of running
+    them with the given number of workers.
+    :param tasks: The tasks of the analysis in license code order, as (license code, shard) pairs where shard is None
+    for a whole license code or the pair of (first, last) location blocks of a shard of one (see analysis._plan_tasks)
+    :param costs: A dictionary of task to estimated cost
+    :param workers: The number of license codes analyzed in parallel
+    :return: None
+    """
+    total = sum(costs.values())
+    order = largest_first(tasks, costs) if workers > 1 else tasks
+    license_codes = set(license_code for license_code, _ in tasks)
+
+    print("%-8s %-12s %-50s %10s %6s %16s %7s" % ("code", "blocks", "description", "records", "years", "cost",
+                                                  "share"))
+    for task in order:
+        license_code, shard = task
+        first_year, last_year = data.get_license_date_range(license_code)
+        print("%-8s %-12s %-50s %10d %6d %16d %6.1f%%" % (
+            license_code, "all" if shard is None else "%d-%d" % (shard[0], shard[1] - 1),
+            data.get_license_description(license_code)[:50], len(data.get_license_table().get_rows(license_code)),
+            last_year - first_year + 1 if first_year is not None else 0, costs[task],
+            100.0 * costs[task] / total if total else 0.0))
+
+    makespan = predict_makespan(order, costs, workers)
+    print("Total cost of " + str(len(license_codes)) + " license codes (" + str(len(tasks)) + " tasks): " + str(total))
+    print("Predicted makespan with " + str(workers) + " worker" + ("s" if workers != 1 else "") + ": " +
+          str(makespan) + " (" + "%.1f" % (100.0 * makespan / total if total else 0.0) + "% of the total cost; " +
+          "at best " + "%.1f" % (100.0 / max(1, min(workers, len(tasks)))) + "%)")
+    if workers > 1:
+        print("Predicted makespan dispatching in license code order instead: " +
+              str(predict_makespan(tasks, costs, workers)))
+
+
+def _code_order(license_code):
+    if isinstance(license_code, tuple):
+        return _code_order(license_code[0]) + license_code[1:]
+    try:
+        return int(license_code), license_code
+    except ValueError:
+        return float('inf'), license_code
@@ -1,7 +1,8 @@
-from oasis import data
+from oasis import data, trace
 import json
 
 
+@trace.traced("produce_socioeconomic_rpt")
 def produce_socioeconomic_rpt(output_dir):
     """
     Produce a JSON report of socioeconomic indicators as the Chicago neighborhood level.
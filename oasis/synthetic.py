@@ -0,0 +1,227 @@
+"""
+Generates seeded, synthetic datasets shaped like the City of Chicago and US Census data consumed by this tool (business
+licenses, census tracts, neighborhoods, socioeconomic indicators and the neighborhood to census tract equivalency file)
+so that the pipeline can be exercised and benchmarked without downloading the real data.
+
+Usage: python -m oasis.synthetic <directory> [--rows N] [--seed N]
+"""
+
+import argparse
+import csv
+import os.path
+import random
+import sys
+
+# Chicago's bounding box, roughly
+MIN_LAT, MAX_LAT = 41.65, 42.02
+MIN_LNG, MAX_LNG = -87.90, -87.53
+
+# A sample of real license codes; earlier codes are issued far more often than later ones
+LICENSE_TYPES = [
+    ("1010", "Limited Business License"),
+    ("1006", "Retail Food Establishment"),
+    ("1781", "Tobacco"),
+    ("1475", "Consumption on Premises - Incidental Activity"),
+    ("1474", "Tavern"),
+    ("4404", "Peddler, food - (fruits and vegetables only)"),
+    ("1050", "Motor Vehicle Repair : Engine Only (Class II)"),
+    ("1625", "Children's Services Facility License"),
+    ("1584", "Home Occupation"),
+    ("1524", "Home Repair"),
+    ("1569", "Public Place of Amusement"),
+    ("1023", "Music and Dance"),
+    ("1470", "Package Goods"),
+    ("1032", "Caterer's Liquor License"),
+    ("1002", "Accessory Garage"),
+    ("1315", "Mobile Food Dispenser"),
+    ("1604", "Animal Care License"),
+    ("1008", "Pawnbroker"),
+    ("1012", "Public Garage"),
+    ("1681", "Wholesale Food Establishment"),
+    ("4406", "Peddler, non-food"),
+    ("1054", "Massage Establishment"),
+    ("1606", "Valet Parking Operator"),
+    ("1585", "Hotel"),
+    ("1009", "Secondhand Dealer"),
+]
+
+LICENSE_COLUMNS = ["ID", "LICENSE ID", "ACCOUNT NUMBER", "SITE NUMBER", "LEGAL NAME", "DOING BUSINESS AS NAME",
+                   "ADDRESS", "CITY", "STATE", "ZIP CODE", "WARD", "PRECINCT", "POLICE DISTRICT", "LICENSE CODE",
+                   "LICENSE DESCRIPTION", "BUSINESS ACTIVITY ID", "BUSINESS ACTIVITY", "LICENSE NUMBER",
+                   "APPLICATION TYPE", "LICENSE TERM START DATE", "LICENSE TERM EXPIRATION DATE", "DATE ISSUED",
+                   "LICENSE STATUS", "LATITUDE", "LONGITUDE", "LOCATION"]
+
+CENSUS_COLUMNS = ["USPS", "GEOID", "POP10", "HU10", "ALAND", "AWATER", "ALAND_SQMI", "AWATER_SQMI", "INTPTLAT",
+                  "INTPTLONG"]
+
+NEIGHBORHOOD_COLUMNS = ["the_geom", "PERIMETER", "AREA", "COMAREA_", "COMAREA_ID", "AREA_NUMBE", "COMMUNITY",
+                        "AREA_NUM_1", "SHAPE_AREA", "SHAPE_LEN"]
+
+TRACT_MAP_COLUMNS = ["STUSAB", "SUMLEV", "COUNTY", "COUSUB", "PLACE", "GEOID2", "CHGOCA", "TRACT", "NAME"]
+
+SOCIOECONOMIC_COLUMNS = ["Community Area Number", "COMMUNITY AREA NAME", "PERCENT OF HOUSING CROWDED",
+                         "PERCENT HOUSEHOLDS BELOW POVERTY", "PERCENT AGED 16+ UNEMPLOYED",
+                         "PERCENT AGED 25+ WITHOUT HIGH SCHOOL DIPLOMA", "PERCENT AGED UNDER 18 OR OVER 64",
+                         "PER CAPITA INCOME ", "HARDSHIP INDEX"]
+
+STREETS = ["STATE ST", "MADISON ST", "HALSTED ST", "ASHLAND AVE", "WESTERN AVE", "CICERO AVE", "LAKE ST",
+           "DIVISION ST", "NORTH AVE", "FULLERTON AVE", "BELMONT AVE", "IRVING PARK RD", "LAWRENCE AVE",
+           "DEVON AVE", "ROOSEVELT RD", "CERMAK RD", "PERSHING RD", "GARFIELD BLVD", "79TH ST", "95TH ST"]
+
+
+def generate(directory, rows, seed=1, tracts=800, neighborhoods=77):
+    """
+    Writes a complete synthetic dataset to the given directory. The same arguments always produce the same files.
+    :param directory: The directory to write to (created if needed)
+    :param rows: The number of business license records to generate
+    :param seed: The random seed
+    :param tracts: The number of census tracts in Chicago
+    :param neighborhoods: The number of neighborhoods (community areas) in Chicago
+    :return: None
+    """
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+
+    rand = random.Random(seed)
+    neighborhood_names = ["COMMUNITY AREA %d" % number for number in range(1, neighborhoods + 1)]
+
+    # Census tracts are numbered as they are in Chicago: the neighborhood number followed by a two-digit suffix
+    tract_ids, tract_centroids = [], []
+    for tract in range(tracts):
+        neighborhood = tract * neighborhoods // tracts + 1
+        tract_ids.append((neighborhood, "%04d%02d" % (neighborhood, tract % 100)))
+        tract_centroids.append((rand.uniform(MIN_LAT, MAX_LAT), rand.uniform(MIN_LNG, MAX_LNG)))
+
+    _write_census_tracts(directory, rand, tract_ids, tract_centroids)
+    _write_tract_map(directory, tract_ids)
+    _write_neighborhoods(directory, rand, neighborhood_names)
+    _write_socioeconomic(directory, rand, neighborhood_names)
+    _write_licenses(directory, rand, rows, tract_centroids)
+
+
+def _write_census_tracts(directory, rand, tract_ids, tract_centroids):
+    with _open_csv(os.path.join(directory, "illinois_census_tracts.tsv")) as tracts_file:
+        writer = csv.writer(tracts_file, delimiter='\t', lineterminator='\n')
+        writer.writerow(CENSUS_COLUMNS)
+
+        # The gazetteer file lists every tract in Illinois, not just those in Chicago (Cook County, 17031)
+        for tract in range(len(tract_ids) // 4):
+            writer.writerow(["IL", "17043%06d" % (tract * 100), rand.randint(1000, 8000), rand.randint(400, 3000),
+                             rand.randint(10 ** 5, 10 ** 7), 0, "1.000", "0.000",
+                             "%.6f" % rand.uniform(41.2, 41.6), "%.6f" % rand.uniform(-88.4, -87.6)])
+
+        for (_, tract_id), (lat, lng) in zip(tract_ids, tract_centroids):
+            writer.writerow(["IL", "17031" + tract_id, rand.randint(0, 9000), rand.randint(0, 4000),
+                             rand.randint(10 ** 5, 10 ** 7), rand.randint(0, 10 ** 5), "0.500", "0.010",
+                             "%+.6f" % lat, "%+.6f" % lng])
+
+
+def _write_tract_map(directory, tract_ids):
+    with _open_csv(os.path.join(directory, "census_tract_to_neighborhood.csv")) as map_file:
+        writer = csv.writer(map_file, lineterminator='\n')
+        writer.writerow(TRACT_MAP_COLUMNS)
+        for neighborhood, tract_id in tract_ids:
+            writer.writerow(["IL", "80", "31", "14000", "14000", str(neighborhood) + tract_id, neighborhood, tract_id,
+                             "CA %02d Tract %s" % (neighborhood, tract_id)])
+
+
+def _write_neighborhoods(directory, rand, neighborhood_names):
+    with _open_csv(os.path.join(directory, "chicago_neighborhoods.csv")) as neighborhoods_file:
+        writer = csv.writer(neighborhoods_file, lineterminator='\n')
+        writer.writerow(NEIGHBORHOOD_COLUMNS)
+        for number, name in enumerate(neighborhood_names, 1):
+            writer.writerow(["MULTIPOLYGON (((...)))", 0, 0, 0, 0, number, name, number,
+                             "%.1f" % rand.uniform(10 ** 7, 10 ** 9), "%.1f" % rand.uniform(10 ** 4, 10 ** 5)])
+
+
+def _write_socioeconomic(directory, rand, neighborhood_names):
+    with _open_csv(os.path.join(directory, "neighborhood_socioeconomic.csv")) as socioeconomic_file:
+        writer = csv.writer(socioeconomic_file, lineterminator='\n')
+        writer.writerow(SOCIOECONOMIC_COLUMNS)
+        for number, name in enumerate(neighborhood_names, 1):
+            writer.writerow([number, name.title()] + ["%.1f" % rand.uniform(0, 50) for _ in range(5)] +
+                            [rand.randint(8000, 90000), rand.randint(1, 100)])
+        writer.writerow(["", "CHICAGO", 4.7, 19.7, 12.9, 19.5, 33.5, 28202, ""])
+
+
+def _write_licenses(directory, rand, rows, tract_centroids):
+    """
+    Writes business license records the way the city issues them: each business holds a license of one type at one
+    location, renewed for consecutive terms (sometimes under a new license number), with a share of businesses packed
+    into the same buildings. A small fraction of records lack a location or license term dates.
+    """
+    weights = [1.0 / (rank + 1) ** 1.2 for rank in range(len(LICENSE_TYPES))]
+    total_weight = sum(weights)
+    buildings = [_near(rand, tract_centroids) for _ in range(max(1, rows // 40))]
+
+    with _open_csv(os.path.join(directory, "chicago_business_licenses.csv")) as licenses_file:
+        writer = csv.writer(licenses_file, lineterminator='\n')
+        writer.writerow(LICENSE_COLUMNS)
+
+        row, account = 0, 0
+        while row < rows:
+            account += 1
+            license_code, license_desc = _choose(rand, LICENSE_TYPES, weights, total_weight)
+            lat, lng = rand.choice(buildings) if rand.random() < 0.25 else _near(rand, tract_centroids)
+            located = rand.random() > 0.02
+            address = "%d %s %s" % (rand.randint(1, 12000), rand.choice("NSEW"), rand.choice(STREETS))
+            legal_name = "SYNTHETIC BUSINESS %d, INC." % account
+            dba = "SYNTHETIC %d" % account if rand.random() > 0.05 else ""
+            zip_code = "606%02d" % rand.randint(1, 61)
+
+            license_number = 1000000 + account * 10
+            year = rand.randint(2002, 2017)
+            for _ in range(min(1 + int(rand.expovariate(0.6)), rows - row)):
+                term = rand.choice((1, 1, 2))
+                start = "%02d/%02d/%d" % (rand.randint(1, 12), rand.randint(1, 28), year)
+                end = "%02d/%02d/%d" % (rand.randint(1, 12), rand.randint(1, 28), year + term)
+                if row and rand.random() < 0.002:
+                    start, end = "", ""
+
+                writer.writerow([row + 1, 2000000 + row, account, 1, legal_name, dba, address, "CHICAGO", "IL",
+                                 zip_code, rand.randint(1, 50), rand.randint(1, 60), rand.randint(1, 25),
+                                 license_code, license_desc, rand.randint(1, 900), "Synthetic Activity",
+                                 license_number, "RENEW" if row else "ISSUE", start, end, start, "AAI",
+                                 "%.9f" % lat if located else "", "%.9f" % lng if located else "",
+                                 "(%.9f, %.9f)" % (lat, lng) if located else ""])
+
+                row += 1
+                year += term
+                if rand.random() < 0.1:
+                    license_number += 1
+
+
+def _near(rand, tract_centroids):
+    lat, lng = rand.choice(tract_centroids)
+    return lat + rand.gauss(0, 0.01), lng + rand.gauss(0, 0.01)
+
+
+def _choose(rand, choices, weights, total_weight):
+    target = rand.uniform(0, total_weight)
+    for choice, weight in zip(choices, weights):
+        target -= weight
+        if target <= 0:
+            return choice
+    return choices[-1]
+
+
+def _open_csv(path):
+    if sys.version_info[0] < 3:
+        return open(path, 'wb')
+    return open(path, 'w', newline='')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generates a synthetic Chicago Oasis source dataset.")
+    parser.add_argument('directory', help="directory where the dataset files should be written")
+    parser.add_argument('--rows', action='store', dest='rows', type=int, default=10000,
+                        help="number of business license records to generate (default is 10000)")
+    parser.add_argument('--seed', action='store', dest='seed', type=int, default=1,
+                        help="random seed (default is 1)")
+    args = parser.parse_args()
+
+    generate(args.directory, args.rows, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Lightweight tracing of the stages of the pipeline, exported in the Chrome trace-event format (load the file in
+chrome://tracing or https://ui.perfetto.dev to see where the time of a run went).
+
+A span times a block of code; spans opened within another span (on the same thread) nest within it. Counters (such as
+the number of records read or distances computed) are attached to the innermost open span. Tracing is off unless
+started, in which case spans cost next to nothing.
+
+    with trace.span("analyze", license_code="1010"):
+        ...
+        trace.count("rows", len(rows))
+"""
+
+import json
+import os
+import threading
+import time
+
+_events = None              # The trace events recorded so far; None when tracing is off
+_open_spans = threading.local()
+
+
+def start():
+    """
+    Turns tracing on (discarding any events recorded before).
+    :return: None
+    """
+    global _events
+    _events = [_get_process_name_event()]
+
+
+def is_enabled():
+    return _events is not None
+
+
+def span(name, **args):
+    """
+    Creates a context manager that records the time spent in its block as a span.
+    :param name: The name of the span, i.e., the stage of the pipeline
+    :param args: Arguments describing the span (i.e., the license code analyzed), shown with it
+    :return: The context manager
+    """
+    if _events is None:
+        return _NO_SPAN
+    return _Span(name, args)
+
+
+def traced(name):
+    """
+    Creates a decorator that records every call of a function as a span.
+    :param name: The name of the span
+    :return: The decorator
+    """
+    def decorator(function):
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+        wrapper.__name__, wrapper.__doc__ = function.__name__, function.__doc__
+        return wrapper
+    return decorator
+
+
+def count(name, value=1):
+    """
+    Adds to a counter of the innermost open span of this thread (if tracing is on and a span is open).
+    :param name: The name of the counter
+    :param value: The amount to add
+    :return: None
+    """
+    if _events is not None:
+        spans = getattr(_open_spans, "stack", None)
+        if spans:
+            spans[-1].count(name, value)
+
+
+def collect():
+    """
+    Takes the events recorded by this process since tracing started or events were last collected, i.e., to send
+    the events of a worker process to the process that saves the trace.
+    :return: A list of trace events (empty when tracing is off)
+    """
+    global _events
+    if _events is None:
+        return []
+    events, _events = _events, []
+    return events
+
+
+def add_events(events):
+    """
+    Adds events collected in another process to the trace.
+    :param events: A list of trace events, as returned by collect
+    :return: None
+    """
+    if _events is not None:
+        _events.extend(events)
+
+
+def save(path):
+    """
+    Writes the events recorded so far as a Chrome trace-event JSON file.
+    :param path: The file to write
+    :return: None
+    """
+    with open(path, "w") as trace_file:
+        json.dump({"traceEvents": _events or [], "displayTimeUnit": "ms"}, trace_file)
+
+
+class _Span:
+
+    def __init__(self, name, args):
+        self._name = name
+        self._args = args
+        self._started = None
+
+    def count(self, name, value=1):
+        self._args[name] = self._args.get(name, 0) + value
+
+    def __enter__(self):
+        if not hasattr(_open_spans, "stack"):
+            _open_spans.stack = []
+        _open_spans.stack.append(self)
+        self._started = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        finished = time.time()
+        _open_spans.stack.pop()
+        if exc_type is not None:
+            self._args["error"] = exc_type.__name__
+
+        if _events is not None:
+            _events.append({"name": self._name, "ph": "X", "ts": int(self._started * 1e6),
+                            "dur": int((finished - self._started) * 1e6), "pid": os.getpid(),
+                            "tid": threading.current_thread().ident, "args": self._args})
+
+
+class _NoSpan:
+    """
+    The span returned while tracing is off; does nothing.
+    """
+
+    def count(self, name, value=1):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+def _get_process_name_event():
+    return {"name": "process_name", "ph": "M", "pid": os.getpid(), "args": {"name": "oasis (" + str(os.getpid()) + ")"}}
@@ -0,0 +1,364 @@
+import json
+import numpy
+import oasis.analysis
+import oasis.data
+import oasis.datasources
+import oasis.gis
+import oasis.manifest
+import oasis.schedule
+import oasis.synthetic
+import os.path
+import shutil
+import sys
+import tempfile
+import unittest
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+
+class _SyntheticDataTestCase(unittest.TestCase):
+    """
+    Points oasis.data at a small, seeded synthetic dataset (see oasis.synthetic) for the tests of the class, restoring
+    the module's datasets and caches afterwards.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        oasis.synthetic.generate(cls.directory, 600, seed=3, tracts=60, neighborhoods=6)
+
+        cls.saved_tempdir = tempfile.tempdir
+        cls.saved_state = dict((name, getattr(oasis.data, name)) for name in
+                               ("license_db", "census_tracts_db", "neighborhood_db", "neighborhood_tracts_map_db",
+                                "socioeconomic_db") + oasis.data._LICENSE_CACHE_NAMES)
+
+        tempfile.tempdir = cls.directory
+        oasis.data.license_db = oasis.datasources.BusinessLicenses()
+        oasis.data.census_tracts_db = oasis.datasources.CensusTracts()
+        oasis.data.neighborhood_db = oasis.datasources.Neighborhoods()
+        oasis.data.neighborhood_tracts_map_db = oasis.datasources.NeighborhoodTractsMap(cls.directory)
+        oasis.data.socioeconomic_db = oasis.datasources.Socioeconomic()
+        oasis.data._cached_license_table = None
+        oasis.data.initialize_license_cache()
+
+    @classmethod
+    def tearDownClass(cls):
+        tempfile.tempdir = cls.saved_tempdir
+        for name, value in cls.saved_state.items():
+            setattr(oasis.data, name, value)
+        shutil.rmtree(cls.directory)
+
+    def assertRecordsEqual(self, expected, actual):
+        self.assertEqual(len(expected), len(actual))
+        for expected_record, actual_record in zip(expected, actual):
+            self.assertEqual(sorted(expected_record), sorted(actual_record))
+            for field, value in expected_record.items():
+                if isinstance(value, float):
+                    self.assertAlmostEqual(value, actual_record[field], delta=1e-9 * max(1.0, abs(value)))
+                else:
+                    self.assertEqual(value, actual_record[field])
+
+
+def _analyze_per_pair(license_code, context):
+    """
+    Analyzes a license code the way the original implementation did: every business crossed with every census tract,
+    crossed with every year the business was active, one distance at a time.
+    :return: A dictionary of year to a tuple of (census records, neighborhood records, critical business records), each
+    a list of dictionaries as written to the output files
+    """
+    table = oasis.data.get_license_table()
+    license_desc = oasis.data.get_license_description(license_code)
+
+    tract_counts, neighborhood_access, nearby = {}, {}, {}
+    for row in table.get_rows(license_code).tolist():
+        start, end = int(table.start_years[row]), int(table.end_years[row])
+        lat, lng = float(table.lats[row]), float(table.lngs[row])
+        if not start or not end or lat != lat or lng != lng:
+            continue
+
+        for tract, (tract_id, neighborhood, _) in enumerate(context.tracts):
+            distance = oasis.gis.distance_lat_lng(lat, lng, context.tract_lats[tract], context.tract_lngs[tract])
+            access_distance = max(distance, oasis.analysis.MIN_ACCESS_DISTANCE)
+            for year in range(start, end + 1):
+                counts = tract_counts.setdefault(year, [[0, 0, 0, 0.0, 0.0] for _ in context.tracts])[tract]
+                counts[0] += distance <= 1.0
+                counts[1] += distance <= 2.0
+                counts[2] += distance <= 3.0
+                counts[3] += 1.0 / access_distance
+                counts[4] += 1.0 / access_distance ** 2
+
+                access = neighborhood_access.setdefault(year, {}).setdefault(neighborhood, [0.0, 0.0])
+                access[0] += 1.0 / access_distance
+                access[1] += 1.0 / access_distance ** 2
+
+                if distance <= 1.0:
+                    nearby.setdefault((year, tract), []).append(table.license_numbers[row])
+
+    served_populations = {}
+    for row in table.get_rows(license_code).tolist():
+        lat, lng = float(table.lats[row]), float(table.lngs[row])
+        served_populations[table.license_numbers[row]] = sum(
+            int(population) for tract, (_, _, population) in enumerate(context.tracts)
+            if population and oasis.gis.distance_lat_lng(lat, lng, context.tract_lats[tract],
+                                                         context.tract_lngs[tract]) <= 1.0)
+
+    results = {}
+    for year in sorted(tract_counts):
+        census = [{"BUSINESS_TYPE": license_desc, "TRACT": context.tract10s[tract], "YEAR": year,
+                   "ONE_MILE": one_mile, "TWO_MILE": two_mile, "THREE_MILE": three_mile, "ACCESS1": access1,
+                   "ACCESS2": access2}
+                  for tract, (one_mile, two_mile, three_mile, access1, access2) in enumerate(tract_counts[year])]
+
+        community = [{"BUSINESS_TYPE": license_desc, "COMMUNITY_AREA": neighborhood, "YEAR": year,
+                      "ACCESS1": neighborhood_access[year][neighborhood][0],
+                      "ACCESS2": neighborhood_access[year][neighborhood][1]}
+                     for neighborhood in sorted(neighborhood_access[year])]
+
+        # A critical business is the only business within a mile of some tract; each is listed once per year
+        critical_numbers = sorted(set(nearby[(year, tract)][0] for tract in range(len(context.tracts))
+                                      if len(nearby.get((year, tract), [])) == 1))
+        critical = [{"STATE": oasis.data.get_business_state(license_number),
+                     "ZIP": int(oasis.data.get_business_zip(license_number)),
+                     "LATTITUDE": oasis.data.get_business_lat_lng(license_number)[0],
+                     "LONGITUDE": oasis.data.get_business_lat_lng(license_number)[1],
+                     "ADDRESS": oasis.data.get_business_address(license_number), "YEAR": year,
+                     "DOING_BUSINESS_AS_NAME": oasis.data.get_business_dba(license_number),
+                     "POP_AT_RISK": served_populations[license_number], "BUSINESS_TYPE": license_desc,
+                     "LEGAL_NAME": oasis.data.get_business_legal_name(license_number)}
+                    for license_number in critical_numbers]
+
+        results[year] = census, community, critical
+    return results
+
+
+class TestAnalysis(_SyntheticDataTestCase):
+
+    def analyze(self, license_code, context):
+        businesses = oasis.analysis._Businesses(license_code)
+        database = oasis.analysis._Analysis(license_code, oasis.data.get_license_description(license_code), context,
+                                            *businesses.get_years())
+        oasis.analysis._count(database, businesses, (0, businesses.get_block_count()), context)
+        database.finalize()
+        return database
+
+    def assertAnalysisEqual(self, expected, database):
+        self.assertEqual(sorted(expected), database.get_analyzed_years())
+        for year, (census, community, critical) in expected.items():
+            self.assertRecordsEqual(census, json.loads(database.get_analyzed_census_records_json(year)))
+            self.assertRecordsEqual(community, json.loads(database.get_neighborhood_records_json(year)))
+            self.assertRecordsEqual(critical, json.loads(database.get_critical_businesses_json(year)))
+
+    def test_matches_per_pair_analysis(self):
+        context = oasis.analysis._AnalysisContext(None, "critical", "census", "community")
+        for license_code in ("1010", "1006", "1474"):
+            expected = _analyze_per_pair(license_code, context)
+            self.assertTrue(any(critical for _, _, critical in expected.values()))
+            self.assertAnalysisEqual(expected, self.analyze(license_code, context))
+
+    def test_counts_by_year(self):
+        context = oasis.analysis._AnalysisContext(None, "critical", "census", "community")
+        database = self.analyze("1010", context)
+        table = oasis.data.get_license_table()
+        rows = table.get_rows("1010")
+
+        for year in database.get_analyzed_years():
+            records = database.get_analyzed_census_records(year)
+            self.assertEqual([record.area for record in records], [tract_id for tract_id, _, _ in context.tracts])
+
+            # No tract can have more businesses nearby than are active in the year
+            active = int(((table.start_years[rows] <= year) & (table.end_years[rows] >= year)).sum())
+            for record in records:
+                self.assertTrue(record.one_mile <= record.two_mile <= record.three_mile <= active)
+
+            # Neighborhood accessibility is the sum of the accessibility of its tracts
+            for neighborhood in database.get_neighborhood_records(year):
+                self.assertAlmostEqual(neighborhood.access1, sum(
+                    record.access1 for record, (_, name, _) in zip(records, context.tracts)
+                    if name == neighborhood.area))
+
+    def test_business_at_tract_centroid(self):
+        context = oasis.analysis._AnalysisContext(None, "critical", "census", "community")
+        first_year, last_year = oasis.analysis._Businesses("1010").get_years()
+        database = oasis.analysis._Analysis("1010", "Limited Business License", context, first_year, last_year)
+
+        locations = numpy.array([[context.tract_lats[0], context.tract_lngs[0]]])
+        oasis.analysis._count_access(database, numpy.array([first_year]), numpy.array([first_year]),
+                                     locations, numpy.array([0]), context)
+        database.finalize()
+
+        # Written as standard JSON (which has no Infinity), with the business as near as MIN_ACCESS_DISTANCE
+        records = json.loads(database.get_analyzed_census_records_json(first_year), parse_constant=self.fail)
+        self.assertAlmostEqual(1.0 / oasis.analysis.MIN_ACCESS_DISTANCE, records[0]["ACCESS1"])
+        self.assertAlmostEqual(1.0 / oasis.analysis.MIN_ACCESS_DISTANCE ** 2, records[0]["ACCESS2"])
+
+    def test_critical_businesses_by_license_number(self):
+        context = oasis.analysis._AnalysisContext(None, "critical", "census", "community")
+        database = self.analyze("1006", context)
+        for year in database.get_analyzed_years():
+            license_numbers = [record.license_number for record in database.get_critical_businesses(year)]
+            self.assertEqual(sorted(set(license_numbers)), license_numbers)
+
+
+class TestAccessibilityReport(_SyntheticDataTestCase):
+
+    def run_analysis(self, name, license_codes=(), **options):
+        output_dir = os.path.join(self.directory, "output", name)
+        oasis.analysis.produce_accessibility_rpt(output_dir, "critical", "census", "community", list(license_codes),
+                                                 None, **options)
+        return output_dir
+
+    def assertSameOutput(self, expected_dir, output_dir):
+        expected_files = oasis.manifest.Manifest(expected_dir).get_all_files()
+        self.assertTrue(expected_files)
+        self.assertEqual(expected_files, oasis.manifest.Manifest(output_dir).get_all_files())
+        for path in expected_files:
+            self.assertEqual(oasis.manifest.hash_file(os.path.join(expected_dir, path)),
+                             oasis.manifest.hash_file(os.path.join(output_dir, path)), path)
+
+    def test_parallel_matches_serial(self):
+        self.assertSameOutput(self.run_analysis("serial"), self.run_analysis("parallel", jobs=2))
+
+    def analyzed_codes(self, run):
+        """
+        :return: The license codes analyzed (rather than skipped) by run, a function running an analysis
+        """
+        analyzed, analyze_license_code = [], oasis.analysis._analyze_license_code
+
+        def record(license_code, *args):
+            analyzed.append(license_code)
+            return analyze_license_code(license_code, *args)
+
+        oasis.analysis._analyze_license_code = record
+        try:
+            run()
+        finally:
+            oasis.analysis._analyze_license_code = analyze_license_code
+        return analyzed
+
+    def test_unchanged_codes_are_skipped(self):
+        output_dir = self.run_analysis("skip", ["1006", "1010"])
+        self.assertEqual([], self.analyzed_codes(lambda: self.run_analysis("skip", ["1006", "1010"])))
+
+        # A license code with a damaged file is analyzed again, even though its inputs are unchanged
+        damaged = sorted(oasis.manifest.Manifest(output_dir).get_files("1010"))[0]
+        with open(os.path.join(output_dir, damaged), "w") as damaged_file:
+            damaged_file.write("[")
+        self.assertEqual(["1010"], self.analyzed_codes(lambda: self.run_analysis("skip", ["1006", "1010"])))
+
+    def test_resume_repairs_damaged_files(self):
+        analyze_license_code = oasis.analysis._analyze_license_code
+
+        def interrupt(license_code, *args):
+            if license_code == "1010":
+                raise KeyboardInterrupt()
+            return analyze_license_code(license_code, *args)
+
+        oasis.analysis._analyze_license_code = interrupt
+        try:
+            self.assertRaises(KeyboardInterrupt, self.run_analysis, "resume", ["1006", "1010"])
+        finally:
+            oasis.analysis._analyze_license_code = analyze_license_code
+
+        # A license code completed before the interruption is analyzed again if one of its files was damaged since
+        output_dir = os.path.join(self.directory, "output", "resume")
+        damaged = sorted(oasis.manifest.Manifest(output_dir).get_files("1006"))[0]
+        with open(os.path.join(output_dir, damaged), "w") as damaged_file:
+            damaged_file.write("[")
+        self.assertEqual(["1006", "1010"], self.analyzed_codes(lambda: self.run_analysis("resume", resume=True)))
+        self.assertSameOutput(self.run_analysis("resume-clean", ["1006", "1010"]), output_dir)
+
+        # The resumed run recorded the same fingerprints a run that was never interrupted would have
+        self.assertEqual([], self.analyzed_codes(lambda: self.run_analysis("resume", ["1006", "1010"])))
+
+    def test_rebuild_rewrites_only_changed_files(self):
+        output_dir = self.run_analysis("rebuild", ["1006"])
+        files = sorted(oasis.manifest.Manifest(output_dir).get_files("1006"))
+        for path in files:
+            os.utime(os.path.join(output_dir, path), (1000000000, 1000000000))
+
+        damaged = files[0]
+        with open(os.path.join(output_dir, damaged), "w") as damaged_file:
+            damaged_file.write("")
+        os.utime(os.path.join(output_dir, damaged), (1000000000, 1000000000))
+
+        self.run_analysis("rebuild", ["1006"], rebuild=True)
+        self.assertSameOutput(self.run_analysis("rebuild-clean", ["1006"]), output_dir)
+
+        # The damaged file is restored; the others, unchanged, are left untouched
+        for path in files:
+            self.assertEqual(path != damaged, os.path.getmtime(os.path.join(output_dir, path)) == 1000000000)
+
+    def test_creates_output_directory(self):
+        output_dir = os.path.join(self.directory, "output", "new")
+        oasis.analysis.produce_accessibility_rpt(output_dir, "critical", "census", "community", ["1010"], None)
+
+        manifest = oasis.manifest.Manifest(output_dir)
+        self.assertTrue(os.path.exists(manifest.get_path()))
+        self.assertTrue(manifest.get_files("1010"))
+        for path in manifest.get_files("1010"):
+            self.assertTrue(os.path.exists(os.path.join(output_dir, path)))
+
+
+class TestShards(_SyntheticDataTestCase):
+
+    def setUp(self):
+        self.block_size = oasis.analysis.ACCESS_BLOCK_SIZE
+        oasis.analysis.ACCESS_BLOCK_SIZE = 16
+
+    def tearDown(self):
+        oasis.analysis.ACCESS_BLOCK_SIZE = self.block_size
+
+    def test_plan_lists_shards(self):
+        stdout, sys.stdout = sys.stdout, StringIO()
+        try:
+            oasis.analysis.plan_accessibility_rpt([], None, 4)
+            plan = sys.stdout.getvalue().splitlines()
+        finally:
+            sys.stdout = stdout
+
+        context = oasis.analysis._AnalysisContext(None, None, None, None)
+        tasks, task_costs = oasis.analysis._get_tasks(oasis.data.get_license_codes(), len(context.tracts), 4)
+        shards = [task for task in tasks if task[1] is not None]
+        self.assertTrue(len(shards) > 1)
+
+        # Each shard is a task of its own, in order of dispatch
+        rows = [line.split()[:2] for line in plan[1:len(tasks) + 1]]
+        self.assertEqual([[license_code, "all" if shard is None else "%d-%d" % (shard[0], shard[1] - 1)]
+                          for license_code, shard in oasis.schedule.largest_first(tasks, task_costs)], rows)
+
+        makespan = oasis.schedule.predict_makespan(oasis.schedule.largest_first(tasks, task_costs), task_costs, 4)
+        self.assertTrue(plan[len(tasks) + 2].startswith("Predicted makespan with 4 workers: " + str(makespan) + " "))
+
+    def test_merged_shards_match_whole_analysis(self):
+        whole_context = oasis.analysis._AnalysisContext(os.path.join(self.directory, "whole"), "critical", "census",
+                                                        "community")
+        shards_context = oasis.analysis._AnalysisContext(os.path.join(self.directory, "shards"), "critical", "census",
+                                                         "community")
+
+        for license_code in ("1010", "1006"):
+            blocks = oasis.analysis._Businesses(license_code).get_block_count()
+            self.assertTrue(blocks >= 3)
+            shards = [(0, 1), (1, 2), (2, blocks)]
+
+            expected = oasis.analysis._analyze_license_code(license_code, whole_context, False)
+            shard_counts = [oasis.analysis._count_shard(license_code, shard, shards_context) for shard in shards]
+            self.assertEqual(expected, oasis.analysis._merge_shards(license_code, shard_counts, shards_context))
+
+            # The same content (by SHA-1) was written for every count, accessibility sum and critical business
+            _, _, files = expected
+            critical_businesses = 0
+            for path in files:
+                with open(os.path.join(whole_context.output_dir, path)) as whole_file:
+                    with open(os.path.join(shards_context.output_dir, path)) as shards_file:
+                        content = whole_file.read()
+                        self.assertEqual(content, shards_file.read())
+                if path.startswith("critical/"):
+                    critical_businesses += len(json.loads(content))
+            self.assertTrue(critical_businesses)
+
+
+if __name__ == '__main__':
+    unittest.main()
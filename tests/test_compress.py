@@ -0,0 +1,43 @@
+import gzip
+import oasis.compress
+import os.path
+import shutil
+import tempfile
+import threading
+import unittest
+
+
+class TestCompressor(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_threads_start_on_first_submit(self):
+        threads = threading.active_count()
+        compressor = oasis.compress.Compressor(self.directory, threads=2)
+        self.assertEqual(threads, threading.active_count())
+
+        with open(os.path.join(self.directory, "licenses.json"), 'w') as json_file:
+            json_file.write('{"licenses": []}')
+        compressor.submit("licenses.json")
+        self.assertTrue(threading.active_count() > threads)
+        compressor.finish()
+
+        with gzip.open(os.path.join(self.directory, "licenses.json.gz"), 'rb') as gzip_file:
+            self.assertEqual(b'{"licenses": []}', gzip_file.read())
+
+    def test_finish_without_files(self):
+        compressor = oasis.compress.Compressor(self.directory)
+        compressor.finish()
+        self.assertTrue(os.path.exists(compressor.get_index_path()))
+
+    def test_check_formats(self):
+        oasis.compress.check_formats(("gz",))
+        self.assertRaises(ValueError, oasis.compress.check_formats, ("zip",))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+import csv
+import oasis.data
+import oasis.datasources
+import oasis.synthetic
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+
+class _StubLicenses:
+
+    def __init__(self, directory):
+        self._directory = directory
+
+    def get_cache_directory(self):
+        return self._directory
+
+    def get_local_filename(self):
+        return "licenses.csv"
+
+
+class _LocalLicenses(oasis.datasources.BusinessLicenses):
+
+    def __init__(self, directory):
+        oasis.datasources.BusinessLicenses.__init__(self)
+        self._directory = directory
+
+    def get_cache_directory(self):
+        return self._directory
+
+
+class TestParseYear(unittest.TestCase):
+
+    def test_valid_dates(self):
+        self.assertEqual(2015, oasis.data._parse_year("03/16/2015"))
+        self.assertEqual(2000, oasis.data._parse_year("02/29/2000"))
+        self.assertEqual(1999, oasis.data._parse_year("3/6/1999"))
+
+    def test_missing_or_malformed_dates(self):
+        for date in ("", "03/16/15", "2015-03-16", "13/01/2015", "02/29/2015", "aa/bb/cccc", "03/16/2015 00:00"):
+            self.assertEqual(0, oasis.data._parse_year(date), date)
+
+    def test_years_are_remembered(self):
+        years = {}
+        self.assertEqual(2015, oasis.data._get_year("03/16/2015", years))
+        self.assertEqual(0, oasis.data._get_year("", years))
+        self.assertEqual({"03/16/2015": 2015, "": 0}, years)
+
+        years["03/16/2015"] = 1999
+        self.assertEqual(1999, oasis.data._get_year("03/16/2015", years))
+
+
+class TestInitializeLicenseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.license_db = oasis.data.license_db
+        self.caches = dict((name, getattr(oasis.data, name)) for name in oasis.data._LICENSE_CACHE_NAMES)
+        oasis.data.license_db = _LocalLicenses(self.directory)
+        oasis.data._cached_license_table = None
+
+    def tearDown(self):
+        oasis.data.license_db = self.license_db
+        for name, cache in self.caches.items():
+            setattr(oasis.data, name, cache)
+        shutil.rmtree(self.directory)
+
+    def initialize(self, licenses):
+        """
+        :param licenses: A list of (license number, term start date, term expiration date) of licenses of code 1010
+        :return: The lines printed while building the license caches from the licenses
+        """
+        with open(os.path.join(self.directory, "chicago_business_licenses.csv"), "w") as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(oasis.synthetic.LICENSE_COLUMNS)
+            for license_number, start, end in licenses:
+                record = dict((column, "") for column in oasis.synthetic.LICENSE_COLUMNS)
+                record.update({"LICENSE NUMBER": license_number, "LICENSE CODE": "1010",
+                               "LICENSE DESCRIPTION": "Limited Business License", "LICENSE TERM START DATE": start,
+                               "LICENSE TERM EXPIRATION DATE": end})
+                writer.writerow([record[column] for column in oasis.synthetic.LICENSE_COLUMNS])
+
+        stdout, sys.stdout = sys.stdout, StringIO()
+        try:
+            oasis.data.initialize_license_cache()
+            return sys.stdout.getvalue().splitlines()
+        finally:
+            sys.stdout = stdout
+
+    def test_undated_records_are_ignored(self):
+        output = self.initialize([("1", "01/01/2010", "12/31/2012"), ("2", "", "12/31/2013"),
+                                  ("3", "2011-01-01", "12/31/2013"), ("4", "02/30/2012", "bogus"),
+                                  ("5", "13/01/2012", "12/31/2013"), ("6", "01/01/2011", "")])
+
+        self.assertIn("Ignoring 5 license records with missing or malformed term dates (i.e., '2011-01-01', "
+                      "'02/30/2012', 'bogus')", output)
+        self.assertEqual((2010, 2012), oasis.data.get_license_date_range("1010"))
+        self.assertEqual((2010, 2012), oasis.data.get_business_years("1"))
+
+        # An undated record does not take the years of the record before it
+        for license_number in ("2", "3", "4", "5", "6"):
+            self.assertEqual((None, None), oasis.data.get_business_years(license_number))
+
+    def test_dated_records_are_not_reported(self):
+        output = self.initialize([("1", "01/01/2010", "12/31/2012"), ("2", "03/16/2015", "03/15/2017")])
+        self.assertFalse([line for line in output if line.startswith("Ignoring")])
+        self.assertEqual((2010, 2017), oasis.data.get_license_date_range("1010"))
+
+
+class TestLicenseCacheSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.license_db = oasis.data.license_db
+        self.caches = dict((name, getattr(oasis.data, name)) for name in oasis.data._LICENSE_CACHE_NAMES)
+        oasis.data.license_db = _StubLicenses(self.directory)
+        oasis.data._cached_license_desc = {"1010": "Limited Business License"}
+
+    def tearDown(self):
+        oasis.data.license_db = self.license_db
+        for name, cache in self.caches.items():
+            setattr(oasis.data, name, cache)
+        shutil.rmtree(self.directory)
+
+    def test_snapshot_round_trip(self):
+        oasis.data._save_license_cache_snapshot((10, 1.5, "abc"))
+        oasis.data._cached_license_desc = {}
+
+        self.assertFalse(oasis.data._load_license_cache_snapshot((10, 1.5, "def")))
+        self.assertTrue(oasis.data._load_license_cache_snapshot((10, 1.5, "abc")))
+        self.assertEqual(oasis.data._cached_license_desc, {"1010": "Limited Business License"})
+
+        snapshot_path = oasis.data._get_license_cache_snapshot_path()
+        self.assertEqual(os.path.dirname(snapshot_path), os.path.join(self.directory, "oasis-" + str(os.getuid())))
+        self.assertEqual(os.stat(os.path.dirname(snapshot_path)).st_mode & 0o777, 0o700)
+
+    def test_snapshot_writable_by_others_is_not_loaded(self):
+        oasis.data._save_license_cache_snapshot((10, 1.5, "abc"))
+        os.chmod(oasis.data._get_license_cache_snapshot_path(), 0o666)
+        self.assertFalse(oasis.data._load_license_cache_snapshot((10, 1.5, "abc")))
+
+        os.chmod(oasis.data._get_license_cache_snapshot_path(), 0o600)
+        os.chmod(os.path.join(self.directory, "oasis-" + str(os.getuid())), 0o777)
+        self.assertIsNone(oasis.data._get_license_cache_snapshot_path())
+        self.assertFalse(oasis.data._load_license_cache_snapshot((10, 1.5, "abc")))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,181 @@
+import oasis.datasources
+import os.path
+import shutil
+import tempfile
+import threading
+import unittest
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """
+    Serves the server's payload, honoring Range requests (when enabled) and dropping the connection part way through
+    the first response (when asked to).
+    """
+
+    def do_GET(self):
+        server = self.server
+        server.ranges.append(self.headers.get("Range"))
+
+        if self.headers.get("If-None-Match") == server.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        start = 0
+        if server.support_range and self.headers.get("Range"):
+            start = int(self.headers.get("Range")[len("bytes="):].rstrip("-"))
+            self.send_response(206)
+            self.send_header("Content-Range", "bytes %d-%d/%d" % (start, len(server.payload) - 1, len(server.payload)))
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(server.payload) - start))
+        self.send_header("ETag", server.etag)
+        self.end_headers()
+
+        body = server.payload[start:]
+        if server.drop_after is not None:
+            body, server.drop_after = body[:server.drop_after], None
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _StubDataSet(oasis.datasources.DataSet):
+
+    def __init__(self, url, directory, force_reload=False):
+        oasis.datasources.DataSet.__init__(self, force_reload)
+        self._url = url
+        self._directory = directory
+
+    def get_remote_url(self):
+        return self._url
+
+    def get_local_filename(self):
+        return "stub.tsv"
+
+    def get_cache_directory(self):
+        return self._directory
+
+    def preprocess_line(self, line):
+        return line.strip() + b"\n"
+
+
+class TestDataSources(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.server = HTTPServer(("127.0.0.1", 0), _StubHandler)
+        self.server.payload = b"".join([b"GEOID\t%d  \r\n" % line for line in range(5000)]) + b"last  "
+        self.server.ranges = []
+        self.server.support_range = True
+        self.server.drop_after = None
+        self.server.etag = '"1"'
+        threading.Thread(target=self.server.serve_forever).start()
+
+        self.dataset = _StubDataSet("http://127.0.0.1:%d/data" % self.server.server_address[1], self.directory)
+        self.expected = b"".join([b"GEOID\t%d\n" % line for line in range(5000)]) + b"last\n"
+
+        self._chunk_size, self._retry_delay = oasis.datasources.DOWNLOAD_CHUNK_SIZE, oasis.datasources.DOWNLOAD_RETRY_DELAY
+        oasis.datasources.DOWNLOAD_CHUNK_SIZE, oasis.datasources.DOWNLOAD_RETRY_DELAY = 1000, 0
+
+    def tearDown(self):
+        oasis.datasources.DOWNLOAD_CHUNK_SIZE, oasis.datasources.DOWNLOAD_RETRY_DELAY = self._chunk_size, self._retry_delay
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.directory)
+
+    def read(self, path):
+        with open(path, 'rb') as cache_file:
+            return cache_file.read()
+
+    def test_download_preprocesses_lines(self):
+        path = self.dataset.read_cache()
+        self.assertEqual(self.read(path), self.expected)
+        self.assertEqual(self.server.ranges, [None])
+        self.assertFalse(os.path.exists(path + ".part"))
+        self.assertFalse(os.path.exists(path + ".part.state"))
+
+    def test_interrupted_download_resumes(self):
+        self.server.drop_after = 20000
+        self.assertEqual(self.read(self.dataset.read_cache()), self.expected)
+        self.assertEqual(len(self.server.ranges), 2)
+        self.assertTrue(19000 < int(self.server.ranges[1][len("bytes="):].rstrip("-")) <= 20000)
+
+    def test_interrupted_download_resumes_in_later_run(self):
+        self.server.drop_after = 20000
+        oasis.datasources.DOWNLOAD_ATTEMPTS, attempts = 1, oasis.datasources.DOWNLOAD_ATTEMPTS
+        try:
+            self.assertRaises(IOError, self.dataset.read_cache)
+        finally:
+            oasis.datasources.DOWNLOAD_ATTEMPTS = attempts
+
+        self.assertFalse(os.path.exists(self.dataset.get_cache_file_path()))
+        self.assertEqual(self.read(self.dataset.read_cache()), self.expected)
+        self.assertTrue(self.server.ranges[1].startswith("bytes="))
+
+    def test_download_restarts_without_range_support(self):
+        self.server.drop_after = 20000
+        self.server.support_range = False
+        self.assertEqual(self.read(self.dataset.read_cache()), self.expected)
+        self.assertEqual(len(self.server.ranges), 2)
+
+    def test_unmodified_dataset_is_not_downloaded_again(self):
+        signature = self.dataset.get_cache_signature()
+
+        reloaded = _StubDataSet(self.dataset.get_remote_url(), self.directory, True)
+        self.assertEqual(reloaded.get_cache_signature(), signature)
+        self.assertEqual(len(self.server.ranges), 2)
+
+    def test_modified_dataset_is_downloaded_again(self):
+        signature = self.dataset.get_cache_signature()
+        self.server.payload += b"\nmore  "
+        self.server.etag = '"2"'
+
+        reloaded = _StubDataSet(self.dataset.get_remote_url(), self.directory, True)
+        self.assertNotEqual(reloaded.get_cache_signature(), signature)
+        self.assertEqual(self.read(reloaded.get_cache_file_path()), self.expected + b"more\n")
+        self.assertEqual(reloaded.read_metadata()["etag"], '"2"')
+
+    def test_discarded_validators_force_full_download(self):
+        self.dataset.read_cache()
+        self.server.payload += b"\nmore  "     # Changed, but served with the same ETag
+
+        reloaded = _StubDataSet(self.dataset.get_remote_url(), self.directory, True)
+        reloaded.discard_validators()
+        self.assertFalse(os.path.exists(reloaded.get_metadata_file_path()))
+        self.assertEqual(self.read(reloaded.read_cache()), self.expected + b"more\n")
+        self.assertEqual(reloaded.read_metadata()["etag"], '"1"')
+
+
+class TestDataSetIndexes(unittest.TestCase):
+
+    def test_census_tract_indexes(self):
+        tracts = oasis.datasources.CensusTracts()
+        records = [{"GEOID": "17031010100", "INTPTLAT": "41.9", "INTPTLONG": "-87.6", "POP10": "4854"},
+                   {"GEOID": "17043010100", "INTPTLAT": "41.8", "INTPTLONG": "-88.1", "POP10": "2018"},
+                   {"GEOID": "17031010201", "INTPTLAT": "42.0", "INTPTLONG": "-87.7", "POP10": "6450"}]
+        indexes = tracts.build_indexes(records)
+
+        self.assertEqual(indexes["geo_ids"], set(["17031010100", "17043010100", "17031010201"]))
+        self.assertEqual(indexes["centroids"], {"010100": (41.9, -87.6), "010201": (42.0, -87.7)})
+        self.assertEqual(indexes["populations"], {"010100": "2018", "010201": "6450"})
+
+    def test_indexes_are_built_once(self):
+        neighborhoods = oasis.datasources.Neighborhoods()
+        scans = []
+        neighborhoods.as_dictionary = lambda: scans.append(1) or [{"AREA_NUMBE": "7", "COMMUNITY": "Lincoln Park"},
+                                                                  {"AREA_NUMBE": "8", "COMMUNITY": "Near North Side"}]
+
+        self.assertEqual(neighborhoods.get_index("names"), {"7": "LINCOLN PARK", "8": "NEAR NORTH SIDE"})
+        self.assertEqual(neighborhoods.get_index("ids"), set(["7", "8"]))
+        self.assertEqual(len(scans), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
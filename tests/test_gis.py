@@ -1,4 +1,5 @@
 import oasis.gis
+import random
 import unittest
 
 
@@ -21,3 +22,42 @@ class TestGis(unittest.TestCase):
             oasis.gis.distance_lat_lng(41.881832, -87.623177, 40.712772, -74.006058, 'k'),
             1143.6983135574433,
             4)
+
+    def test_distance_matrix(self):
+        matrix = oasis.gis.distance_matrix([41.881832, 40.712772], [-87.623177, -74.006058],
+                                           [40.712772, 41.881832, 41.8], [-74.006058, -87.623177, -87.7])
+        self.assertEqual((2, 3), matrix.shape)
+        for i, (lat1, lng1) in enumerate([(41.881832, -87.623177), (40.712772, -74.006058)]):
+            for j, (lat2, lng2) in enumerate([(40.712772, -74.006058), (41.881832, -87.623177), (41.8, -87.7)]):
+                self.assertAlmostEqual(oasis.gis.distance_lat_lng(lat1, lng1, lat2, lng2), matrix[i, j], 6)
+
+    def test_distance_matrix_kilometers(self):
+        self.assertAlmostEqual(
+            oasis.gis.distance_matrix([41.881832], [-87.623177], [40.712772], [-74.006058], 'k')[0, 0],
+            1143.6983135574433,
+            4)
+
+    def test_spatial_index_radius(self):
+        rand = random.Random(42)
+        lats = [rand.uniform(41.65, 42.02) for _ in range(500)]
+        lngs = [rand.uniform(-87.90, -87.53) for _ in range(500)]
+        index = oasis.gis.SpatialIndex(lats, lngs)
+
+        for lat, lng, radius in [(41.88, -87.62, 1.0), (41.70, -87.85, 2.0), (41.95, -87.70, 3.0), (41.88, -87.62, 0)]:
+            indices, distances = index.query_radius(lat, lng, radius)
+            expected = [i for i in range(500) if oasis.gis.distance_lat_lng(lat, lng, lats[i], lngs[i]) <= radius]
+            self.assertEqual(sorted(expected), sorted(indices.tolist()))
+            self.assertEqual(sorted(distances.tolist()), distances.tolist())
+
+    def test_spatial_index_nearest(self):
+        rand = random.Random(7)
+        lats = [rand.uniform(41.65, 42.02) for _ in range(300)]
+        lngs = [rand.uniform(-87.90, -87.53) for _ in range(300)]
+        index = oasis.gis.SpatialIndex(lats, lngs, cell_size=0.25)
+
+        by_distance = sorted(range(300), key=lambda i: oasis.gis.distance_lat_lng(41.8, -87.7, lats[i], lngs[i]))
+        indices, _ = index.query_nearest(41.8, -87.7, 10)
+        self.assertEqual(by_distance[:10], indices.tolist())
+
+        indices, _ = index.query_nearest(45.0, -80.0, 1000)
+        self.assertEqual(300, len(indices))
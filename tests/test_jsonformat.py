@@ -0,0 +1,40 @@
+import json
+import oasis.jsonformat
+import unittest
+from oasis.jsonformat import FLOAT, INTEGER, STRING, RecordFormat
+
+FIELDS = [("NAME", STRING), ("COUNT", INTEGER), ("VALUE", FLOAT)]
+
+
+class TestJsonFormat(unittest.TestCase):
+
+    def test_encode_matches_json(self):
+        columns = [["North \"Side\"", u"S\u00f8uth", None], [1, 2, 3], [0.1, 2.0 / 3, 1e-20]]
+        expected = [{"NAME": name, "COUNT": count, "VALUE": value} for name, count, value in zip(*columns)]
+
+        self.assertEqual(json.loads(RecordFormat(FIELDS).dumps(columns)), expected)
+        self.assertEqual(json.loads(RecordFormat(FIELDS, True).dumps(columns)), expected)
+
+    def test_encode_layout(self):
+        columns = [["a", "b"], [1, 2], [0.5, 1.5]]
+        self.assertEqual(RecordFormat(FIELDS, True).dumps(columns),
+                         '[{"NAME":"a","COUNT":1,"VALUE":0.5},{"NAME":"b","COUNT":2,"VALUE":1.5}]')
+        self.assertEqual(RecordFormat(FIELDS).dumps([["a"], [1], [0.5]]),
+                         '[\n  {\n    "NAME": "a",\n    "COUNT": 1,\n    "VALUE": 0.5\n  }\n]')
+        self.assertEqual(RecordFormat(FIELDS).dumps([[], [], []]), "[]")
+
+    def test_encode_in_blocks(self):
+        block_size, oasis.jsonformat.BLOCK_SIZE = oasis.jsonformat.BLOCK_SIZE, 3
+        try:
+            columns = [[str(i) for i in range(10)], list(range(10)), [float("inf")] * 10]
+            chunks = list(RecordFormat(FIELDS, True).encode(columns))
+        finally:
+            oasis.jsonformat.BLOCK_SIZE = block_size
+
+        self.assertEqual(len(chunks), 6)
+        self.assertEqual([record["COUNT"] for record in json.loads("".join(chunks))], list(range(10)))
+        self.assertTrue('"VALUE":Infinity' in chunks[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
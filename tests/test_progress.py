@@ -0,0 +1,60 @@
+import json
+import oasis.progress
+import unittest
+
+
+class _Lines:
+
+    def __init__(self):
+        self.text = ""
+
+    def write(self, text):
+        self.text += text
+
+    def flush(self):
+        pass
+
+    def lines(self):
+        return self.text.splitlines()
+
+
+class TestTelemetry(unittest.TestCase):
+
+    def test_reports_rates_and_eta(self):
+        log, stream = _Lines(), _Lines()
+        telemetry = oasis.progress.Telemetry("license code 1010", 4, 0.0, log, stream)
+        for _ in range(3):
+            telemetry.report(1, 10, 800)
+        telemetry.finish()
+
+        reports = [json.loads(line) for line in log.lines()]
+        self.assertEqual([report["done"] for report in reports], [1, 2, 3, 3])
+        self.assertEqual(reports[-1]["finished"], True)
+        self.assertTrue(reports[-2]["eta_seconds"] > 0)
+        self.assertEqual(len(stream.lines()), 4)
+        self.assertTrue("records/s" in stream.lines()[0] and "ETA" in stream.lines()[0])
+
+    def test_reports_are_throttled(self):
+        log, stream = _Lines(), _Lines()
+        telemetry = oasis.progress.Telemetry("overall", 100000, 3600.0, log, stream)
+        for _ in range(100000):
+            telemetry.report()
+        telemetry.finish()
+
+        self.assertEqual(len(log.lines()), 1)
+        self.assertEqual(json.loads(log.lines()[0])["records_per_second"] > 0, True)
+
+    def test_memory_unavailable(self):
+        log, stream = _Lines(), _Lines()
+        get_rss_mb, oasis.progress.get_rss_mb = oasis.progress.get_rss_mb, lambda: None
+        try:
+            oasis.progress.Telemetry("overall", 1, 0.0, log, stream).finish()
+        finally:
+            oasis.progress.get_rss_mb = get_rss_mb
+
+        self.assertTrue(stream.lines()[0].endswith(", RSS unavailable"))
+        self.assertIsNone(json.loads(log.lines()[0])["rss_mb"])
+
+
+if __name__ == '__main__':
+    unittest.main()
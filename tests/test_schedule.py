@@ -0,0 +1,26 @@
+import oasis.schedule
+import unittest
+
+
+class TestSchedule(unittest.TestCase):
+
+    def test_largest_first(self):
+        costs = {"1006": 10, "1010": 50, "1475": 10, "4404": 70}
+        self.assertEqual(oasis.schedule.largest_first(["1006", "1010", "1475", "4404"], costs),
+                         ["4404", "1010", "1006", "1475"])
+
+    def test_largest_first_shards(self):
+        costs = {("1010", (0, 2)): 30, ("1010", (2, 4)): 30, ("1006", None): 40}
+        self.assertEqual(oasis.schedule.largest_first(sorted(costs), costs),
+                         [("1006", None), ("1010", (0, 2)), ("1010", (2, 4))])
+
+    def test_predict_makespan(self):
+        costs = {"1": 10, "2": 10, "3": 10, "4": 30}
+        self.assertEqual(oasis.schedule.predict_makespan(["1", "2", "3", "4"], costs, 2), 40)
+        self.assertEqual(oasis.schedule.predict_makespan(["4", "1", "2", "3"], costs, 2), 30)
+        self.assertEqual(oasis.schedule.predict_makespan(["4", "1", "2", "3"], costs, 1), 60)
+        self.assertEqual(oasis.schedule.predict_makespan([], costs, 4), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import csv
+import filecmp
+import os
+import oasis.synthetic
+import shutil
+import tempfile
+import unittest
+
+
+class TestSynthetic(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def generate(self, name, seed):
+        directory = os.path.join(self.directory, name)
+        oasis.synthetic.generate(directory, 500, seed, tracts=40, neighborhoods=5)
+        return directory
+
+    def read_csv(self, directory, filename, delimiter=','):
+        with open(os.path.join(directory, filename)) as csv_file:
+            return list(csv.reader(csv_file, delimiter=delimiter))
+
+    def test_same_seed_same_files(self):
+        first, second = self.generate("first", 7), self.generate("second", 7)
+
+        filenames = sorted(os.listdir(first))
+        self.assertEqual(filenames, sorted(os.listdir(second)))
+        _, mismatch, errors = filecmp.cmpfiles(first, second, filenames, shallow=False)
+        self.assertEqual([], mismatch + errors)
+
+        _, mismatch, _ = filecmp.cmpfiles(first, self.generate("other", 8), filenames, shallow=False)
+        self.assertIn("chicago_business_licenses.csv", mismatch)
+
+    def test_rows_and_headers(self):
+        directory = self.generate("dataset", 1)
+
+        licenses = self.read_csv(directory, "chicago_business_licenses.csv")
+        self.assertEqual(oasis.synthetic.LICENSE_COLUMNS, licenses[0])
+        self.assertEqual(500, len(licenses) - 1)
+
+        tracts = self.read_csv(directory, "illinois_census_tracts.tsv", '\t')
+        self.assertEqual(oasis.synthetic.CENSUS_COLUMNS, tracts[0])
+        self.assertEqual(40, len([tract for tract in tracts[1:] if tract[1].startswith("17031")]))
+
+        tract_map = self.read_csv(directory, "census_tract_to_neighborhood.csv")
+        self.assertEqual(oasis.synthetic.TRACT_MAP_COLUMNS, tract_map[0])
+        self.assertEqual(40, len(tract_map) - 1)
+
+        neighborhoods = self.read_csv(directory, "chicago_neighborhoods.csv")
+        self.assertEqual(oasis.synthetic.NEIGHBORHOOD_COLUMNS, neighborhoods[0])
+        self.assertEqual(5, len(neighborhoods) - 1)
+
+        socioeconomic = self.read_csv(directory, "neighborhood_socioeconomic.csv")
+        self.assertEqual(oasis.synthetic.SOCIOECONOMIC_COLUMNS, socioeconomic[0])
+        self.assertEqual(5 + 1, len(socioeconomic) - 1)     # Plus the city-wide row
+
+
+if __name__ == '__main__':
+    unittest.main()
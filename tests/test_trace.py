@@ -0,0 +1,53 @@
+import json
+import oasis.trace
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class TestTrace(unittest.TestCase):
+
+    def tearDown(self):
+        oasis.trace._events = None
+
+    def test_disabled_tracing_records_nothing(self):
+        with oasis.trace.span("stage") as span:
+            span.count("rows", 10)
+            oasis.trace.count("rows")
+        self.assertEqual(oasis.trace.collect(), [])
+
+    def test_nested_spans_and_counters(self):
+        oasis.trace.start()
+        with oasis.trace.span("outer", license_code="1010"):
+            with oasis.trace.span("inner"):
+                oasis.trace.count("distances", 800)
+                oasis.trace.count("distances", 800)
+            oasis.trace.count("rows", 3)
+
+        spans = dict((event["name"], event) for event in oasis.trace.collect() if event["ph"] == "X")
+        self.assertEqual(spans["inner"]["args"], {"distances": 1600})
+        self.assertEqual(spans["outer"]["args"], {"license_code": "1010", "rows": 3})
+        self.assertTrue(spans["outer"]["ts"] <= spans["inner"]["ts"])
+        self.assertTrue(spans["inner"]["ts"] + spans["inner"]["dur"] <= spans["outer"]["ts"] + spans["outer"]["dur"])
+
+    def test_save_chrome_trace(self):
+        oasis.trace.start()
+        oasis.trace.add_events([{"name": "worker", "ph": "X", "ts": 0, "dur": 1, "pid": 2, "tid": 1, "args": {}}])
+        traced = oasis.trace.traced("stage")(lambda value: value * 2)
+        self.assertEqual(traced(21), 42)
+
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "trace.json")
+            oasis.trace.save(path)
+            with open(path) as trace_file:
+                events = json.load(trace_file)["traceEvents"]
+        finally:
+            shutil.rmtree(directory)
+
+        self.assertEqual(sorted(event["name"] for event in events), ["process_name", "stage", "worker"])
+
+
+if __name__ == '__main__':
+    unittest.main()